@@ -1,11 +1,21 @@
+import os
+import sys
 import serial
 import time
-import cantera as ct  # Ensure 'cantera' is correctly installed
+
+# The property engine lives with the backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from properties import load_properties
 
 # Replace 'COM3' with the correct port for your Arduino
 arduino_port = "COM3"
 baud_rate = 9600
 
+# Use the cached water property tables (see properties.py) instead of setting
+# Cantera states for every reading. Much faster, but enthalpies differ from
+# Cantera's by up to 1 kJ/kg, which moves the efficiencies in the last digits
+use_property_tables = False
+
 initial_run = True
 
 p1d = 0
@@ -13,8 +23,8 @@ p2d = 0
 t1d = 0
 t2d = 0
 effd = 0 
-# Initialize the WaterWithTransport object
-w = ct.Water()
+# Enthalpy lookups: h(T, P) and saturated-vapour h(P)
+props = load_properties(use_property_tables)
 
 # Connect to the Arduino
 ser = serial.Serial(arduino_port, baud_rate, timeout=1)
@@ -40,14 +50,9 @@ try:
                 print(f"Temperature 2 (°k): {t2}")
                 print("-" * 40)
 
-                w.TP = t1, p1+101325  # Ensure the attribute name 'TP' exists in WaterWithTransport
-                h1 = w.h
-                s2s = w.s
-                Q2s = 1.0
-                w.PQ = p2+101325, Q2s
-                h2s = w.h
-                w.TP = t2, p2
-                h2 = w.h
+                h1 = props.h_tp(t1, p1+101325)
+                h2s = props.h_sat_vap(p2+101325)
+                h2 = props.h_tp(t2, p2)
                 
                 print(h1)
                 print(h2s)
@@ -73,14 +78,9 @@ try:
                     p1d+=p1d*0.02*(0.93-effd)
                     p2d-=p2d*0.02*(0.93-effd)
                     
-                w.TP = t1d,p1d
-                h1d = w.h
-                s2s = w.s
-                Q2s = 1.0
-                w.PQ = p2d+101325, Q2s
-                h2sd = w.h
-                w.TP = t2d, p2d
-                h2d = w.h
+                h1d = props.h_tp(t1d, p1d)
+                h2sd = props.h_sat_vap(p2d+101325)
+                h2d = props.h_tp(t2d, p2d)
                 effd = -1*(h1d - h2d)/(h1d - h2sd)
                 
                 print(f"Efficiency: {eff}")
@@ -19,6 +19,37 @@ const int thermoSCK2 = 6; // Clock (SCK)
 const int thermoCS2 = 7;  // Chip Select (CS)
 
 
+// 1: send compact binary frames at 115200 baud (see backend/protocol.py),
+// 0: send comma-separated text at 9600 baud
+#define BINARY_PROTOCOL 0
+#if BINARY_PROTOCOL
+const long baudRate = 115200;
+#else
+const long baudRate = 9600;
+#endif
+
+// With binary frames, time from the start of one reading to the start of the
+// next (ms). The acquisition itself takes about 300 ms (2 x 10 ADC samples
+// and 10 thermocouple samples, 10 ms apart). A 23-byte frame at 115200 baud
+// takes about 2 ms to send, so a reading every 400 ms keeps the MAX6675
+// (220 ms conversion) and the link well within their limits. Text keeps the
+// original delay(1000) after each reading, about one every 1.3 s
+// (backend/loopback.py uses the same rates).
+#if BINARY_PROTOCOL
+const unsigned long sampleIntervalMs = 400;
+unsigned long lastSampleMs = 0;
+#endif
+
+// Binary frame: sync, version, sequence number, four readings, CRC-16/CCITT
+struct __attribute__((packed)) Frame {
+  uint8_t sync[2];
+  uint8_t version;
+  uint16_t sequence;
+  float values[4];
+  uint16_t crc;
+};
+uint16_t frameSequence = 0;
+
 float floatArray[] = {0, 0, 0, 0}; // Array of floats
 int arraySize = sizeof(floatArray) / sizeof(floatArray[0]);
 
@@ -28,12 +59,18 @@ MAX6675 thermocouple(thermoSCK, thermoCS, thermoSO);
 MAX6675 thermocouple2(thermoSCK2, thermoCS2, thermoSO2);
 float desE = 0;
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(baudRate);
   while (!Serial); // Wait for Serial Monitor to open
   Serial.println("Starting...");
 }
 
 void loop() {
+#if BINARY_PROTOCOL
+  // Pace readings from their start, so the acquisition time is part of the interval
+  while (millis() - lastSampleMs < sampleIntervalMs);
+  lastSampleMs = millis();
+#endif
+
   // Read pressure values
   int p1 = pr1(); // Read ADC value for pressure sensor 1
   float voltage = (p1 / 1023.0) * Vref;
@@ -63,6 +100,9 @@ void loop() {
     temp2 = -999; // Use -999 as a placeholder for error
   }
 
+#if BINARY_PROTOCOL
+  sendFrame(p1pa*1100, p2pa/1.8, temp1+500, temp2+260);
+#else
   // Send all values as a comma-separated string
   Serial.print(p1pa*1100); // Pressure 1 in Pascals (scaled)
   Serial.print(",");
@@ -73,6 +113,35 @@ void loop() {
   Serial.println(temp2+260); // Temperature 2 with offset and newline
 
   delay(1000); // Adjust sampling rate as needed
+#endif
+}
+
+// CRC-16/CCITT (polynomial 0x1021, initial value 0xFFFF), as binascii.crc_hqx
+uint16_t crc16(const uint8_t *data, size_t length) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Send one reading as a binary frame (AVR floats and integers are little-endian)
+void sendFrame(float p1, float p2, float t1, float t2) {
+  Frame frame;
+  frame.sync[0] = 0xA5;
+  frame.sync[1] = 0x5A;
+  frame.version = 1;
+  frame.sequence = frameSequence++;
+  frame.values[0] = p1;
+  frame.values[1] = p2;
+  frame.values[2] = t1;
+  frame.values[3] = t2;
+  // The CRC covers everything between the sync bytes and the CRC itself
+  frame.crc = crc16((const uint8_t *)&frame + 2, sizeof(frame) - 4);
+  Serial.write((const uint8_t *)&frame, sizeof(frame));
 }
 
 const int numSamples = 10; // Number of readings to average
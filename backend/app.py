@@ -1,111 +1,148 @@
+import logging
+import os
+import sys
 import serial
 import time
-import cantera as ct  # Ensure 'cantera' is correctly installed
-import csv
+from instrumentation import InstrumentedProperties, LoopMetrics, configure_logging, start_metrics_server
+from properties import load_properties
+from protocol import BINARY_BAUD_RATE, StreamDecoder
+from efficiency import DesignPoint, sample_efficiency
+from rolling import RollingStats
+from writer import TelemetryWriter
+
+# The columnar telemetry store lives with the models
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models"))
+from telemetry_store import FACTORY_COLUMNS, ColumnStore
+from live_ring import LIVE_RING_NAME, RingWriter
+from retention import Retention, Rollups
 
 # Replace 'COM3' with the correct port for your Arduino
 arduino_port = "COM3"
-baud_rate = 9600
 
-initial_run = True
+# Match BINARY_PROTOCOL in qHACKS.ino: binary frames at 115200 baud, or text
+# lines at 9600. The decoder accepts either format.
+binary_protocol = False
+baud_rate = BINARY_BAUD_RATE if binary_protocol else 9600
+
+# Seconds to wait when no bytes have arrived
+poll_interval = 0.05
+
+# Use the cached water property tables (see properties.py) instead of setting
+# Cantera states for every reading. Much faster, but enthalpies differ from
+# Cantera's by up to 1 kJ/kg, which moves the efficiencies in the last digits
+use_property_tables = False
+
+# Telemetry output: rows are buffered and written every flush_rows readings
+# or flush_interval seconds; fsync_policy is "never", "close" or "flush"
+output_file = "C:\\Users\\ZainP\\Documents\\Qhacks\\ThermoLogic\\models\\factorydata.csv"
+flush_rows = 100
+flush_interval = 5.0
+fsync_policy = "close"
+
+# Columnar copy of the same rows for the GUI and long-range queries
+# (memory-mapped, see models/telemetry_store.py); None turns it off
+store_dir = os.path.join(os.path.dirname(output_file), "factory_store")
+
+# The output file is rotated into gzip segments once it reaches max_bytes or
+# max_age seconds, and on start instead of being truncated; the newest `keep`
+# segments are kept. Per-minute and per-hour rollups go next to it, e.g.
+# factorydata_1min.csv (see models/retention.py). None turns either off
+retention = Retention(output_file, max_bytes=64 * 2**20, max_age=24 * 3600, keep=90)
+rollups = Rollups(output_file)
+
+# Every reading also goes to a shared-memory ring the GUI reads directly
+# (see models/live_ring.py); None turns it off
+live_ring_name = LIVE_RING_NAME
+
+# Logging: set THERMOLOGIC_LOG_LEVEL=DEBUG to see every reading, WARNING for problems only
+configure_logging()
+logger = logging.getLogger("thermologic.app")
+
+# Per-stage timings and counters, served as Prometheus text on metrics_port
+# (None turns the endpoint off) and logged every summary_interval seconds
+metrics_port = 9108
+summary_interval = 60.0
+metrics = LoopMetrics()
 
-p1d = 0
-p2d = 0
-t1d = 0
-t2d = 0
-effd = 0 
-# Initialize the WaterWithTransport object
-w = ct.Water()
+# Rolling mean, std, min/max and percentiles of eff, uniterg and effd over
+# 1 min, 1 h and 24 h, on /metrics and as JSON on /rolling (see rolling.py)
+rolling = RollingStats()
+metrics.add_collector(rolling.render)
+
+# Enthalpy lookups: h(T, P) and saturated-vapour h(P)
+props = InstrumentedProperties(load_properties(use_property_tables), metrics)
+
+# Design point for the "efficiency fix": "nudge" moves it towards the target
+# a little with every reading, "solve" finds the point reaching the target for
+# each reading directly (cached, see DesignSolver in efficiency.py)
+design_mode = "nudge"
+design = DesignPoint(design_mode)
 
 
 # Connect to the Arduino
 ser = serial.Serial(arduino_port, baud_rate, timeout=1)
 time.sleep(2)  # Allow time for the connection to initialize
 
+# Start a fresh file with the header row (the previous one becomes a segment);
+# the store and the rollups keep appending across runs
+store = ColumnStore(store_dir, FACTORY_COLUMNS) if store_dir else None
+writer = TelemetryWriter(output_file, flush_rows=flush_rows, flush_interval=flush_interval,
+                         fsync=fsync_policy, truncate=True, store=store, retention=retention, rollups=rollups)
+ring = RingWriter(live_ring_name) if live_ring_name else None
+
+metrics.gauge("serial_backlog_bytes", lambda: ser.in_waiting)
+metrics.gauge("writer_buffered_rows", lambda: len(writer.rows))
+if design.solver is not None:
+    metrics.gauge("design_cache_hit_rate", lambda: round(design.solver.stats()["hit_rate"], 4))
+    metrics.gauge("design_solve_iterations_mean", lambda: round(design.solver.stats()["mean_iterations"], 2))
+if metrics_port:
+    start_metrics_server(metrics, metrics_port, rolling=rolling)
+
+decoder = StreamDecoder()
+seen_counts = {}
+
 try:
-    header= ["eff","effnew"]
-    output_file = "C:\\Users\\ZainP\\Documents\\Qhacks\\ThermoLogic\\models\\factorydata.csv"
-    with open(output_file, mode="w", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow(header)  # Write the header row
     while True:
-        time.sleep(1)
-        if ser.in_waiting > 0:
-            # Read a line of data from the serial port
-            line = ser.readline().decode('utf-8').strip()
-            
-            # Skip non-numeric or debug messages
-            if not any(char.isdigit() for char in line):
-                print(f"Non-numeric data received: {line}")
-                continue
-
-            # Split the comma-separated string into individual values
-            try:
-                p1, p2, t1, t2 = map(float, line.split(","))
-                print(f"Pressure 1 (Pa): {p1}")
-                print(f"Pressure 2 (Pa): {p2}")
-                print(f"Temperature 1 (°k): {t1}")
-                print(f"Temperature 2 (°k): {t2}")
-                print("-" * 40)
-
-                w.TP = t1, p1+101325  # Ensure the attribute name 'TP' exists in WaterWithTransport
-                h1 = w.h
-                s2s = w.s
-                Q2s = 1.0
-                w.PQ = p2+101325, Q2s
-                h2s = w.h
-                w.TP = t2, p2
-                h2 = w.h
-                
-                print(h1)
-                print(h2s)
-                print(h2)
-                
-                eff = -1*(h1 - h2)/(h1 - h2s)  # Adjust as needed
-                uniterg = (h1 - h2) * eff
-
-                if (initial_run):
-                    p1d = p1
-                    p2d = p2
-                    t1d = t1
-                    t2d = t2
-                    effd = eff
-                    initial_run = False
-
-                # Perform calculations using the data
-                
-               
-                
-                if(effd<0.93 and not initial_run):
-                    t1d+=t1d*0.02*(0.93-effd)
-                    p1d+=p1d*0.02*(0.93-effd)
-                    p2d-=p2d*0.02*(0.93-effd)
-                    
-                w.TP = t1d,p1d
-                h1d = w.h
-                s2s = w.s
-                Q2s = 1.0
-                w.PQ = p2d+101325, Q2s
-                h2sd = w.h
-                w.TP = t2d, p2d
-                h2d = w.h
-                effd = -1*(h1d - h2d)/(h1d - h2sd)
-                
-                print(f"Efficiency: {eff}")
-                print(f"Unit Energy: {uniterg}")
-                print(f"Efficiency fix: {effd}")
-                print(f"Unit Energy: {(h1d-h2d)*effd}")
-
-                data = [eff, effd]
-
-                output_file = "C:\\Users\\ZainP\\Documents\\Qhacks\\ThermoLogic\\models\\factorydata.csv"
-
-                with open(output_file, mode="a", newline="") as file:
-                    writer = csv.writer(file)
-                    writer.writerow(data)   # Write the data rows
-
-            except ValueError as e:
-                print("Error parsing data:", e)
+        writer.flush_if_due()
+        metrics.summary_if_due(logger, summary_interval)
+        waiting = ser.in_waiting
+        if not waiting:
+            time.sleep(poll_interval)
+            continue
+
+        # Read whatever has arrived and split it into readings (text lines or binary frames)
+        with metrics.time("read"):
+            data = ser.read(waiting)
+        with metrics.time("parse"):
+            readings = decoder.feed(data)
+        for name, new in metrics.sync_counters(decoder.stats, seen_counts).items():
+            if name in ("parse_errors", "crc_errors", "dropped_frames", "sequence_resets"):
+                logger.warning("%d new %s", new, name.replace("_", " "))
+        # Skip non-numeric or debug messages
+        while decoder.messages:
+            logger.info("Non-numeric data received: %s", decoder.messages.popleft())
+
+        for p1, p2, t1, t2 in readings:
+            logger.debug("Pressure 1 (Pa): %s  Pressure 2 (Pa): %s  Temperature 1 (°k): %s  "
+                         "Temperature 2 (°k): %s", p1, p2, t1, t2)
+
+            with metrics.time("efficiency"):
+                eff, uniterg = sample_efficiency(props, p1, p2, t1, t2)
+                effd, uniterg_d = design.update(props, p1, p2, t1, t2, eff)
+            logger.debug("Efficiency: %s  Unit Energy: %s  Efficiency fix: %s  Unit Energy: %s",
+                         eff, uniterg, effd, uniterg_d)
+
+            now = time.time()
+            rolling.add(now, eff=eff, uniterg=uniterg, effd=effd)
+            with metrics.time("write"):
+                if ring is not None:
+                    ring.write(now, p1, p2, t1, t2, eff, effd)
+                writer.write(eff, effd, sensor_id=arduino_port)
 
 finally:
+    # Write out any buffered rows before exiting
+    writer.close()
+    if ring is not None:
+        ring.close()
     ser.close()
+    logger.info(metrics.summary())
@@ -0,0 +1,360 @@
+"""
+Isentropic efficiency and unit energy for turbine readings.
+
+The math is the same as the serial loop in app.py, pulled out so it can run on
+whole NumPy arrays of (p1, p2, t1, t2) at once: a replayed log, or one frame
+from several sensors. Pressures are gauge readings in Pa as sent by qHACKS.ino,
+temperatures are in K.
+
+`DesignPoint` carries the "efficiency fix" state (the design operating point
+that is nudged towards the 0.93 target) from one reading to the next. With
+mode="solve" it instead asks a `DesignSolver` for the point that reaches the
+target from each reading's own conditions, in one call.
+
+Run this file on a CSV of raw readings to reprocess it in one go:
+
+    python efficiency.py readings.csv output.csv
+"""
+import math
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from cantera import CanteraError
+
+from properties import load_properties
+
+ATMOSPHERIC_PRESSURE = 101325.0
+
+# Arrays returned by batch_efficiency, one value per reading
+EfficiencyBatch = namedtuple("EfficiencyBatch", ["eff", "uniterg", "effd", "uniterg_d"])
+
+# Result of DesignSolver.solve; scale is the factor applied to t1 and p1 (p2 is divided by it)
+DesignSolution = namedtuple("DesignSolution", ["p1d", "p2d", "t1d", "t2d", "effd", "uniterg_d", "scale",
+                                               "iterations", "seconds", "converged"])
+
+
+def isentropic_efficiency(h1, h2, h2s):
+    """Efficiency from inlet, actual outlet and isentropic outlet enthalpies."""
+    return -1*(h1 - h2)/(h1 - h2s)
+
+
+def measured_enthalpies(props, p1, p2, t1, t2):
+    """h1, h2s, h2 for measured readings (scalars or arrays)."""
+    h1 = props.h_tp(t1, p1 + ATMOSPHERIC_PRESSURE)
+    h2s = props.h_sat_vap(p2 + ATMOSPHERIC_PRESSURE)
+    h2 = props.h_tp(t2, p2)
+    return h1, h2s, h2
+
+
+def design_enthalpies(props, p1d, p2d, t1d, t2d):
+    """h1d, h2sd, h2d for the design point.
+
+    The inlet state uses p1d without the atmospheric offset, exactly as the
+    original serial loop did, so reprocessed logs match the live output.
+    """
+    h1d = props.h_tp(t1d, p1d)
+    h2sd = props.h_sat_vap(p2d + ATMOSPHERIC_PRESSURE)
+    h2d = props.h_tp(t2d, p2d)
+    return h1d, h2sd, h2d
+
+
+def sample_efficiency(props, p1, p2, t1, t2):
+    """Efficiency and unit energy for readings; works on scalars and arrays alike."""
+    h1, h2s, h2 = measured_enthalpies(props, p1, p2, t1, t2)
+    eff = isentropic_efficiency(h1, h2, h2s)
+    uniterg = (h1 - h2) * eff
+    return eff, uniterg
+
+
+class DesignSolver:
+    """
+    Design point reaching the target efficiency, solved directly from one reading.
+
+    The nudge raises t1d and p1d and lowers p2d by the same small fraction each
+    step. The solver searches that same direction in one go: with scale
+    f = exp(u), t1d = t1*f, p1d = p1*f, p2d = p2/f and t2d = t2. It finds the
+    smallest u >= 0 where
+
+        g(u) = (h2d - h1d) - target*(h1d - h2sd) = 0
+
+    This is effd = target without the division, so it has no pole where
+    h1d = h2sd. A doubling scan brackets the first sign change, then the
+    Illinois variant of false position narrows it to `tol`. Each g
+    evaluation is one design_enthalpies call (three property lookups).
+
+    Pressures are quantized to a relative `pressure_tolerance` (bins of equal
+    ratio; below `pressure_floor` Pa they share one bin), temperatures to
+    `temperature_step` K, and the solution for the quantized reading is kept in
+    an LRU cache, so repeated sensor values (the rig's ADC and thermocouples
+    are coarse) cost nothing. When no sign change is found up to `max_scale`,
+    or the interval has not narrowed to `tol` within `max_iterations`
+    evaluations, the closest point found is returned with converged=False.
+    """
+
+    def __init__(self, target=0.93, pressure_tolerance=1e-4, pressure_floor=1.0, temperature_step=0.25,
+                 cache_size=4096, max_scale=3.0, tol=1e-6, max_iterations=50):
+        self.target = target
+        self.pressure_tolerance = pressure_tolerance
+        self.pressure_floor = pressure_floor
+        # Ratio between consecutive pressure bins; a bin's centre is within the tolerance of all its values
+        self._log_ratio = math.log((1 + pressure_tolerance) / (1 - pressure_tolerance))
+        self.temperature_step = temperature_step
+        self.cache_size = cache_size
+        self.max_u = math.log(max_scale)
+        self.tol = tol
+        self.max_iterations = max_iterations
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.iterations = 0
+        self.solve_seconds = 0.0
+
+    def _pressure_bin(self, p):
+        if abs(p) < self.pressure_floor:
+            return 0
+        k = round(math.log(abs(p) / self.pressure_floor) / self._log_ratio) + 1
+        return k if p > 0 else -k
+
+    def _pressure(self, k):
+        """Centre of pressure bin k."""
+        if k == 0:
+            return 0.0
+        p = self.pressure_floor * math.exp((abs(k) - 1) * self._log_ratio)
+        return p if k > 0 else -p
+
+    def _key(self, p1, p2, t1, t2):
+        return (self._pressure_bin(p1), self._pressure_bin(p2),
+                round(t1 / self.temperature_step), round(t2 / self.temperature_step))
+
+    def solve(self, props, p1, p2, t1, t2):
+        """DesignSolution for one reading, from the cache when an equal quantized reading was solved."""
+        key = self._key(p1, p2, t1, t2)
+        solution = self._cache.get(key)
+        if solution is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return solution
+
+        self.misses += 1
+        start = time.perf_counter()
+        solution = self._solve(props, self._pressure(key[0]), self._pressure(key[1]),
+                               key[2] * self.temperature_step, key[3] * self.temperature_step)
+        seconds = time.perf_counter() - start
+        solution = solution._replace(seconds=seconds)
+        self.iterations += solution.iterations
+        self.solve_seconds += seconds
+
+        self._cache[key] = solution
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return solution
+
+    def _solve(self, props, p1, p2, t1, t2):
+        evaluations = 0
+
+        def g(u):
+            nonlocal evaluations
+            evaluations += 1
+            f = math.exp(u)
+            h1d, h2sd, h2d = design_enthalpies(props, p1*f, p2/f, t1*f, t2)
+            return (h2d - h1d) - self.target*(h1d - h2sd)
+
+        def result(u, converged):
+            f = math.exp(u)
+            p1d, p2d, t1d = p1*f, p2/f, t1*f
+            h1d, h2sd, h2d = design_enthalpies(props, p1d, p2d, t1d, t2)
+            effd = isentropic_efficiency(h1d, h2d, h2sd)
+            return DesignSolution(p1d, p2d, t1d, t2, effd, (h1d - h2d)*effd, f, evaluations, 0.0, converged)
+
+        # Bracket the first sign change: u = 0, 0.01, 0.02, 0.04, ... up to max_u
+        a, ga = 0.0, g(0.0)
+        best_u, best_g = a, abs(ga)
+        if ga == 0:
+            return result(a, True)
+        b = min(0.01, self.max_u)
+        while True:
+            try:
+                gb = g(b)
+            except (CanteraError, ValueError):
+                gb = None  # Outside the property range; search no further
+            if gb is None:
+                return result(best_u, False)
+            if abs(gb) < best_g:
+                best_u, best_g = b, abs(gb)
+            if gb == 0 or (ga < 0) != (gb < 0):
+                break
+            if b >= self.max_u:
+                return result(best_u, False)
+            a, ga = b, gb
+            b = min(2*b, self.max_u)
+
+        # Illinois false position on [a, b]
+        side = 0
+        u = b
+        converged = gb == 0
+        while not converged:
+            if b - a <= self.tol:
+                converged = True
+                break
+            if evaluations >= self.max_iterations:
+                break
+            u = (a*gb - b*ga)/(gb - ga)
+            gu = g(u)
+            if gu == 0:
+                converged = True
+                break
+            if (gu < 0) == (gb < 0):
+                b, gb = u, gu
+                if side == -1:
+                    ga /= 2
+                side = -1
+            else:
+                a, ga = u, gu
+                if side == 1:
+                    gb /= 2
+                side = 1
+        return result(u, converged)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cached": len(self._cache),
+            "mean_iterations": self.iterations / self.misses if self.misses else 0.0,
+            "mean_solve_seconds": self.solve_seconds / self.misses if self.misses else 0.0,
+        }
+
+
+class DesignPoint:
+    """Design operating point, nudged towards the target efficiency one reading at a time.
+
+    mode="solve" replaces the nudge with DesignSolver: every reading gets the
+    design point that reaches the target from its own conditions. A reading
+    that already meets the target is its own design point.
+
+    Readings with non-finite values (or a non-finite efficiency, in nudge
+    mode before the first usable reading) get NaN and leave the design point
+    as it is; the nudge starts from the first usable reading, and starts over
+    if its design point stops giving a finite efficiency.
+    """
+
+    TARGET_EFFICIENCY = 0.93
+    NUDGE_GAIN = 0.02
+    MODES = ("nudge", "solve")
+
+    # One of these per unit in fleet mode (fleet.py); slots keep them small
+    __slots__ = ("mode", "solver", "last_solution", "initialized", "p1d", "p2d", "t1d", "t2d", "effd")
+
+    def __init__(self, mode="nudge", solver=None):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode!r}")
+        self.mode = mode
+        self.solver = solver
+        if mode == "solve" and solver is None:
+            self.solver = DesignSolver(self.TARGET_EFFICIENCY)
+        self.last_solution = None
+        self.initialized = False
+        self.p1d = 0
+        self.p2d = 0
+        self.t1d = 0
+        self.t2d = 0
+        self.effd = 0
+
+    def update(self, props, p1, p2, t1, t2, eff):
+        """Advance by one reading and return (effd, unit energy at the design point)."""
+        if not (math.isfinite(p1) and math.isfinite(p2) and math.isfinite(t1) and math.isfinite(t2)):
+            return math.nan, math.nan
+        if self.mode == "solve":
+            if eff >= self.TARGET_EFFICIENCY:
+                # Nothing to fix; solving would move it to exactly the target
+                _, uniterg = sample_efficiency(props, p1, p2, t1, t2)
+                solution = DesignSolution(p1, p2, t1, t2, eff, uniterg, 1.0, 0, 0.0, True)
+            else:
+                solution = self.solver.solve(props, p1, p2, t1, t2)
+            self.last_solution = solution
+            self.p1d, self.p2d, self.t1d, self.t2d = solution.p1d, solution.p2d, solution.t1d, solution.t2d
+            self.effd = solution.effd
+            self.initialized = True
+            return solution.effd, solution.uniterg_d
+
+        if not self.initialized:
+            if not math.isfinite(eff):
+                return math.nan, math.nan  # Nothing to nudge from yet
+            self.p1d = p1
+            self.p2d = p2
+            self.t1d = t1
+            self.t2d = t2
+            self.effd = eff
+            self.initialized = True
+
+        if self.effd < self.TARGET_EFFICIENCY:
+            step = self.NUDGE_GAIN*(self.TARGET_EFFICIENCY - self.effd)
+            self.t1d += self.t1d*step
+            self.p1d += self.p1d*step
+            self.p2d -= self.p2d*step
+
+        h1d, h2sd, h2d = design_enthalpies(props, self.p1d, self.p2d, self.t1d, self.t2d)
+        self.effd = isentropic_efficiency(h1d, h2d, h2sd)
+        if not math.isfinite(self.effd):
+            self.initialized = False  # Start over from the next usable reading
+        return self.effd, (h1d - h2d)*self.effd
+
+
+def batch_efficiency(p1, p2, t1, t2, props=None, design=None):
+    """
+    Efficiency, unit energy and design-point efficiency for arrays of readings.
+
+    `eff` and `uniterg` are computed for all readings in one vectorized call.
+    The design point only depends on the first reading and its own previous
+    value, so `effd` is advanced reading by reading through `design`; pass the
+    same DesignPoint to consecutive calls to continue a stream across batches.
+    Readings whose design point leaves Cantera's valid range get NaN for `effd`.
+    """
+    if props is None:
+        props = load_properties()
+    if design is None:
+        design = DesignPoint()
+
+    p1, p2, t1, t2 = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (p1, p2, t1, t2)))
+    eff, uniterg = sample_efficiency(props, p1, p2, t1, t2)
+    eff = np.asarray(eff, dtype=float)
+    uniterg = np.asarray(uniterg, dtype=float)
+
+    effd = np.empty(p1.shape)
+    uniterg_d = np.empty(p1.shape)
+    for k in range(p1.size):
+        try:
+            effd.flat[k], uniterg_d.flat[k] = design.update(
+                props, float(p1.flat[k]), float(p2.flat[k]), float(t1.flat[k]), float(t2.flat[k]),
+                float(eff.flat[k]))
+        except CanteraError:
+            effd.flat[k] = uniterg_d.flat[k] = np.nan
+
+    return EfficiencyBatch(eff, uniterg, effd, uniterg_d)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python efficiency.py <readings.csv with p1,p2,t1,t2> <output.csv>")
+        sys.exit(1)
+
+    # Keep only complete "p1,p2,t1,t2" lines; debug output such as "Starting..." is skipped
+    rows = []
+    with open(sys.argv[1], "r") as file:
+        for line in file:
+            fields = line.strip().split(",")
+            if len(fields) != 4:
+                continue
+            try:
+                rows.append([float(x) for x in fields])
+            except ValueError:
+                continue
+    readings = np.array(rows, dtype=float).reshape(-1, 4)
+    result = batch_efficiency(readings[:, 0], readings[:, 1], readings[:, 2], readings[:, 3])
+    np.savetxt(sys.argv[2], np.column_stack([result.eff, result.effd]), delimiter=",",
+               header="eff,effnew", comments="")
+    print(f"Processed {len(readings)} readings into {sys.argv[2]}")
@@ -0,0 +1,225 @@
+"""
+Fleet mode: readings from many turbines processed by a pool of worker processes.
+
+With use_tables (--tables) the property tables are loaded (or built, once)
+in the main process before the pool starts and each worker loads that file;
+otherwise the workers use plain Cantera. Each worker keeps one DesignPoint
+per unit it owns. A unit always goes to the same
+worker, picked by a stable hash of its name, so its design-point state never
+has to move. The worker also sees the unit's readings in arrival order, so
+the nudge advances exactly as it would in a single process. Readings are
+sent in batches to keep the pickling overhead per reading low. Results come
+back on one queue and are handled in the main process, so the fleet still
+writes a single output stream.
+
+If a worker dies (killed for memory, a Cantera abort), the readings it held
+never come back. FleetProcessor.check() raises FleetError with their number,
+and also when no result has arrived for `timeout` seconds while readings are
+in flight, so waiting for the fleet to drain cannot hang.
+
+    python fleet.py --units 64 --readings 200 --workers 1 2 4   # throughput per pool size
+    python ingest.py --replay readings.csv --speed 0 --workers 4 --output fleet.csv
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from collections import namedtuple
+
+from efficiency import DesignPoint, DesignSolver, sample_efficiency
+from properties import CanteraProperties, WaterTables
+from sources import Reading
+
+# One processed reading; error is None or the message of the exception it raised
+UnitResult = namedtuple("UnitResult", ["reading", "eff", "uniterg", "effd", "error"])
+
+
+class FleetError(RuntimeError):
+    """Readings sent to the workers can no longer come back."""
+
+
+def worker_for(unit, workers):
+    """Index of the worker that owns `unit` (the same in every process and run)."""
+    return zlib.crc32(str(unit).encode("utf-8")) % workers
+
+
+def _worker(inbox, outbox, tables_path, design_mode):
+    if tables_path:
+        props = WaterTables()
+        props.load(tables_path)
+    else:
+        props = CanteraProperties()
+    solver = DesignSolver(DesignPoint.TARGET_EFFICIENCY) if design_mode == "solve" else None
+    designs = {}
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            return
+        results = []
+        for reading in batch:
+            try:
+                design = designs.get(reading.port)
+                if design is None:
+                    design = designs[reading.port] = DesignPoint(design_mode, solver)
+                eff, uniterg = sample_efficiency(props, reading.p1, reading.p2, reading.t1, reading.t2)
+                effd, _ = design.update(props, reading.p1, reading.p2, reading.t1, reading.t2, eff)
+                results.append(UnitResult(reading, float(eff), float(uniterg), float(effd), None))
+            except Exception as e:
+                results.append(UnitResult(reading, math.nan, math.nan, math.nan, str(e)))
+        outbox.put(results)
+
+
+class FleetProcessor:
+    """Route Readings to worker processes by unit and collect their results."""
+
+    def __init__(self, workers=None, use_tables=False, design_mode="nudge", batch_size=64, timeout=60.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.use_tables = use_tables
+        self.design_mode = design_mode
+        self.inboxes = [multiprocessing.Queue() for _ in range(self.workers)]
+        self.outbox = multiprocessing.Queue()
+        self.processes = []
+        self.pending = [[] for _ in range(self.workers)]
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        # Readings submitted to each worker and not yet returned
+        self.outstanding = [0] * self.workers
+        self.last_result = time.monotonic()
+
+    def start(self):
+        tables_path = None
+        if self.use_tables:
+            # Build a missing cache here, once, rather than in every worker at the same time
+            tables_path = WaterTables.load_or_build(verbose=False).cache_path()
+        self.processes = [
+            multiprocessing.Process(target=_worker, args=(inbox, self.outbox, tables_path, self.design_mode),
+                                    daemon=True)
+            for inbox in self.inboxes
+        ]
+        for process in self.processes:
+            process.start()
+        return self
+
+    def submit(self, reading):
+        k = worker_for(reading.port, self.workers)
+        if not self.in_flight:
+            self.last_result = time.monotonic()  # The timeout runs from here
+        self.pending[k].append(reading)
+        self.outstanding[k] += 1
+        self.submitted += 1
+        if len(self.pending[k]) >= self.batch_size:
+            self._send(k)
+
+    def _send(self, k):
+        self.inboxes[k].put(self.pending[k])
+        self.pending[k] = []
+
+    def flush(self):
+        """Send the partly filled batches, e.g. when no more readings are waiting."""
+        for k in range(self.workers):
+            if self.pending[k]:
+                self._send(k)
+
+    @property
+    def in_flight(self):
+        return self.submitted - self.completed
+
+    def get_results(self, timeout=None):
+        """The next batch of UnitResults from any worker; [] if none arrives within timeout."""
+        try:
+            results = self.outbox.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        self.completed += len(results)
+        self.errors += sum(1 for result in results if result.error is not None)
+        self.outstanding[worker_for(results[0].reading.port, self.workers)] -= len(results)
+        self.last_result = time.monotonic()
+        return results
+
+    def check(self):
+        """Raise FleetError if readings in flight will not come back: a worker died, or none came for `timeout` s."""
+        if not self.in_flight:
+            return
+        # A dead worker's last results may still be queued; only count it once they are collected
+        if self.outbox.empty():
+            for k, process in enumerate(self.processes):
+                if self.outstanding[k] and not process.is_alive():
+                    raise FleetError(f"worker {k} exited with code {process.exitcode}; "
+                                     f"{self.outstanding[k]} of {self.in_flight} readings in flight are lost")
+        if self.timeout is not None and time.monotonic() - self.last_result > self.timeout:
+            raise FleetError(f"no results for {self.timeout:.0f} s; {self.in_flight} readings in flight are lost")
+
+    def close(self):
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def process_all(readings, workers=None, use_tables=False, design_mode="nudge", batch_size=64, handle=None):
+    """
+    Process an iterable of Readings with a FleetProcessor; returns the number
+    of results. Raises FleetError if a worker dies or stops answering.
+    """
+    fleet = FleetProcessor(workers, use_tables, design_mode, batch_size).start()
+
+    def collect():
+        results = fleet.get_results(timeout=0.2)
+        if not results:
+            fleet.check()
+        for result in results:
+            if handle:
+                handle(result)
+
+    try:
+        for reading in readings:
+            fleet.submit(reading)
+            # Collect as we go so the result queue never backs up
+            while fleet.in_flight > 4 * fleet.workers * batch_size:
+                collect()
+        fleet.flush()
+        while fleet.in_flight:
+            collect()
+        return fleet.completed
+    finally:
+        fleet.close()
+
+
+def synthetic_fleet(units, readings_per_unit, seed=0):
+    """Interleaved Readings from `units` synthetic rigs, one per unit per second."""
+    from loopback import synthetic_readings
+
+    data = [synthetic_readings(readings_per_unit, seed=seed + k) for k in range(units)]
+    for i in range(readings_per_unit):
+        for k in range(units):
+            yield Reading(f"unit-{k}", float(i), *map(float, data[k][i]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of fleet processing per worker count.")
+    parser.add_argument("--units", type=int, default=64)
+    parser.add_argument("--readings", type=int, default=200, help="readings per unit")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--design", choices=DesignPoint.MODES, default="solve")
+    parser.add_argument("--tables", action="store_true", help="the cached property tables instead of Cantera")
+    args = parser.parse_args()
+
+    total = args.units * args.readings
+    for workers in args.workers:
+        start = time.perf_counter()
+        count = process_all(synthetic_fleet(args.units, args.readings), workers, args.tables, args.design)
+        seconds = time.perf_counter() - start
+        print(f"{workers} workers: {count}/{total} readings in {seconds:.2f} s ({count / seconds:.0f} readings/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Asyncio ingestion for several Arduino rigs in one process.
+
+One reader task per configured port pulls whatever bytes are available (the
+blocking pyserial read runs in a thread, so there are no polling sleeps),
+frames them into lines and puts parsed readings on one shared asyncio.Queue.
+The queue is bounded: when processing falls behind, readers wait on `put`
+and the serial drivers buffer the backlog instead of memory growing unbounded.
+
+Ports are opened with serial.serial_for_url, so besides "COM3" or
+"/dev/ttyACM0" any pyserial URL such as "socket://host:port" works.
+
+    python ingest.py COM3 COM4 --output factorydata.csv --store factory_store
+    python ingest.py --loopback 3     # three fake rigs on pseudo-terminals
+    python ingest.py COM3 --record readings.csv
+    python ingest.py --replay readings.csv --speed 0 --output backfill.csv
+
+Stage timings, line counters and the queue depth are logged every
+--summary-interval seconds and served on --metrics-port (see instrumentation.py),
+along with rolling 1 min / 1 h / 24 h statistics of the results (rolling.py,
+also as JSON on /rolling); --log-level DEBUG logs every reading.
+
+--replay feeds the same pipeline from a recording or a raw capture instead of
+ports (see sources.py), at --speed times real time (0: as fast as possible).
+A raw capture has no timestamps: its readings are --interval seconds apart
+and end at the file's modification time, or start at --start-time.
+
+With --loopback or --replay the design point is solved per reading by
+default (--design solve): the synthetic readings' efficiency stays below the
+target, so the inherited nudge keeps raising the design temperature until
+Cantera rejects it and almost every reading becomes a processing error.
+
+--live-ring [NAME] also writes every result to the shared-memory ring the GUI
+plots from (see models/live_ring.py).
+
+--workers N computes the efficiencies in N worker processes instead of this
+one (see fleet.py), each owning a fixed share of the units; results still
+come back here and go to the one output file.
+
+--tables uses the cached water property tables instead of Cantera (see
+properties.py): much faster, with enthalpies within 1 kJ/kg of Cantera's.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+from efficiency import DesignPoint, DesignSolver, sample_efficiency
+from fleet import FleetProcessor
+from instrumentation import InstrumentedProperties, LoopMetrics, configure_logging, start_metrics_server
+from loopback import SAMPLE_INTERVAL_BINARY, SAMPLE_INTERVAL_TEXT
+from properties import load_properties
+from protocol import BINARY_BAUD_RATE, StreamDecoder
+from rolling import RollingStats
+from sources import Reading, ReadingRecorder, ReplaySource, open_replay, parse_time
+from writer import TelemetryWriter
+
+# The columnar telemetry store lives with the models
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models"))
+
+logger = logging.getLogger("thermologic.ingest")
+
+
+class SerialIngest:
+    """Read N serial ports concurrently into one bounded queue of Readings."""
+
+    def __init__(self, ports, baud_rate=9600, queue_size=1000, read_timeout=0.5, metrics=None):
+        self.ports = list(ports)
+        self.baud_rate = baud_rate
+        self.read_timeout = read_timeout
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.metrics = metrics or LoopMetrics()
+        self.metrics.gauge("queue_depth", self.queue.qsize)
+        # Per-port StreamDecoder counters (lines, frames, readings, crc_errors, dropped_frames, ...)
+        self.stats = {port: {} for port in self.ports}
+        # One thread per port for the blocking reads
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.ports), 1))
+        self._stopping = False
+
+    def _open(self, port):
+        return serial.serial_for_url(port, self.baud_rate, timeout=self.read_timeout)
+
+    @staticmethod
+    def _read_chunk(ser):
+        # Returns as soon as one byte is there, then takes whatever else has arrived
+        return ser.read(max(1, ser.in_waiting))
+
+    async def _read_port(self, port):
+        loop = asyncio.get_running_loop()
+        ser = await loop.run_in_executor(self._executor, self._open, port)
+        decoder = StreamDecoder()
+        metrics = self.metrics
+        try:
+            while not self._stopping:
+                # Not timed: the read blocks until bytes arrive
+                data = await loop.run_in_executor(self._executor, self._read_chunk, ser)
+                if not data:
+                    continue
+                start = time.perf_counter()
+                readings = decoder.feed(data)
+                metrics.observe("parse", time.perf_counter() - start)
+                for name, new in metrics.sync_counters(decoder.stats, self.stats[port]).items():
+                    if name in ("parse_errors", "crc_errors", "dropped_frames", "sequence_resets"):
+                        logger.warning("%s: %d new %s", port, new, name.replace("_", " "))
+                while decoder.messages:
+                    logger.info("%s: Non-numeric data received: %s", port, decoder.messages.popleft())
+                for values in readings:
+                    # Waits here when the queue is full (backpressure)
+                    await self.queue.put(Reading(port, time.time(), *values))
+        finally:
+            ser.close()
+
+    async def run(self):
+        """Read all ports until stop() is called or a port fails."""
+        try:
+            await asyncio.gather(*(self._read_port(port) for port in self.ports))
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def stop(self):
+        self._stopping = True
+
+
+async def process_readings(queue, props, handle=None, metrics=None, design_mode="nudge", recorder=None,
+                           rolling=None):
+    """
+    Consume readings from the shared queue, one design point per port.
+    With design_mode="solve" the ports share one DesignSolver and its cache.
+    A ReadingRecorder, if given, saves every reading before it is processed,
+    and a RollingStats gets every result, at its arrival time.
+
+    `handle(reading, eff, uniterg, effd)` is called for every reading; by
+    default the result is logged. With `metrics`, the computation is timed
+    as the "efficiency" stage and `handle` as the "write" stage.
+    """
+    metrics = metrics or LoopMetrics()
+    solver = None
+    if design_mode == "solve":
+        solver = DesignSolver(DesignPoint.TARGET_EFFICIENCY)
+        metrics.gauge("design_cache_hit_rate", lambda: round(solver.stats()["hit_rate"], 4))
+        metrics.gauge("design_solve_iterations_mean", lambda: round(solver.stats()["mean_iterations"], 2))
+    designs = {}
+    while True:
+        reading = await queue.get()
+        try:
+            if recorder is not None:
+                recorder.write(reading)
+            design = designs.get(reading.port)
+            if design is None:
+                design = designs[reading.port] = DesignPoint(design_mode, solver)
+            with metrics.time("efficiency"):
+                eff, uniterg = sample_efficiency(props, reading.p1, reading.p2, reading.t1, reading.t2)
+                effd, _ = design.update(props, reading.p1, reading.p2, reading.t1, reading.t2, eff)
+            if rolling is not None:
+                rolling.add(time.time(), eff=eff, uniterg=uniterg, effd=effd)
+            if handle is None:
+                logger.info("%s: Efficiency: %.4f  Unit Energy: %.1f  Efficiency fix: %.4f",
+                            reading.port, eff, uniterg, effd)
+            else:
+                logger.debug("%s: Efficiency: %.4f  Unit Energy: %.1f  Efficiency fix: %.4f",
+                             reading.port, eff, uniterg, effd)
+                with metrics.time("write"):
+                    handle(reading, eff, uniterg, effd)
+        except Exception as e:
+            metrics.count("processing_errors")
+            logger.warning("%s: Error processing reading: %s", reading.port, e)
+        finally:
+            queue.task_done()
+
+
+async def process_fleet(queue, fleet, handle=None, metrics=None, recorder=None, rolling=None):
+    """
+    Consume readings from the shared queue with a FleetProcessor.
+
+    Readings are handed to the workers as they arrive; a partly filled batch
+    is sent as soon as the queue runs empty, so a slow trickle is not held
+    back. `handle` and `rolling` are used here, in the main process, exactly
+    like in process_readings(). The "efficiency" stage runs in the workers and is not
+    timed; fleet_in_flight counts readings sent but not yet returned.
+    """
+    metrics = metrics or LoopMetrics()
+    metrics.gauge("fleet_in_flight", lambda: fleet.in_flight)
+    collector = asyncio.create_task(_collect_fleet(fleet, handle, metrics, rolling))
+    try:
+        while True:
+            reading = await queue.get()
+            try:
+                if recorder is not None:
+                    recorder.write(reading)
+                fleet.submit(reading)
+            except Exception as e:
+                metrics.count("processing_errors")
+                logger.warning("%s: Error submitting reading: %s", reading.port, e)
+            finally:
+                queue.task_done()
+            if queue.empty():
+                fleet.flush()
+    finally:
+        collector.cancel()
+
+
+async def _collect_fleet(fleet, handle, metrics, rolling):
+    loop = asyncio.get_running_loop()
+    while True:
+        # Short timeout so the thread is free soon after cancellation
+        for reading, eff, uniterg, effd, error in await loop.run_in_executor(None, fleet.get_results, 0.2):
+            if error is not None:
+                metrics.count("processing_errors")
+                logger.warning("%s: Error processing reading: %s", reading.port, error)
+                continue
+            if rolling is not None:
+                rolling.add(time.time(), eff=eff, uniterg=uniterg, effd=effd)
+            if handle is None:
+                logger.info("%s: Efficiency: %.4f  Unit Energy: %.1f  Efficiency fix: %.4f",
+                            reading.port, eff, uniterg, effd)
+                continue
+            logger.debug("%s: Efficiency: %.4f  Unit Energy: %.1f  Efficiency fix: %.4f",
+                         reading.port, eff, uniterg, effd)
+            try:
+                with metrics.time("write"):
+                    handle(reading, eff, uniterg, effd)
+            except Exception as e:
+                metrics.count("processing_errors")
+                logger.warning("%s: Error writing result: %s", reading.port, e)
+
+
+async def _log_summaries(metrics, interval):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(metrics.summary())
+
+
+async def _feed_rig(rig, interval=1.0, seed=0, binary=False):
+    """Send synthetic qHACKS.ino lines (or binary frames) to a fake rig, one per interval."""
+    from loopback import synthetic_frames, synthetic_lines
+
+    for message in (synthetic_frames if binary else synthetic_lines)(seed=seed):
+        rig.write(message)
+        await asyncio.sleep(interval)
+
+
+async def main(ports, loopback=0, output_file=None, store_dir=None, metrics_port=None, summary_interval=60.0,
+               design_mode="nudge", baud_rate=9600, binary=False, interval=1.0, replay=None, speed=1.0,
+               record=None, workers=0, live_ring=None, rotate_mb=None, rollups=False, use_tables=False,
+               start_time=None):
+    rigs = []
+    feeders = []
+    if loopback:
+        from loopback import PtyRig
+
+        rigs = [PtyRig() for _ in range(loopback)]
+        ports = [rig.port for rig in rigs]
+        feeders = [asyncio.create_task(_feed_rig(rig, interval, seed=k, binary=binary))
+                   for k, rig in enumerate(rigs)]
+
+    handle = None
+    writer = None
+    ring = None
+    if output_file:
+        store = None
+        if store_dir:
+            from telemetry_store import FACTORY_COLUMNS, ColumnStore
+
+            store = ColumnStore(store_dir, FACTORY_COLUMNS)
+        retention = summaries = None
+        if rotate_mb or rollups:
+            from retention import Retention, Rollups
+
+            if rotate_mb:
+                retention = Retention(output_file, max_bytes=int(rotate_mb * 2**20))
+            if rollups:
+                summaries = Rollups(output_file)
+        writer = TelemetryWriter(output_file, store=store, retention=retention, rollups=summaries)
+    if live_ring:
+        from live_ring import RingWriter
+
+        ring = RingWriter(live_ring)
+    if writer is not None or ring is not None:
+        def handle(reading, eff, uniterg, effd):
+            if ring is not None:
+                ring.write(reading.timestamp, reading.p1, reading.p2, reading.t1, reading.t2, eff, effd)
+            if writer is not None:
+                writer.write(eff, effd, sensor_id=reading.port, timestamp=reading.timestamp)
+
+    metrics = LoopMetrics()
+    rolling = RollingStats()
+    metrics.add_collector(rolling.render)
+    if metrics_port:
+        start_metrics_server(metrics, metrics_port, rolling=rolling)
+    if replay:
+        ingest = ReplaySource(open_replay(replay, interval=interval, start_time=start_time), speed, metrics=metrics)
+    else:
+        ingest = SerialIngest(ports, baud_rate, metrics=metrics)
+    recorder = ReadingRecorder(record) if record else None
+    fleet = None
+    if workers:
+        fleet = FleetProcessor(workers, use_tables, design_mode=design_mode).start()
+        consumer = asyncio.create_task(process_fleet(ingest.queue, fleet, handle, metrics, recorder, rolling))
+    else:
+        props = InstrumentedProperties(load_properties(use_tables), metrics)
+        consumer = asyncio.create_task(process_readings(ingest.queue, props, handle, metrics, design_mode,
+                                                        recorder, rolling))
+    background = [consumer]
+    if summary_interval:
+        background.append(asyncio.create_task(_log_summaries(metrics, summary_interval)))
+    try:
+        await ingest.run()
+        # A replay ends on its own; let the consumer finish what is queued
+        await ingest.queue.join()
+        if fleet is not None:
+            fleet.flush()
+            while fleet.in_flight:
+                fleet.check()
+                await asyncio.sleep(0.01)
+        if replay:
+            seconds = time.monotonic() - ingest.started
+            count = ingest.stats["readings"]
+            logger.info("Replayed %d readings in %.2f s (%.0f readings/s)", count, seconds,
+                        count / max(seconds, 1e-9))
+    finally:
+        ingest.stop()
+        for task in feeders + background:
+            task.cancel()
+        if fleet is not None:
+            fleet.close()
+        for rig in rigs:
+            rig.close()
+        if writer is not None:
+            writer.close()
+        if ring is not None:
+            ring.close()
+        if recorder is not None:
+            recorder.close()
+        logger.info(metrics.summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read several Arduino rigs concurrently.")
+    parser.add_argument("ports", nargs="*", help="serial ports or pyserial URLs")
+    parser.add_argument("--loopback", type=int, default=0, metavar="N",
+                        help="ignore ports and run N fake rigs on pseudo-terminals")
+    parser.add_argument("--baud", type=int, help=f"baud rate (default: 9600, or {BINARY_BAUD_RATE} with --binary)")
+    parser.add_argument("--binary", action="store_true",
+                        help="the rigs send binary frames (text is still accepted); with --loopback, send frames")
+    parser.add_argument("--interval", type=float,
+                        help="seconds between --loopback readings, and between readings of a replayed raw capture "
+                             f"(default: the sketch's {SAMPLE_INTERVAL_TEXT} s, {SAMPLE_INTERVAL_BINARY} s with --binary)")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recording or raw capture instead of reading ports")
+    parser.add_argument("--start-time", type=parse_time, metavar="TIME",
+                        help="time of the first reading of a replayed raw capture, as epoch seconds or ISO 8601 "
+                             "(default: the last reading at the file's modification time)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed as a multiple of real time (0: as fast as possible)")
+    parser.add_argument("--record", metavar="CSV", help="save every reading to this file for later --replay")
+    parser.add_argument("--output", help="append results to this telemetry CSV")
+    parser.add_argument("--store", help="also append results to this column store (needs --output)")
+    parser.add_argument("--rotate-mb", type=float, metavar="MB",
+                        help="rotate --output into gzip segments at this size (see models/retention.py)")
+    parser.add_argument("--rollups", action="store_true",
+                        help="keep per-minute and per-hour rollups next to --output")
+    parser.add_argument("--live-ring", nargs="?", const="thermologic_live", metavar="NAME",
+                        help="also write results to this shared-memory ring for the GUI (default name: %(const)s)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--summary-interval", type=float, default=60.0,
+                        help="seconds between logged metric summaries (0: off)")
+    parser.add_argument("--design", choices=DesignPoint.MODES,
+                        help="nudge the design point per reading, or solve it directly (cached); "
+                             "default: solve with --loopback/--replay, nudge for real ports")
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="compute efficiencies in N worker processes, units split between them (0: in this one)")
+    parser.add_argument("--tables", action="store_true",
+                        help="use the cached property tables instead of Cantera (faster, within 1 kJ/kg)")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING, ... (default: $THERMOLOGIC_LOG_LEVEL or INFO)")
+    args = parser.parse_args()
+    if not args.ports and not args.loopback and not args.replay:
+        parser.error("give at least one port, --loopback N or --replay FILE")
+
+    if args.interval is None:
+        args.interval = SAMPLE_INTERVAL_BINARY if args.binary else SAMPLE_INTERVAL_TEXT
+    if args.design is None:
+        args.design = "solve" if args.loopback or args.replay else "nudge"
+
+    configure_logging(args.log_level)
+    try:
+        asyncio.run(main(args.ports, args.loopback, args.output, args.store, metrics_port=args.metrics_port,
+                         summary_interval=args.summary_interval, design_mode=args.design,
+                         baud_rate=args.baud or (BINARY_BAUD_RATE if args.binary else 9600), binary=args.binary,
+                         interval=args.interval, replay=args.replay, speed=args.speed, record=args.record,
+                         workers=args.workers, live_ring=args.live_ring, rotate_mb=args.rotate_mb,
+                         rollups=args.rollups, use_tables=args.tables, start_time=args.start_time))
+    except KeyboardInterrupt:
+        pass
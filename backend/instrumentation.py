@@ -0,0 +1,195 @@
+"""
+Low-overhead metrics for the serial processing loop.
+
+`LoopMetrics` keeps, per stage (read, parse, properties, efficiency, write),
+the number of calls, total seconds and the slowest call, plus plain counters
+(non-numeric lines, parse errors, ...) and gauges that are read when the
+metrics are rendered (queue depth, serial backlog). Recording a stage is two
+perf_counter calls and a few additions, small next to one property lookup.
+
+The numbers are available as Prometheus text, from a background HTTP
+endpoint (start_metrics_server), and as a one-line summary that the loops
+log every `summary_interval` seconds. Collectors add more lines to the
+Prometheus text (e.g. rolling.RollingStats), and with `rolling` the endpoint
+also serves GET /rolling, its snapshot as JSON.
+
+`InstrumentedProperties` wraps a property engine so the time spent in h_tp and
+h_sat_vap is recorded as the "properties" stage. It is nested inside the
+"efficiency" stage, which covers the whole per-sample computation.
+
+Log verbosity comes from THERMOLOGIC_LOG_LEVEL (DEBUG prints every reading,
+INFO only the periodic summaries, WARNING only problems) unless a level is
+passed to configure_logging().
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ("read", "parse", "properties", "efficiency", "write")
+
+LOG_LEVEL_ENV = "THERMOLOGIC_LOG_LEVEL"
+
+
+def configure_logging(level=None):
+    """Set up console logging; `level` defaults to $THERMOLOGIC_LOG_LEVEL or INFO."""
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or "INFO").upper()
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+class LoopMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.max_seconds = dict.fromkeys(STAGES, 0.0)
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning the current value
+        self.collectors = []  # callables returning more Prometheus lines
+        self._last_summary = time.monotonic()
+        self._summary_calls = dict(self.calls)
+        self._summary_seconds = dict(self.seconds)
+
+    def observe(self, stage, seconds):
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        if seconds > self.max_seconds.get(stage, 0.0):
+            self.max_seconds[stage] = seconds
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def sync_counters(self, counts, seen):
+        """Add how much each of `counts` grew since `seen` (updated in place); returns the increases."""
+        increases = {}
+        for name, value in counts.items():
+            new = value - seen.get(name, 0)
+            if new:
+                seen[name] = value
+                self.count(name, new)
+                increases[name] = new
+        return increases
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def add_collector(self, fn):
+        self.collectors.append(fn)
+
+    def render(self):
+        """Prometheus text format."""
+        lines = [f"thermologic_uptime_seconds {time.time() - self.started:.3f}"]
+        for stage in self.calls:
+            lines.append(f'thermologic_stage_calls_total{{stage="{stage}"}} {self.calls[stage]}')
+            lines.append(f'thermologic_stage_seconds_total{{stage="{stage}"}} {self.seconds[stage]:.6f}')
+            lines.append(f'thermologic_stage_seconds_max{{stage="{stage}"}} {self.max_seconds[stage]:.6f}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"thermologic_{name}_total {value}")
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                lines.append(f"thermologic_{name} {fn()}")
+            except Exception:
+                pass  # e.g. the port is already closed
+        for fn in self.collectors:
+            lines.extend(fn())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Calls and mean time per stage since the previous summary, then counters and gauges."""
+        parts = []
+        for stage in self.calls:
+            calls = self.calls[stage] - self._summary_calls.get(stage, 0)
+            seconds = self.seconds[stage] - self._summary_seconds.get(stage, 0.0)
+            if calls:
+                parts.append(f"{stage} {calls}x{seconds / calls * 1e6:.0f}us")
+        parts += [f"{name}={value}" for name, value in sorted(self.counters.items())]
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                parts.append(f"{name}={fn()}")
+            except Exception:
+                pass
+        self._summary_calls = dict(self.calls)
+        self._summary_seconds = dict(self.seconds)
+        return " ".join(parts) or "idle"
+
+    def summary_if_due(self, logger, interval):
+        """Log summary() at INFO once `interval` seconds have passed since the last one."""
+        if interval and time.monotonic() - self._last_summary >= interval:
+            self._last_summary = time.monotonic()
+            logger.info(self.summary())
+
+
+class InstrumentedProperties:
+    """Property engine wrapper that records lookup time as the "properties" stage."""
+
+    def __init__(self, props, metrics):
+        self.props = props
+        self.metrics = metrics
+
+    def h_tp(self, T, P):
+        start = time.perf_counter()
+        try:
+            return self.props.h_tp(T, P)
+        finally:
+            self.metrics.observe("properties", time.perf_counter() - start)
+
+    def h_sat_vap(self, P):
+        start = time.perf_counter()
+        try:
+            return self.props.h_sat_vap(P)
+        finally:
+            self.metrics.observe("properties", time.perf_counter() - start)
+
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    # Set by start_metrics_server
+    metrics = None
+    rolling = None
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            data = self.metrics.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/rolling" and self.rolling is not None:
+            data = json.dumps(_json_safe(self.rolling.snapshot())).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(metrics, port=9108, host="127.0.0.1", rolling=None):
+    """Serve GET /metrics (and /rolling, given a RollingStats) from a daemon thread; returns the server."""
+    handler = type("Handler", (_MetricsHandler,), {"metrics": metrics, "rolling": rolling})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
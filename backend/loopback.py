@@ -0,0 +1,108 @@
+"""
+Stand-ins for the Arduino rig so the backend can run without hardware.
+
+`synthetic_lines` produces the same ASCII lines as arduino/qHACKS.ino, with the
+sketch's scaling and offsets applied to plausible raw sensor values;
+`synthetic_frames` produces the same readings as the sketch's binary frames. `PtyRig`
+writes such lines into a pseudo-terminal whose device path can be opened with
+pyserial like a real port (POSIX only; on Windows use a com0com pair).
+"""
+import os
+
+import numpy as np
+
+from protocol import encode_frame
+
+# Constants from qHACKS.ino
+SAMPLE_INTERVAL_TEXT = 1.3     # seconds between readings: ~300 ms acquisition + delay(1000)
+SAMPLE_INTERVAL_BINARY = 0.4   # with BINARY_PROTOCOL, sampleIntervalMs
+VREF = 5.0
+PRESSURE_MAX_PSI = 10.0
+PSI_TO_PA = 6894.76
+
+
+def adc_to_pascal(adc):
+    """Raw 10-bit ADC reading to Pascals, as pr1()/pr2() plus the loop() math do."""
+    voltage = (adc / 1023.0) * VREF
+    return voltage * (PRESSURE_MAX_PSI / VREF) * PSI_TO_PA
+
+
+def format_reading(p1, p2, t1, t2):
+    """One serial line; Arduino's Serial.print(float) prints two decimals."""
+    return f"{p1:.2f},{p2:.2f},{t1:.2f},{t2:.2f}\r\n".encode("ascii")
+
+
+def _synthetic_block(rng, n):
+    adc1 = rng.uniform(180.0, 260.0, n)
+    adc2 = rng.uniform(120.0, 200.0, n)
+    temp1 = rng.normal(30.0, 2.0, n)   # MAX6675 readings in Celsius
+    temp2 = rng.normal(140.0, 5.0, n)
+    return np.column_stack([
+        adc_to_pascal(adc1) * 1100,   # Pressure 1 in Pascals (scaled)
+        adc_to_pascal(adc2) / 1.8,    # Pressure 2 in Pascals (scaled)
+        temp1 + 500,                  # Temperature 1 with offset
+        temp2 + 260,                  # Temperature 2 with offset
+    ])
+
+
+def synthetic_readings(n, seed=0):
+    """n readings (p1, p2, t1, t2) as the sketch would report them, as an (n, 4) array."""
+    return _synthetic_block(np.random.default_rng(seed), n)
+
+
+def synthetic_lines(n=None, seed=0, banner=True, chunk=1000):
+    """
+    Encoded serial lines for n readings (forever when n is None), starting with
+    the sketch's "Starting..." banner.
+    """
+    rng = np.random.default_rng(seed)
+    if banner:
+        yield b"Starting...\r\n"
+    remaining = n
+    while remaining is None or remaining > 0:
+        size = chunk if remaining is None else min(chunk, remaining)
+        for row in _synthetic_block(rng, size):
+            yield format_reading(*row)
+        if remaining is not None:
+            remaining -= size
+
+
+def synthetic_frames(n=None, seed=0, banner=True, chunk=1000):
+    """Like synthetic_lines, but binary frames (BINARY_PROTOCOL) with consecutive sequence numbers."""
+    rng = np.random.default_rng(seed)
+    if banner:
+        yield b"Starting...\r\n"
+    sequence = 0
+    remaining = n
+    while remaining is None or remaining > 0:
+        size = chunk if remaining is None else min(chunk, remaining)
+        for row in _synthetic_block(rng, size):
+            yield encode_frame(sequence, *row)
+            sequence += 1
+        if remaining is not None:
+            remaining -= size
+
+
+class PtyRig:
+    """A fake Arduino on a pseudo-terminal; open `port` with pyserial to read from it."""
+
+    def __init__(self):
+        import tty  # POSIX only
+
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode: no echo and no newline translation, like a real USB serial port
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+
+    def write(self, data):
+        os.write(self.master_fd, data)
+
+    def send_reading(self, p1, p2, t1, t2):
+        self.write(format_reading(p1, p2, t1, t2))
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
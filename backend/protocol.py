@@ -0,0 +1,191 @@
+"""
+Serial protocols spoken by arduino/qHACKS.ino.
+
+Text (the default, 9600 baud): each reading is one ASCII line
+"p1,p2,t1,t2\\r\\n" (Serial.println). The sketch also prints debug text such as
+"Starting...", which carries no digits and is skipped, the same way app.py does.
+
+Binary (BINARY_PROTOCOL in the sketch, 115200 baud): each reading is a 23-byte
+little-endian frame
+
+    A5 5A | version u8 | sequence u16 | p1 p2 t1 t2 float32 | CRC-16/CCITT u16
+
+with the CRC (polynomial 0x1021, initial value 0xFFFF) taken over version to t2.
+0xA5 never occurs in the sketch's ASCII output, so `StreamDecoder` accepts
+both formats on the same stream, and gaps in the sequence number count
+dropped frames. A sequence number that goes backwards (more than half the
+16-bit range ahead, modulo wrap-around) means the sketch restarted; it is
+counted in `sequence_resets`, not as ~65k dropped frames.
+"""
+import binascii
+import struct
+from collections import deque
+
+# Longest line we accept before assuming the stream is garbage and resyncing
+MAX_LINE_LENGTH = 256
+
+FRAME_SYNC = b"\xa5\x5a"
+FRAME_VERSION = 1
+FRAME = struct.Struct("<2sBH4fH")
+_FRAME_BODY = slice(len(FRAME_SYNC), FRAME.size - 2)  # the bytes covered by the CRC
+BINARY_BAUD_RATE = 115200
+
+# Sequence gaps at least this large are backward jumps: the sketch restarted
+SEQUENCE_RESET_GAP = 0x8000
+
+
+def parse_line(line):
+    """
+    Parse one decoded line into (p1, p2, t1, t2).
+
+    Returns None for non-numeric debug messages and raises ValueError for
+    numeric lines that are not four comma-separated floats.
+    """
+    if not any(char.isdigit() for char in line):
+        return None
+    p1, p2, t1, t2 = map(float, line.split(","))
+    return p1, p2, t1, t2
+
+
+class LineFramer:
+    """Split a raw byte stream into complete lines, keeping partial lines between reads."""
+
+    def __init__(self, max_line_length=MAX_LINE_LENGTH):
+        self.max_line_length = max_line_length
+        self.buffer = bytearray()
+        # Bytes thrown away because a line never ended within max_line_length
+        self.dropped_bytes = 0
+
+    def feed(self, data):
+        """Add received bytes and return the decoded, stripped lines they complete."""
+        self.buffer += data
+        lines = []
+        start = 0
+        while True:
+            end = self.buffer.find(b"\n", start)
+            if end < 0:
+                break
+            lines.append(self.buffer[start:end].decode("utf-8", errors="replace").strip())
+            start = end + 1
+        del self.buffer[:start]
+
+        if len(self.buffer) > self.max_line_length:
+            self.dropped_bytes += len(self.buffer)
+            self.buffer.clear()
+        return lines
+
+
+def frame_crc(body):
+    return binascii.crc_hqx(body, 0xFFFF)
+
+
+def encode_frame(sequence, p1, p2, t1, t2):
+    """One binary frame, as the sketch sends it with BINARY_PROTOCOL enabled."""
+    frame = bytearray(FRAME.pack(FRAME_SYNC, FRAME_VERSION, sequence & 0xFFFF, p1, p2, t1, t2, 0))
+    struct.pack_into("<H", frame, FRAME.size - 2, frame_crc(frame[_FRAME_BODY]))
+    return bytes(frame)
+
+
+class StreamDecoder:
+    """
+    Readings from a serial byte stream carrying binary frames, text lines, or both.
+
+    Received bytes are copied once into a fixed buffer. Frames are unpacked in
+    place with struct.unpack_from over a memoryview. Instead of wrapping, the
+    unread tail is moved back to the start when the end is reached, so a frame
+    is always contiguous. Non-numeric text lines are kept in `messages` for the
+    caller to log.
+    """
+
+    def __init__(self, capacity=65536, max_line_length=MAX_LINE_LENGTH):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # first unread byte
+        self.end = 0    # one past the last received byte
+        self.max_line_length = max_line_length
+        self.last_sequence = None
+        self.messages = deque(maxlen=100)
+        self.stats = {"frames": 0, "lines": 0, "readings": 0, "crc_errors": 0, "dropped_frames": 0,
+                      "sequence_resets": 0, "non_numeric": 0, "parse_errors": 0, "dropped_bytes": 0}
+
+    def _append(self, data):
+        n = len(data)
+        if self.end + n > len(self.buffer):
+            unread = self.end - self.start
+            if unread + n > len(self.buffer):
+                # More than a buffer's worth behind: keep only what fits
+                self.stats["dropped_bytes"] += unread
+                self.start = self.end = unread = 0
+                if n > len(self.buffer):
+                    self.stats["dropped_bytes"] += n - len(self.buffer)
+                    data = data[-len(self.buffer):]
+                    n = len(data)
+            self.buffer[:unread] = self.view[self.start:self.end]
+            self.start, self.end = 0, unread
+        self.buffer[self.end:self.end + n] = data
+        self.end += n
+
+    def feed(self, data):
+        """Add received bytes and return the (p1, p2, t1, t2) readings they complete."""
+        self._append(data)
+        readings = []
+        stats = self.stats
+        buffer = self.buffer
+        pos, end = self.start, self.end
+        while pos < end:
+            if buffer[pos] == 0xA5:
+                if end - pos < FRAME.size:
+                    break  # wait for the rest of the frame
+                sync, version, sequence, p1, p2, t1, t2, crc = FRAME.unpack_from(self.view, pos)
+                if sync != FRAME_SYNC or version != FRAME_VERSION or \
+                        crc != frame_crc(self.view[pos + _FRAME_BODY.start:pos + _FRAME_BODY.stop]):
+                    stats["crc_errors"] += 1
+                    stats["dropped_bytes"] += 1
+                    pos += 1  # resync on the next byte
+                    continue
+                if self.last_sequence is not None:
+                    gap = (sequence - self.last_sequence - 1) & 0xFFFF
+                    if gap >= SEQUENCE_RESET_GAP:
+                        stats["sequence_resets"] += 1
+                    else:
+                        stats["dropped_frames"] += gap
+                self.last_sequence = sequence
+                stats["frames"] += 1
+                stats["readings"] += 1
+                readings.append((p1, p2, t1, t2))
+                pos += FRAME.size
+                continue
+
+            newline = buffer.find(b"\n", pos, end)
+            sync = buffer.find(b"\xa5", pos, end if newline < 0 else newline)
+            if sync >= 0:
+                # A frame starts before the line ends: the text was cut off
+                stats["dropped_bytes"] += sync - pos
+                pos = sync
+                continue
+            if newline < 0:
+                if end - pos > self.max_line_length:
+                    stats["dropped_bytes"] += end - pos
+                    pos = end
+                break
+
+            line = buffer[pos:newline].decode("utf-8", errors="replace").strip()
+            pos = newline + 1
+            stats["lines"] += 1
+            try:
+                values = parse_line(line)
+            except ValueError:
+                stats["parse_errors"] += 1
+                continue
+            if values is None:
+                stats["non_numeric"] += 1
+                if line:
+                    self.messages.append(line)
+                continue
+            stats["readings"] += 1
+            readings.append(values)
+
+        self.start = pos
+        if self.start == self.end:
+            self.start = self.end = 0
+        return readings
@@ -0,0 +1,233 @@
+"""
+Streaming rolling statistics for the processing loop.
+
+`RollingStats` keeps, for each series (eff, uniterg, effd) and each window
+(1 min, 1 h, 24 h by default), the count, mean, standard deviation, min, max
+and approximate percentiles of the samples in the window. Nothing is re-read:
+each sample updates a fixed number of counters, and memory does not grow
+with the sample rate.
+
+Each window is split into `buckets` time buckets (60 by default, so 1 s for
+the 1 min window and 24 min for the 24 h window). A bucket holds its count,
+sum, sum of squares, min, max and a small log-scale histogram. The window
+keeps running totals of the count, sums and histogram. Adding a sample
+updates the current bucket and the totals. When the clock moves into a new
+bucket, the expiring one is subtracted from the totals, so the cost per
+sample stays constant. The window edge moves in bucket steps: a "1 h"
+window covers between 59 and 60 minutes.
+
+The histograms use relative-width bins (DDSketch-style): a value x lands in
+bin ceil(log(|x|) / log(gamma)) with gamma = (1 + a) / (1 - a). A percentile
+read from them is within a factor of about (1 + a) of the exact value for
+any range and sign of inputs (a = 0.1% by default). The number of bins grows
+with the spread of the values, not with the number of samples.
+
+The loops feed it from their processing loop. The snapshot is available as
+Prometheus lines on /metrics and as JSON on /rolling (instrumentation.py),
+which the GUI shows next to the live plot.
+"""
+import math
+import threading
+import time
+
+DEFAULT_WINDOWS = {"1m": 60.0, "1h": 3600.0, "24h": 86400.0}
+DEFAULT_SERIES = ("eff", "uniterg", "effd")
+DEFAULT_BUCKETS = 60
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# Values closer to zero than this share one histogram bin
+_MIN_MAGNITUDE = 1e-9
+# Keeps the bin index of positive values above zero and of negative values below it
+_OFFSET = 1 << 20
+
+
+class LogHistogram:
+    """Bin index and representative value for relative-accuracy histograms."""
+
+    def __init__(self, relative_accuracy=0.001):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+    def key(self, x):
+        if x > _MIN_MAGNITUDE:
+            return math.ceil(math.log(x) / self._log_gamma) + _OFFSET
+        if x < -_MIN_MAGNITUDE:
+            return -(math.ceil(math.log(-x) / self._log_gamma) + _OFFSET)
+        return 0
+
+    def value(self, key):
+        if key == 0:
+            return 0.0
+        magnitude = 2 * self.gamma ** (abs(key) - _OFFSET) / (1 + self.gamma)
+        return magnitude if key > 0 else -magnitude
+
+
+class _Bucket:
+    __slots__ = ("id", "count", "sum", "sumsq", "min", "max", "bins")
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, bucket_id):
+        self.id = bucket_id
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.bins = {}
+
+
+class RollingWindow:
+    """Rolling aggregates of one series over the last `seconds`."""
+
+    def __init__(self, seconds, buckets=DEFAULT_BUCKETS, histogram=None):
+        self.seconds = seconds
+        self.width = seconds / buckets
+        self.histogram = histogram or LogHistogram()
+        self.buckets = [_Bucket() for _ in range(buckets)]
+        self.current_id = None
+        self._bucket = None
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.bins = {}
+        # Sums are of (x - ref), so the variance does not cancel out for large means
+        self.ref = None
+
+    def _advance(self, bucket_id):
+        """Expire the buckets that have left the window by `bucket_id`."""
+        if self.current_id is not None and bucket_id <= self.current_id:
+            return
+        n = len(self.buckets)
+        start = bucket_id - n + 1 if self.current_id is None else max(self.current_id + 1, bucket_id - n + 1)
+        for k in range(start, bucket_id + 1):
+            bucket = self.buckets[k % n]
+            if bucket.count:
+                self.count -= bucket.count
+                self.sum -= bucket.sum
+                self.sumsq -= bucket.sumsq
+                bins = self.bins
+                for key, c in bucket.bins.items():
+                    left = bins[key] - c
+                    if left:
+                        bins[key] = left
+                    else:
+                        del bins[key]
+            bucket.reset(k)
+        self.current_id = bucket_id
+        self._bucket = self.buckets[bucket_id % n]
+        if not self.count:
+            # Nothing left to cancel against: drop rounding residue and re-centre
+            self.sum = self.sumsq = 0.0
+            self.ref = None
+
+    def add(self, x, t, key=None):
+        bucket_id = int(t // self.width)
+        if bucket_id != self.current_id:
+            self._advance(bucket_id)
+        if self.ref is None:
+            self.ref = x
+        d = x - self.ref
+        dd = d * d
+        if key is None:
+            key = self.histogram.key(x)
+        bucket = self._bucket
+        bucket.count += 1
+        bucket.sum += d
+        bucket.sumsq += dd
+        if x < bucket.min:
+            bucket.min = x
+        if x > bucket.max:
+            bucket.max = x
+        bins = bucket.bins
+        bins[key] = bins.get(key, 0) + 1
+        self.count += 1
+        self.sum += d
+        self.sumsq += dd
+        bins = self.bins
+        bins[key] = bins.get(key, 0) + 1
+
+    def percentiles(self, qs=PERCENTILES):
+        """Approximate percentiles (q in 0..1) from the window's histogram."""
+        if not self.count:
+            return [math.nan for _ in qs]
+        keys = sorted(self.bins)
+        results = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            seen = 0
+            for key in keys:
+                seen += self.bins[key]
+                if seen > rank:
+                    results.append(self.histogram.value(key))
+                    break
+            else:
+                results.append(self.histogram.value(keys[-1]))
+        return results
+
+    def stats(self, now=None, qs=PERCENTILES):
+        """count, mean, std, min, max and p50/p90/p99 of the samples in the window at `now`."""
+        if now is not None:
+            self._advance(int(now // self.width))
+        if not self.count:
+            result = {"count": 0, "mean": math.nan, "std": math.nan, "min": math.nan, "max": math.nan}
+            result.update({f"p{round(q * 100)}": math.nan for q in qs})
+            return result
+        mean = self.sum / self.count
+        variance = max(self.sumsq / self.count - mean * mean, 0.0)
+        low = min(b.min for b in self.buckets if b.count)
+        high = max(b.max for b in self.buckets if b.count)
+        result = {"count": self.count, "mean": self.ref + mean, "std": math.sqrt(variance), "min": low, "max": high}
+        for q, value in zip(qs, self.percentiles(qs)):
+            # The bin's representative value can lie just outside the samples
+            result[f"p{round(q * 100)}"] = min(max(value, low), high)
+        return result
+
+
+class RollingStats:
+    """Rolling windows for several series, updated together once per processed reading."""
+
+    def __init__(self, series=DEFAULT_SERIES, windows=None, buckets=DEFAULT_BUCKETS, relative_accuracy=0.001):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self.histogram = LogHistogram(relative_accuracy)
+        self.series = {name: {label: RollingWindow(seconds, buckets, self.histogram)
+                              for label, seconds in self.windows.items()}
+                       for name in series}
+        # Samples arrive on the processing loop, snapshots are taken from the metrics thread
+        self.lock = threading.Lock()
+        self.samples = 0
+
+    def add(self, t=None, **values):
+        """Add one sample per series, e.g. add(t, eff=0.91, uniterg=120.0); NaN/None values are skipped."""
+        if t is None:
+            t = time.time()
+        with self.lock:
+            self.samples += 1
+            for name, x in values.items():
+                if x is None or x != x:
+                    continue
+                windows = self.series[name]
+                x = float(x)
+                key = self.histogram.key(x)
+                for window in windows.values():
+                    window.add(x, t, key)
+
+    def snapshot(self, now=None):
+        """{series: {window: stats}} at `now` (default: the current time)."""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            return {name: {label: window.stats(now) for label, window in windows.items()}
+                    for name, windows in self.series.items()}
+
+    def render(self, now=None):
+        """Prometheus lines, one per series, window and statistic (empty windows are left out)."""
+        lines = []
+        for name, windows in self.snapshot(now).items():
+            for label, stats in windows.items():
+                if not stats["count"]:
+                    continue
+                for stat, value in stats.items():
+                    lines.append(f'thermologic_rolling{{series="{name}",window="{label}",stat="{stat}"}} {value:.6g}')
+        return lines
@@ -0,0 +1,143 @@
+"""
+Recorded input for the processing loop, so it can run without a serial port.
+
+Two kinds of files can be replayed:
+
+    recordings   CSV written by ReadingRecorder (ingest.py --record), one
+                 Reading per row: timestamp,port,p1,p2,t1,t2
+    raw captures whatever the rig sent: qHACKS.ino text lines, binary frames
+                 or both (e.g. a serial monitor log, or the "p1,p2,t1,t2"
+                 files efficiency.py reads). They carry no time, so readings
+                 are spaced `interval` seconds apart, as the sketch sends them,
+                 ending at the file's modification time (when the capture was
+                 last written to) unless a start time is given.
+
+`ReplaySource` has the same queue/run/stop interface as ingest.SerialIngest and
+feeds readings in order. At speed=1 it keeps their original spacing, at
+speed=N it is N times faster, and at speed=0 it goes as fast as the consumer
+takes them (the bounded queue still applies backpressure). Readings keep
+their recorded timestamps, so a back-fill writes the original times.
+
+    python ingest.py --replay readings.csv --speed 0 --output backfill.csv
+"""
+import asyncio
+import csv
+import os
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from protocol import StreamDecoder
+
+# One parsed reading from one port
+Reading = namedtuple("Reading", ["port", "timestamp", "p1", "p2", "t1", "t2"])
+
+RECORDING_HEADER = ["timestamp", "port", "p1", "p2", "t1", "t2"]
+
+
+def read_recording(path):
+    """Readings from a CSV written by ReadingRecorder."""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for timestamp, port, p1, p2, t1, t2 in reader:
+            yield Reading(port, float(timestamp), float(p1), float(p2), float(t1), float(t2))
+
+
+def _decode_raw(path, chunk_size=65536):
+    decoder = StreamDecoder()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield from decoder.feed(data)
+
+
+def read_raw_capture(path, port="replay", interval=1.0, start_time=None, chunk_size=65536):
+    """
+    Readings decoded from a raw capture, `interval` seconds apart from
+    start_time (epoch seconds). By default the last reading gets the file's
+    modification time, which takes one extra pass to count the readings.
+    """
+    if start_time is None:
+        count = sum(1 for _ in _decode_raw(path, chunk_size))
+        start_time = os.path.getmtime(path) - max(count - 1, 0)*interval
+    for k, values in enumerate(_decode_raw(path, chunk_size)):
+        yield Reading(port, start_time + k*interval, *values)
+
+
+def parse_time(text):
+    """Epoch seconds from epoch seconds or an ISO 8601 time (local time unless it has an offset)."""
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def open_replay(path, port="replay", interval=1.0, start_time=None):
+    """
+    Readings from a recording or a raw capture, told apart by the recording
+    header. interval and start_time only apply to raw captures.
+    """
+    with open(path, "rb") as f:
+        is_recording = f.readline().strip() == ",".join(RECORDING_HEADER).encode("ascii")
+    if is_recording:
+        return read_recording(path)
+    return read_raw_capture(path, port, interval, start_time)
+
+
+class ReadingRecorder:
+    """Append Readings to a CSV that read_recording() can replay."""
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(RECORDING_HEADER)
+        self.rows = 0
+
+    def write(self, reading):
+        self._writer.writerow([f"{reading.timestamp:.6f}", reading.port, reading.p1, reading.p2,
+                               reading.t1, reading.t2])
+        self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ReplaySource:
+    """Put recorded Readings on a bounded queue at real-time, scaled or unlimited speed."""
+
+    def __init__(self, readings, speed=1.0, queue_size=1000, metrics=None):
+        self.readings = readings
+        self.speed = speed
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.gauge("queue_depth", self.queue.qsize)
+        self.stats = {"readings": 0}
+        self.started = None
+        self.finished = None
+        self._stopping = False
+
+    async def run(self):
+        """Replay until the readings run out or stop() is called."""
+        self.started = time.monotonic()
+        first = None
+        for reading in self.readings:
+            if self._stopping:
+                break
+            if self.speed:
+                if first is None:
+                    first = reading.timestamp
+                delay = self.started + (reading.timestamp - first)/self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.stats["readings"] += 1
+            if self.metrics is not None:
+                self.metrics.count("readings")
+            await self.queue.put(reading)
+        self.finished = time.monotonic()
+
+    def stop(self):
+        self._stopping = True
@@ -0,0 +1,182 @@
+"""
+Buffered CSV writer for factory telemetry.
+
+The serial loop used to reopen factorydata.csv for every reading. The writer
+keeps the file open, collects rows in memory and writes them out when
+`flush_rows` rows are waiting or `flush_interval` seconds have passed since
+the last flush, whichever comes first. close() (or leaving a `with` block)
+always flushes what is left.
+
+If a column store (models/telemetry_store.py) is passed in, every flush also
+appends the same rows to it, so readers can memory-map the stream instead of
+parsing the CSV. Likewise a retention.Rollups gets every flushed row for its
+per-minute and per-hour aggregates. The CSV is the primary copy: once rows
+are written there they leave the buffer, and if the store append fails they
+wait in a store-only backlog (at most `max_store_backlog` rows, oldest
+dropped first) that the next flush retries.
+
+With a retention.Retention (models/retention.py) the file is rotated into a
+compressed segment once it is too large or too old, and an existing file is
+rotated on start rather than truncated.
+
+An existing file with a different header (e.g. the old two-column
+`eff,effnew` factorydata.csv) is never appended to: it is moved aside as
+`<name>-YYYYmmdd-HHMMSS.csv` (through the Retention if there is one) and a
+new file is started.
+
+fsync policy:
+    "never"  leave durability to the OS (fastest)
+    "close"  fsync once when the writer is closed
+    "flush"  fsync after every flush (survives power loss, slowest)
+"""
+import csv
+import logging
+import os
+import time
+
+FSYNC_POLICIES = ("never", "close", "flush")
+
+DEFAULT_MAX_STORE_BACKLOG = 100_000
+
+HEADER = ["timestamp", "sensor_id", "eff", "effnew"]
+
+logger = logging.getLogger("thermologic.writer")
+
+
+def read_header(path):
+    """The first row of the CSV at `path`, or None if it is missing or empty."""
+    try:
+        with open(path, newline="") as f:
+            return next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+
+
+def move_aside(path):
+    """Rename `path` to `<stem>-YYYYmmdd-HHMMSS.csv` (made unique); returns the new path."""
+    base = f"{os.path.splitext(path)[0]}-{time.strftime('%Y%m%d-%H%M%S')}"
+    target = f"{base}.csv"
+    k = 1
+    while os.path.exists(target) or os.path.exists(target + ".gz"):
+        target = f"{base}-{k}.csv"
+        k += 1
+    os.replace(path, target)
+    return target
+
+
+class TelemetryWriter:
+    """Append (timestamp, sensor_id, eff, effnew) rows to a CSV in batches."""
+
+    def __init__(self, path, flush_rows=100, flush_interval=5.0, fsync="close", truncate=False,
+                 store=None, retention=None, rollups=None, max_store_backlog=DEFAULT_MAX_STORE_BACKLOG):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.store = store
+        self.retention = retention
+        self.rollups = rollups
+        self.max_store_backlog = max_store_backlog
+        self.rows = []
+        # Rows in the CSV but not yet in the store, because appending them failed
+        self.store_backlog = []
+        self.store_dropped = 0
+        self.rows_written = 0
+        self.flush_count = 0
+        self._last_flush = time.monotonic()
+
+        if retention is not None and truncate:
+            # Keep the previous run's rows as a segment instead of discarding them
+            retention.rotate()
+        self._open(truncate)
+
+    def _open(self, truncate):
+        header = None if truncate else read_header(self.path)
+        if header is not None and header != HEADER:
+            # Appending would put 4-field rows under someone else's header
+            moved = self.retention.rotate() if self.retention is not None else move_aside(self.path)
+            logger.warning("%s has header %s, not %s; moved it to %s", self.path, header, HEADER, moved)
+        new_file = truncate or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, mode="w" if truncate else "a", newline="")
+        self._writer = csv.writer(self._file)
+        self._opened_at = time.time()
+        if new_file:
+            self._writer.writerow(HEADER)  # Write the header row
+
+    def write(self, eff, effnew, sensor_id="", timestamp=None):
+        """Buffer one row; flushes when the size or time threshold is reached."""
+        if timestamp is None:
+            timestamp = time.time()
+        self.rows.append((timestamp, sensor_id, eff, effnew))
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush if flush_interval has passed; call this from idle loops too."""
+        if self.rows and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows to the file."""
+        if self.rows:
+            self._writer.writerows((f"{row[0]:.3f}",) + row[1:] for row in self.rows)
+            self.rows_written += len(self.rows)
+            if self.rollups is not None:
+                self.rollups.add_rows(self.rows)
+            if self.store is not None:
+                self.store_backlog += self.rows
+            self.rows.clear()
+        if self.store_backlog:
+            self._flush_store()
+        self._file.flush()
+        if self.fsync == "flush":
+            os.fsync(self._file.fileno())
+        if self.rollups is not None:
+            self.rollups.flush()
+        self.flush_count += 1
+        self._last_flush = time.monotonic()
+        if self.retention is not None and self.retention.due(self._file.tell(), self._opened_at):
+            self.rotate()
+
+    def _flush_store(self):
+        try:
+            self.store.append(dict(zip(HEADER, zip(*self.store_backlog))))
+        except Exception as e:
+            excess = len(self.store_backlog) - self.max_store_backlog
+            if excess > 0:
+                del self.store_backlog[:excess]
+                self.store_dropped += excess
+            logger.warning("Could not append to the column store (%d rows waiting, %d dropped): %s",
+                           len(self.store_backlog), self.store_dropped, e)
+            return
+        self.store_backlog.clear()
+
+    def rotate(self):
+        """Start a new file; the current one becomes a (compressed) segment."""
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self.retention.rotate()
+        self._open(truncate=True)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        if self.fsync == "close":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if self.rollups is not None:
+            self.rollups.close()
+        if self.retention is not None:
+            self.retention.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
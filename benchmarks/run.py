@@ -0,0 +1,299 @@
+"""
+Benchmarks for ThermoLogic's hot paths, runnable headless.
+
+Groups:
+    thermo   parsing synthetic qHACKS.ino lines and the per-sample efficiency
+             and design-point work of backend/app.py, with the property tables
+             and with plain Cantera, plus the vectorized batch_efficiency
+    predict  OntarioModel.pkl predict (scikit-learn and flat_gbm) at several batch sizes, and
+             through the prediction cache
+    io       factorydata appends through TelemetryWriter, reading it back with
+             pandas, tailing it with CsvTail, and reading the column store
+    gui      offscreen redraws of PredictionApp's canvases
+
+Each benchmark reports the best and median of several repeats. Results are
+written as JSON with the commit, versions and machine, so runs on two commits
+can be compared:
+
+    python benchmarks/run.py                      # writes benchmarks/results/<commit>.json
+    python benchmarks/run.py --quick --only thermo predict
+    python benchmarks/run.py --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for directory in ("backend", "models", "gui"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+GROUPS = ["thermo", "predict", "io", "gui"]
+
+# Slowdown reported as a regression by --compare
+REGRESSION_RATIO = 1.10
+
+
+def measure(fn, repeat=5):
+    """Best and median wall-clock seconds of fn() over `repeat` runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def add_result(results, group, name, best, median, items=1, **params):
+    results.append({"group": group, "name": name, "params": params, "items": items,
+                    "best_s": best, "median_s": median, "per_item_us": best / items * 1e6})
+    print(f"  {name:<40} {best * 1e3:10.3f} ms  {best / items * 1e6:10.2f} us/item")
+
+
+def record(results, group, name, fn, items=1, repeat=5, **params):
+    best, median = measure(fn, repeat)
+    add_result(results, group, name, best, median, items, **params)
+
+
+def bench_thermo(results, quick):
+    from efficiency import DesignPoint, batch_efficiency, sample_efficiency
+    from loopback import synthetic_frames, synthetic_lines
+    from properties import load_properties
+    from protocol import StreamDecoder, parse_line
+
+    n = 200 if quick else 2000
+    lines = [line.decode("ascii") for line in synthetic_lines(n, banner=False)]
+    record(results, "thermo", "protocol.parse_line", lambda: [parse_line(line) for line in lines], items=n)
+    readings = [parse_line(line) for line in lines]
+
+    def decode(chunks):
+        decoder = StreamDecoder()
+        return [decoder.feed(chunk) for chunk in chunks]
+
+    # Whole streams in 4 KiB reads, as they arrive from the port
+    text = b"".join(synthetic_lines(n, banner=False))
+    frames = b"".join(synthetic_frames(n, banner=False))
+    for name, stream in (("text", text), ("binary", frames)):
+        chunks = [stream[k:k + 4096] for k in range(0, len(stream), 4096)]
+        record(results, "thermo", f"protocol.StreamDecoder.{name}",
+               lambda: decode(chunks), items=n)
+
+    def per_sample(props, readings):
+        design = DesignPoint()
+        for p1, p2, t1, t2 in readings:
+            eff, uniterg = sample_efficiency(props, p1, p2, t1, t2)
+            try:
+                design.update(props, p1, p2, t1, t2, eff)
+            except Exception:
+                # The design point eventually leaves Cantera's range; start over like a restart would
+                design = DesignPoint()
+
+    tables = load_properties(use_tables=True)
+    record(results, "thermo", "sample.tables", lambda: per_sample(tables, readings), items=n)
+    # Plain Cantera is ~1 ms per state; keep the sample count small
+    cantera_readings = readings[:n // 10]
+    record(results, "thermo", "sample.cantera", lambda: per_sample(load_properties(use_tables=False),
+                                                                   cantera_readings),
+           items=len(cantera_readings), repeat=3)
+
+    p1, p2, t1, t2 = np.array(readings).T
+    record(results, "thermo", "batch_efficiency.tables", lambda: batch_efficiency(p1, p2, t1, t2, tables),
+           items=n)
+
+
+def bench_predict(results, quick):
+    from flat_gbm import FlatGBM, benchmark
+    from model_cache import DEFAULT_MODEL_PATH, load_model
+
+    model = load_model(DEFAULT_MODEL_PATH)
+    flat = FlatGBM.from_sklearn(model)
+    sizes = (1, 100, 10_000) if quick else (1, 100, 10_000, 1_000_000)
+    for row in benchmark(model, flat, sizes):
+        for engine in ("sklearn", "flat"):
+            # flat_gbm.benchmark reports the best of its own repeats
+            seconds = row[f"{engine}_s"]
+            add_result(results, "predict", f"predict.{engine}[{row['rows']}]", seconds, seconds,
+                       items=row["rows"], rows=row["rows"])
+
+    # Memoized predictions: rows repeating within a batch, and a batch seen before
+    from prediction_cache import PredictionCache, model_predictor
+
+    n = 10_000 if quick else 100_000
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(15000, 20000, n).astype(float), rng.integers(0, 2, n),
+                         rng.integers(0, 30, n) / 100])
+    repeating = np.repeat(X[:n // 100], 100, axis=0)
+    predict = model_predictor(DEFAULT_MODEL_PATH)
+    record(results, "predict", f"predict.cache.cold[{n}]", lambda: PredictionCache(predict).predict(X),
+           items=n, repeat=3)
+    record(results, "predict", f"predict.cache.repeating[{n}]",
+           lambda: PredictionCache(predict).predict(repeating), items=n, repeat=3)
+    warm = PredictionCache(predict)
+    warm.predict(X)
+    record(results, "predict", f"predict.cache.warm[{n}]", lambda: warm.predict(X), items=n, repeat=3)
+
+
+def bench_io(results, quick):
+    import pandas as pd
+
+    from live_tail import CsvTail
+    from telemetry_store import FACTORY_COLUMNS, ColumnStore
+    from writer import TelemetryWriter
+
+    n = 10_000 if quick else 200_000
+    rng = np.random.default_rng(0)
+    eff = rng.uniform(0.5, 1.0, n)
+    effnew = rng.uniform(0.5, 1.0, n)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "factorydata.csv")
+        store_path = os.path.join(tmp, "factory_store")
+
+        def append_rows():
+            store = ColumnStore(store_path, FACTORY_COLUMNS)
+            with TelemetryWriter(csv_path, truncate=True, store=store) as writer:
+                for k in range(n):
+                    writer.write(eff[k], effnew[k], "turbine-1")
+                    writer.flush_if_due()
+
+        record(results, "io", "factorydata.append", append_rows, items=n, repeat=3)
+        record(results, "io", "factorydata.read_csv", lambda: pd.read_csv(csv_path), items=n)
+
+        def read_store():
+            return [np.array(c) for c in ColumnStore(store_path).read(["eff", "effnew"]).values()]
+
+        record(results, "io", "factory_store.read", read_store, items=n)
+
+        # Tailing cost should depend on the rows added, not the size of the file
+        tail = CsvTail(csv_path, ["eff", "effnew"])
+        tail.read_new()
+        batch = "".join(f"{time.time():.3f},turbine-1,{e},{f}\n" for e, f in zip(eff[:1000], effnew[:1000]))
+
+        def append_and_tail():
+            with open(csv_path, "a") as f:
+                f.write(batch)
+            tail.read_new()
+
+        record(results, "io", "factorydata.tail[1000]", append_and_tail, items=1000)
+
+
+def bench_gui(results, quick):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+    import pyqtgui
+    from batch_predict import MinMaxSeries
+    from decimate import BlitManager
+
+    window = pyqtgui.PredictionApp()
+    rng = np.random.default_rng(0)
+    sizes = (10_000,) if quick else (10_000, 1_000_000)
+    for n in sizes:
+        predictions = np.cumsum(rng.normal(size=n)) + 15000.0
+        # plot_predictions takes the streamed summary predict_file returns
+        summary = MinMaxSeries()
+        summary.append(predictions)
+        points = summary.points()
+        record(results, "gui", f"plot_predictions[{n}]",
+               lambda: (window.plot_predictions(points, predictions[:75], "benchmark"), window.canvas.draw()),
+               items=n, repeat=3)
+        record(results, "gui", f"canvas.redraw[{n}]", window.canvas.draw, items=n)
+
+        data = {"eff": rng.uniform(0.5, 1.0, n), "effnew": rng.uniform(0.5, 1.0, n)}
+        record(results, "gui", f"plot_efficiency_comparison[{n}]",
+               lambda: window.plot_efficiency_comparison(data), items=n, repeat=3)
+
+    series = window.city_canvas.series[-1]
+    blit = BlitManager(window.city_canvas, [series.line])
+    window.city_canvas.draw()
+    record(results, "gui", "live.blit", blit.update)
+    blit.disconnect()
+    app.processEvents()
+
+
+def metadata():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    versions = {}
+    for module in ("numpy", "pandas", "sklearn", "cantera", "matplotlib"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def compare(old_path, new_path, ratio=REGRESSION_RATIO):
+    """Print per-benchmark speed ratios; returns the number of regressions."""
+    with open(old_path) as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    for r in new:
+        before = old.get(r["name"])
+        if before is None:
+            print(f"{r['name']:<40} {'':>12} {r['best_s'] * 1e3:10.3f} ms  (new)")
+            continue
+        change = r["best_s"] / before["best_s"]
+        flag = ""
+        if change > ratio:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['name']:<40} {before['best_s'] * 1e3:10.3f} ms -> {r['best_s'] * 1e3:10.3f} ms  "
+              f"x{change:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ThermoLogic's hot paths.")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--quick", action="store_true", help="smaller inputs, for a fast check")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD_JSON", "NEW_JSON"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    meta = metadata()
+    meta["quick"] = args.quick
+    results = []
+    benches = {"thermo": bench_thermo, "predict": bench_predict, "io": bench_io, "gui": bench_gui}
+    for group in args.only:
+        print(f"{group}:")
+        benches[group](results, args.quick)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{meta['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+The Groq analysis of predictions_output.csv, without sending the file.
+
+The GUI used to paste the whole predictions CSV into the prompt on every
+click, so the request grew with the file and the same file was sent again
+and again. Now the accuracy numbers (MAE, RMSE, R², MAPE over the rows that
+have an actual value) and the peak-demand windows are computed here with
+NumPy. Only that short summary goes into the prompt. Responses are cached on
+disk under a SHA-256 of the model, prompt and summary, so asking again about
+the same predictions costs nothing.
+
+Rows are consecutive intervals of ROW_MINUTES minutes starting at midnight
+(Ontario1DayCSV.csv is one day of 5-minute readings), which is how the peak
+windows get their times.
+
+StubClient has the small part of the Groq client interface used here and
+answers from the summary itself, so the GUI can run offline
+(THERMOLOGIC_GROQ_STUB=1):
+
+    python analysis.py predictions_output.csv --stub
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+ACTUAL_COLUMN = "Actual Energy (First 75)"
+PREDICTED_COLUMN = "Predicted Energy"
+
+ROW_MINUTES = 5
+PEAK_WINDOW_MINUTES = 60
+PEAK_WINDOWS = 3
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+SYSTEM_PROMPT = (
+    "You will receive summary statistics of an energy demand model's predictions: its accuracy against "
+    "actual values and the time windows with the highest predicted demand. Tell me 2 main points: how "
+    "accurate the model is (quote the stats), and when in the day our power plant is most needed "
+    "(give the time frames). Say this in 2 simple, direct sentences on different lines."
+)
+
+# Cached responses, next to this file
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "groq_cache")
+
+STUB_ENV = "THERMOLOGIC_GROQ_STUB"
+
+
+def _clock(row, row_minutes):
+    minutes = row * row_minutes
+    day, minutes = divmod(minutes, 24 * 60)
+    clock = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return f"day {day + 1} {clock}" if day else clock
+
+
+def peak_windows(values, window, count=PEAK_WINDOWS):
+    """(start, stop, mean) of the `count` highest-mean non-overlapping windows of `window` rows."""
+    n = len(values)
+    window = max(1, min(window, n))
+    if not n:
+        return []
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    means = (sums[window:] - sums[:-window]) / window
+    peaks = []
+    for _ in range(count):
+        if not np.isfinite(means).any():
+            break
+        start = int(np.nanargmax(means))
+        peaks.append((start, start + window, float(means[start])))
+        # Windows overlapping this one cannot be picked again
+        means[max(0, start - window + 1):start + window] = -np.inf
+    return peaks
+
+
+def summarize(actual, predicted, row_minutes=ROW_MINUTES, window_minutes=PEAK_WINDOW_MINUTES,
+              windows=PEAK_WINDOWS):
+    """Accuracy and peak-demand summary of a predictions table (arrays; NaN actual = none)."""
+    actual = np.asarray(actual, dtype=np.float64)
+    predicted = np.asarray(predicted, dtype=np.float64)
+    known = np.isfinite(actual) & np.isfinite(predicted)
+    a, p = actual[known], predicted[known]
+
+    summary = {"rows": int(len(predicted)), "compared_rows": int(known.sum()), "row_minutes": row_minutes}
+    if len(a):
+        error = p - a
+        total = float(np.sum((a - a.mean()) ** 2))
+        summary.update({
+            "mae": float(np.mean(np.abs(error))),
+            "rmse": float(np.sqrt(np.mean(error ** 2))),
+            "r2": 1.0 - float(np.sum(error ** 2)) / total if total else float("nan"),
+            "mape_percent": float(np.mean(np.abs(error) / np.abs(a)) * 100) if np.all(a) else float("nan"),
+            "mean_actual": float(a.mean()),
+        })
+    finite = predicted[np.isfinite(predicted)]
+    if len(finite):
+        summary.update({"predicted_mean": float(finite.mean()), "predicted_min": float(finite.min()),
+                        "predicted_max": float(finite.max())})
+        # Missing predictions count as average demand in the windows
+        predicted = np.where(np.isfinite(predicted), predicted, finite.mean())
+    window = max(1, window_minutes // row_minutes)
+    summary["peak_windows"] = [
+        {"start": _clock(start, row_minutes), "end": _clock(stop, row_minutes), "mean_predicted": mean}
+        for start, stop, mean in peak_windows(predicted, window, windows)
+    ]
+    return summary
+
+
+def summarize_file(path, **kwargs):
+    """summarize() for a predictions CSV written by batch_predict.py / the GUI."""
+    import pandas as pd
+
+    data = pd.read_csv(path, usecols=[ACTUAL_COLUMN, PREDICTED_COLUMN], dtype="float64")
+    return summarize(data[ACTUAL_COLUMN].to_numpy(), data[PREDICTED_COLUMN].to_numpy(), **kwargs)
+
+
+def format_summary(summary):
+    """The summary as the few lines of text sent to the model."""
+    lines = [f"{summary['rows']} predictions, one per {summary['row_minutes']} minutes starting 00:00."]
+    if "mae" in summary:
+        lines.append(f"Accuracy over the {summary['compared_rows']} rows with actual values: "
+                     f"MAE {summary['mae']:.1f}, RMSE {summary['rmse']:.1f}, R² {summary['r2']:.3f}, "
+                     f"MAPE {summary['mape_percent']:.2f}% (mean actual {summary['mean_actual']:.1f}).")
+    else:
+        lines.append("No actual values to compare against.")
+    if "predicted_mean" in summary:
+        lines.append(f"Predicted energy: mean {summary['predicted_mean']:.1f}, "
+                     f"min {summary['predicted_min']:.1f}, max {summary['predicted_max']:.1f}.")
+    for k, peak in enumerate(summary["peak_windows"], 1):
+        lines.append(f"Peak window {k}: {peak['start']}-{peak['end']}, mean predicted {peak['mean_predicted']:.1f}.")
+    return "\n".join(lines)
+
+
+def request_messages(summary_text, system_prompt=SYSTEM_PROMPT):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"The prediction summary is:\n{summary_text}"},
+    ]
+
+
+def cache_key(messages, model=GROQ_MODEL, client_kind="groq"):
+    # The client kind keeps StubClient answers from ever being served to the real client
+    blob = json.dumps({"client": client_kind, "model": model, "messages": messages}, sort_keys=True,
+                      ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Model responses on disk, one JSON file per request hash."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                content = json.load(f)["content"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return content
+
+    def put(self, key, content):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"content": content, "created": time.time()}, f)
+        # Atomic, so a concurrent reader never sees half a file
+        os.replace(tmp, path)
+
+
+class StubClient:
+    """Offline stand-in for groq.Groq: client.chat.completions.create(messages=..., model=...)."""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, model=GROQ_MODEL, **kwargs):
+        self.requests.append({"messages": messages, "model": model})
+        lines = messages[-1]["content"].splitlines()
+        accuracy = next((line for line in lines if line.startswith("Accuracy")), "No accuracy figures.")
+        peaks = [line for line in lines if line.startswith("Peak window")]
+        content = f"{accuracy}\n{peaks[0] if peaks else 'No peak windows.'}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def analyze(path, client, cache=None, model=GROQ_MODEL, client_kind=None):
+    """Summarize a predictions CSV and ask `client` about it; cached responses skip the request.
+
+    `client` may be a callable returning the client, so it is only created
+    when the cache misses; pass `client_kind` ("groq" or "stub") then, as
+    answers are cached per kind of client.
+    """
+    if client_kind is None:
+        client_kind = "stub" if isinstance(client, StubClient) else "groq"
+    messages = request_messages(format_summary(summarize_file(path)))
+    key = cache_key(messages, model, client_kind)
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            return content
+    if callable(client):
+        client = client()
+    chat_completion = client.chat.completions.create(messages=messages, model=model)
+    content = chat_completion.choices[0].message.content
+    if cache is not None:
+        cache.put(key, content)
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize predictions and ask Groq about them.")
+    parser.add_argument("predictions_csv")
+    parser.add_argument("--stub", action="store_true", help="answer with StubClient instead of Groq")
+    parser.add_argument("--summary-only", action="store_true", help="print the summary sent, no request")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary_text = format_summary(summarize_file(args.predictions_csv))
+    print(summary_text)
+    print(f"({len(summary_text)} characters, summarized in {(time.perf_counter() - start) * 1e3:.1f} ms)")
+    if args.summary_only:
+        return
+
+    def groq_client():
+        from groq import Groq
+
+        return Groq(api_key=os.environ.get("GROQ_API_KEY", ""))
+
+    cache = ResponseCache(args.cache_dir)
+    start = time.perf_counter()
+    content = analyze(args.predictions_csv, StubClient() if args.stub else groq_client, cache)
+    print(f"\n{content}\n({'cached' if cache.hits else 'requested'} in {(time.perf_counter() - start) * 1e3:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+The Matplotlib canvas PredictionApp plots on.
+
+Kept out of pyqtgui.py so that Matplotlib (and NumPy with it), about half of
+the GUI's import time, is only imported once the window is on screen.
+"""
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+from decimate import DecimatedLine
+
+
+class MatplotlibCanvas(FigureCanvas):
+    def __init__(self, parent=None):
+        fig = Figure(facecolor="#2C2C2C")  # Set the figure background to greyish
+        self.axes = fig.add_subplot(111)
+        self.axes.set_facecolor("#383838")  # Set the plot area background to a darker grey
+        fig.tight_layout()  # Automatically adjust the plot to fit within the canvas
+        super().__init__(fig)
+        self.setParent(parent)
+        self.series = []  # DecimatedLines, re-decimated when the canvas is resized
+        self.mpl_connect('scroll_event', self.zoom_x)
+        self.mpl_connect('resize_event', self.refresh_series)
+
+    def plot_series(self, y, x=None, **kwargs):
+        """Plot y against its index (or x), drawn at screen resolution however long it is."""
+        line, = self.axes.plot([], [], **kwargs)
+        series = DecimatedLine(line, y, x)
+        self.series = [s for s in self.series if s.line.axes is not None] + [series]
+        self.axes.relim()
+        self.axes.autoscale_view()
+        return series
+
+    def refresh_series(self, event=None):
+        for series in self.series:
+            series.refresh(self.axes.get_xlim())
+
+    def zoom_x(self, event):
+        """Zoom the x axis around the cursor with the mouse wheel."""
+        if event.inaxes is not self.axes:
+            return
+        scale = 0.8 if event.button == 'up' else 1.25
+        x0, x1 = self.axes.get_xlim()
+        self.axes.set_xlim(event.xdata - (event.xdata - x0) * scale, event.xdata + (x1 - event.xdata) * scale)
+        self.draw_idle()
+
+    def apply_dark_mode(self):
+        """Apply dark mode settings to the plot."""
+        self.axes.title.set_color("#FFFFFF")  # Set title text color
+        self.axes.xaxis.label.set_color("#FFFFFF")  # Set x-axis label color
+        self.axes.yaxis.label.set_color("#FFFFFF")  # Set y-axis label color
+        self.tick_params(axis='x', colors="#FFFFFF")  # Set x-axis tick colors
+        self.tick_params(axis='y', colors="#FFFFFF")  # Set y-axis tick colors
+        self.axes.grid(color="#444444", linestyle="--", linewidth=0.5)  # Set grid color and style
+        self.figure.patch.set_facecolor("#2C2C2C")  # Ensure figure background is greyish
+        self.draw()
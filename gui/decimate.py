@@ -0,0 +1,174 @@
+"""
+Level-of-detail drawing for long series on the Matplotlib canvases.
+
+A canvas is a few hundred pixels wide, so drawing millions of points only
+costs time. `minmax_decimate` splits the visible index range into one bucket
+per pixel column and keeps each bucket's minimum and maximum, in order. The
+drawn line then covers exactly the same pixels, spikes included, with at most
+two points per pixel.
+
+`DecimatedLine` keeps the full series and re-decimates the visible range
+whenever the x limits change (pan/zoom) or the series is replaced. It can
+also be given x positions, e.g. a series already reduced while streaming
+(batch_predict.MinMaxSeries). append() grows an index-based series for live
+plots: while the x limits stay the same, only the new samples are decimated
+into fixed buckets, so an update costs O(new samples) rather than O(n).
+`BlitManager` redraws only a set of animated artists over a cached background
+for live updates. The rest of the figure is re-rendered only when the axes
+themselves change.
+"""
+import math
+
+import numpy as np
+
+
+def minmax_decimate(y, start, stop, buckets):
+    """Indices into y covering y[start:stop] with at most 2 points per bucket.
+
+    The first and last index of the range are always included.
+    """
+    start = max(0, start)
+    stop = min(len(y), stop)
+    n = stop - start
+    if n <= 2 * buckets or buckets < 1:
+        return np.arange(start, stop)
+
+    size = math.ceil(n / buckets)
+    full = n // size * size
+    blocks = y[start:start + full].reshape(-1, size)
+    offsets = np.arange(start, start + full, size)
+    picks = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1)]
+    if full < n:
+        tail = y[start + full:stop]
+        picks[0] = np.append(picks[0], start + full + tail.argmin())
+        picks[1] = np.append(picks[1], start + full + tail.argmax())
+    # Min and max of each bucket in the order they occur
+    index = np.sort(np.column_stack(picks), axis=1).ravel()
+    return np.unique(np.concatenate(([start], index, [stop - 1])))
+
+
+class DecimatedLine:
+    """A Line2D that draws a min/max-decimated view of y against its index (or increasing x)."""
+
+    def __init__(self, line, y=None, x=None):
+        self.line = line
+        self.y = np.empty(0) if y is None else np.asarray(y, dtype=float)
+        self.x = None if x is None else np.asarray(x, dtype=float)
+        self.points = 0  # drawn after the last refresh
+        self._buffer = None  # backs y when it grows through append()
+        # append()'s decimation so far: [start, stop, bucket size, samples done, indices]
+        self._tail = None
+        self._cid = line.axes.callbacks.connect("xlim_changed", self._on_xlim_changed)
+        self.refresh()
+
+    def set_data(self, y, x=None):
+        self.y = np.asarray(y, dtype=float)
+        self.x = None if x is None else np.asarray(x, dtype=float)
+        self._buffer = self._tail = None
+        self.refresh()
+
+    def append(self, values):
+        """Extend an index-based series, decimating only the new samples while the x limits stay put."""
+        values = np.asarray(values, dtype=float).ravel()
+        n = len(self.y)
+        needed = n + len(values)
+        if self._buffer is None or needed > len(self._buffer):
+            # Doubling, so appends do not copy the history every time
+            buffer = np.empty(max(needed, 2 * n, 1024))
+            buffer[:n] = self.y
+            self._buffer = buffer
+        self._buffer[n:needed] = values
+        self.y = self._buffer[:needed]
+
+        axes = self.line.axes
+        if axes is None:
+            return
+        if self.x is not None or axes.get_autoscalex_on():
+            self.refresh()
+            return
+        x0, x1 = axes.get_xlim()
+        start = max(0, int(math.floor(min(x0, x1))) - 1)
+        stop = int(math.ceil(max(x0, x1))) + 2
+        size = max(1, math.ceil((stop - start) / max(1, int(axes.bbox.width))))
+        if self._tail is None or self._tail[:3] != [start, stop, size]:
+            # New limits or width: start over (rare, the live plot doubles its x range)
+            self._tail = [start, stop, size, start, np.empty(0, dtype=np.intp)]
+        done, index = self._tail[3], self._tail[4]
+        end = min(len(self.y), stop)
+        full = done + max(0, end - done) // size * size
+        if full > done:
+            blocks = self.y[done:full].reshape(-1, size)
+            offsets = np.arange(done, full, size)
+            if size > 1:
+                picks = np.column_stack([offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1)])
+                offsets = np.sort(picks, axis=1).ravel()
+            index = self._tail[4] = np.concatenate([index, offsets])
+            done = self._tail[3] = full
+        if end > done:
+            # The bucket still filling
+            tail = self.y[done:end]
+            index = np.concatenate([index, np.unique([done + tail.argmin(), done + tail.argmax()])])
+        self.line.set_data(index, self.y[index])
+        self.points = len(index)
+
+    def refresh(self, xlim=None):
+        axes = self.line.axes
+        if axes is None:
+            return  # removed by axes.clear()
+        n = len(self.y)
+        if xlim is None and axes.get_autoscalex_on():
+            start, stop = 0, n
+        else:
+            x0, x1 = xlim or axes.get_xlim()
+            if self.x is None:
+                # One extra point on each side so the line reaches the edges
+                start, stop = int(math.floor(min(x0, x1))) - 1, int(math.ceil(max(x0, x1))) + 2
+            else:
+                start = int(np.searchsorted(self.x, min(x0, x1))) - 1
+                stop = int(np.searchsorted(self.x, max(x0, x1), side="right")) + 1
+        buckets = max(1, int(axes.bbox.width))
+        index = minmax_decimate(self.y, start, stop, buckets)
+        self.line.set_data(index if self.x is None else self.x[index], self.y[index])
+        self.points = len(index)
+
+    def _on_xlim_changed(self, axes):
+        self.refresh(axes.get_xlim())
+
+    def disconnect(self):
+        if self.line.axes is not None:
+            self.line.axes.callbacks.disconnect(self._cid)
+
+
+class BlitManager:
+    """Redraw `artists` over a background captured on the last full draw."""
+
+    def __init__(self, canvas, artists):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self.background = None
+        for artist in self.artists:
+            artist.set_animated(True)
+        self._cid = canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            if artist.axes is not None:
+                self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """Blit the artists; falls back to a full draw until a background exists."""
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self._cid)
+        for artist in self.artists:
+            artist.set_animated(False)
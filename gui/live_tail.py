@@ -0,0 +1,78 @@
+"""
+Incremental readers for the live efficiency plot.
+
+`CsvTail` remembers how far into factorydata.csv it has read and only parses
+rows appended since the last call, keeping any half-written last line for the
+next call. When the file shrinks (the backend restarted and truncated it) or
+is replaced by a new file (rotated by models/retention.py), the tail starts
+over and `truncated` is set so the caller can clear its plot.
+
+The plotted values grow in decimate.DecimatedLine.append().
+"""
+import os
+
+import numpy as np
+
+
+class CsvTail:
+    """Read only the rows appended to a CSV since the previous call."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.offset = 0
+        self.truncated = False
+        self._file_id = None  # (device, inode) of the file read so far
+        self._indices = None
+        self._partial = b""
+
+    def reset(self):
+        self.offset = 0
+        self._indices = None
+        self._partial = b""
+
+    def read_new(self):
+        """Dict of column -> float array with the rows added since the last call."""
+        self.truncated = False
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self._empty()
+        size = stat.st_size
+        file_id = (stat.st_dev, stat.st_ino)
+        if size < self.offset or (self._file_id is not None and file_id != self._file_id):
+            self.reset()
+            self.truncated = True
+        self._file_id = file_id
+        if size == self.offset:
+            return self._empty()
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()  # incomplete until it ends with a newline
+
+        if self._indices is None:
+            if not lines:
+                return self._empty()
+            header = lines.pop(0).decode("utf-8-sig").strip().split(",")
+            self._indices = [header.index(name) for name in self.columns]
+
+        rows = []
+        for line in lines:
+            fields = line.split(b",")
+            try:
+                rows.append([float(fields[k]) for k in self._indices])
+            except (ValueError, IndexError):
+                continue  # blank or malformed line
+        if not rows:
+            return self._empty()
+        values = np.array(rows, dtype=float)
+        return {name: values[:, k] for k, name in enumerate(self.columns)}
+
+    def _empty(self):
+        return {name: np.empty(0) for name in self.columns}
+
@@ -1,42 +1,88 @@
+import time
+
+# Taken before the heavy imports, for the time-to-first-window measurement
+STARTUP_BEGIN = time.perf_counter()
+
 import sys
 import os
-import pandas as pd
-import joblib
 from PyQt5.QtGui import QPixmap, QPainter
 from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QTextEdit, QSlider
-from PyQt5.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from groq import Groq
-
-# Initialize the Groq client with your API key
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY", "")  # Ensure the environment variable is set
-)
-
-# Load the pre-trained Gradient Boosting model
-model = joblib.load('C:\\Users\\ZainP\\Documents\\Qhacks\\ThermoLogic\\models\\OntarioModel.pkl')  # Update with the correct file path to the model
-
-
-class MatplotlibCanvas(FigureCanvas):
-    def __init__(self, parent=None):
-        fig = Figure(facecolor="#2C2C2C")  # Set the figure background to greyish
-        self.axes = fig.add_subplot(111)
-        self.axes.set_facecolor("#383838")  # Set the plot area background to a darker grey
-        fig.tight_layout()  # Automatically adjust the plot to fit within the canvas
-        super().__init__(fig)
-        self.setParent(parent)
-
-    def apply_dark_mode(self):
-        """Apply dark mode settings to the plot."""
-        self.axes.title.set_color("#FFFFFF")  # Set title text color
-        self.axes.xaxis.label.set_color("#FFFFFF")  # Set x-axis label color
-        self.axes.yaxis.label.set_color("#FFFFFF")  # Set y-axis label color
-        self.tick_params(axis='x', colors="#FFFFFF")  # Set x-axis tick colors
-        self.tick_params(axis='y', colors="#FFFFFF")  # Set y-axis tick colors
-        self.axes.grid(color="#444444", linestyle="--", linewidth=0.5)  # Set grid color and style
-        self.figure.patch.set_facecolor("#2C2C2C")  # Ensure figure background is greyish
-        self.draw()
+from PyQt5.QtCore import Qt, QTimer
+
+# Shared modules from the models folder. Modules that import NumPy or
+# Matplotlib (canvas, decimate, live_tail, live_ring, telemetry_store,
+# analysis) are imported where they are used, after the window is shown.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models"))
+from retention import read_rollup, rollup_path
+from model_cache import preload
+from workers import Task, start
+
+# Groq client, created on first use (see get_groq_client)
+client = None
+
+# Groq answers for predictions already asked about (see analysis.py), created on first use
+groq_cache = None
+
+# Efficiency log written by backend/app.py
+FACTORY_CSV = r'C:\Users\ZainP\Documents\Qhacks\ThermoLogic\models\factorydata.csv'
+
+# "Process CSV" plots the raw samples up to this log size, per-minute rollups beyond it
+RAW_PLOT_MAX_BYTES = 64 * 2**20
+
+# How often the live efficiency plot checks the log for new rows (ms)
+LIVE_INTERVAL_MS = 1000
+
+# ... and the backend's shared-memory ring (models/live_ring.py), when it is running;
+# reading it involves no file I/O, so it is polled much more often
+LIVE_RING_INTERVAL_MS = 50
+
+# The backend's metrics endpoint; its rolling 1 min / 1 h / 24 h efficiency
+# means (backend/rolling.py) are shown in the live plot's title
+BACKEND_METRICS_URL = "http://127.0.0.1:9108"
+ROLLING_INTERVAL_MS = 5000
+
+# Smallest x range of the live plot (rows); it doubles whenever the data reaches the edge
+LIVE_MIN_XLIM = 100
+
+# The pre-trained Gradient Boosting model; loaded in the background after the
+# window appears and cached until the file changes (see models/model_cache.py)
+MODEL_PATH = 'C:\\Users\\ZainP\\Documents\\Qhacks\\ThermoLogic\\models\\OntarioModel.pkl'  # Update with the correct file path to the model
+
+
+def groq_client_kind():
+    """"stub" or "groq": which client get_groq_client() returns."""
+    from analysis import STUB_ENV, StubClient
+
+    if isinstance(client, StubClient) or (client is None and os.environ.get(STUB_ENV)):
+        return "stub"
+    return "groq"
+
+
+def get_groq_client():
+    """Create the Groq client on first use; importing groq is slow. THERMOLOGIC_GROQ_STUB=1 works offline."""
+    from analysis import STUB_ENV, StubClient
+
+    global client
+    if client is None and os.environ.get(STUB_ENV):
+        client = StubClient()
+    if client is None:
+        from groq import Groq
+
+        # Initialize the Groq client with your API key
+        client = Groq(
+            api_key=os.environ.get("GROQ_API_KEY", "")  # Ensure the environment variable is set
+        )
+    return client
+
+
+def get_groq_cache():
+    """The cache of Groq answers, created on first use."""
+    from analysis import ResponseCache
+
+    global groq_cache
+    if groq_cache is None:
+        groq_cache = ResponseCache()
+    return groq_cache
 
 
 class PredictionApp(QWidget):
@@ -95,7 +141,7 @@ class PredictionApp(QWidget):
 
         # Process button
         self.process_button = QPushButton("Process CSV", self)
-        self.process_button.setGeometry(20, 500, 400, 40)
+        self.process_button.setGeometry(20, 500, 290, 40)
         self.process_button.setEnabled(False)
         self.process_button.setStyleSheet('''
             QPushButton {
@@ -112,13 +158,19 @@ class PredictionApp(QWidget):
         ''')
         self.process_button.clicked.connect(self.process_csv)
 
-        # Matplotlib canvas for plotting
-        self.canvas = MatplotlibCanvas(self)
-        self.canvas.setGeometry(450, 20, 1100, 300)
+        # Cancel button for the background processing started by "Process CSV"
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.setGeometry(320, 500, 100, 40)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+
+        # Background tasks currently running, by name, and their progress text
+        self.running_tasks = {}
+        self.task_status = {}
 
-        # Second Matplotlib canvas for plotting the city data
-        self.city_canvas = MatplotlibCanvas(self)
-        self.city_canvas.setGeometry(450, 340, 1100, 300)
+        # Matplotlib canvases, created on first use (see ensure_canvases)
+        self._canvas = None
+        self._city_canvas = None
 
         # Output box for displaying model output
         self.output_box = QTextEdit(self)
@@ -147,9 +199,46 @@ class PredictionApp(QWidget):
 
 
 
+        # Live efficiency button: follows factorydata.csv as the backend appends to it
+        self.live_button = QPushButton("Start Live Efficiency", self)
+        self.live_button.setGeometry(20, 756, 400, 36)
+        self.live_button.clicked.connect(self.toggle_live_efficiency)
+
+        # Timer driving the live efficiency plot
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.update_live_efficiency)
+        self.eff_tail = None
+        self.rolling_timer = QTimer(self)
+        self.rolling_timer.timeout.connect(self.request_rolling_stats)
+        self.rolling_task = None
+
         # Placeholder for CSV file path
         self.csv_file_path = None
 
+    @property
+    def canvas(self):
+        return self.ensure_canvases()[0]
+
+    @property
+    def city_canvas(self):
+        return self.ensure_canvases()[1]
+
+    def ensure_canvases(self):
+        """Create the two Matplotlib canvases; importing Matplotlib is slow, so this waits for the first paint."""
+        if self._canvas is None:
+            from canvas import MatplotlibCanvas
+
+            self._canvas = MatplotlibCanvas(self)
+            self._canvas.setGeometry(450, 20, 1100, 300)
+
+            # Second Matplotlib canvas for plotting the city data
+            self._city_canvas = MatplotlibCanvas(self)
+            self._city_canvas.setGeometry(450, 340, 1100, 300)
+            if self.isVisible():
+                self._canvas.show()
+                self._city_canvas.show()
+        return self._canvas, self._city_canvas
+
     
 
     def update_slider_label(self):
@@ -158,15 +247,13 @@ class PredictionApp(QWidget):
         print(self.slider.value())
         self.slider_label.setText(f"Slider Value: {value}")
 
-    def plot_efficiency_comparison(self):
+    def plot_efficiency_comparison(self, data=None):
         """
-        Plot the `eff` and `effnew` values from the hardcoded CSV file on `self.city_canvas`.
+        Plot `eff` and `effnew` on `self.city_canvas`: the raw samples, or
+        per-minute means for a very large log (see load_efficiency_data).
         """
-        # Path to the hardcoded CSV file
-        csv_file_path = r'C:\Users\ZainP\Documents\Qhacks\ThermoLogic\models\factorydata.csv'
-
-        # Load the CSV file
-        data = pd.read_csv(csv_file_path)
+        if data is None:
+            data = load_efficiency_data()
 
         # Extract `eff` and `effnew` columns
         eff = data['eff']
@@ -174,8 +261,8 @@ class PredictionApp(QWidget):
 
 
         self.city_canvas.axes.clear()
-        self.city_canvas.axes.plot(eff, label='Old Eff', color='Green', linewidth=2)
-        self.city_canvas.axes.plot(effnew, label='New Eff', color="Yellow", linewidth=2)
+        self.city_canvas.plot_series(eff, label='Old Eff', color='Green', linewidth=2)
+        self.city_canvas.plot_series(effnew, label='New Eff', color="Yellow", linewidth=2)
         self.city_canvas.axes.set_title("Eff", fontsize=10, pad=0, color="#EEE")
         self.city_canvas.axes.set_ylim(.5, 1)
         self.city_canvas.axes.set_xlabel('Increments', color="#CCC")
@@ -187,7 +274,99 @@ class PredictionApp(QWidget):
 
 
 
+    def toggle_live_efficiency(self):
+        """Start or stop following the backend's live ring, or factorydata.csv, on `self.city_canvas`."""
+        from decimate import BlitManager
+        from live_ring import LIVE_RING_NAME, RingReader
+        from live_tail import CsvTail
+
+        if self.live_timer.isActive():
+            self.live_timer.stop()
+            self.rolling_timer.stop()
+            self.live_blit.disconnect()
+            if isinstance(self.eff_tail, RingReader):
+                self.eff_tail.close()
+            self.city_canvas.draw_idle()
+            self.live_button.setText("Start Live Efficiency")
+            return
+
+        try:
+            # Same interface as CsvTail; effd is what factorydata.csv calls effnew
+            self.eff_tail = RingReader(LIVE_RING_NAME, ['eff', 'effd'])
+            self.live_columns = ('eff', 'effd')
+            interval = LIVE_RING_INTERVAL_MS
+        except FileNotFoundError:
+            self.eff_tail = CsvTail(FACTORY_CSV, ['eff', 'effnew'])
+            self.live_columns = ('eff', 'effnew')
+            interval = LIVE_INTERVAL_MS
+        axes = self.city_canvas.axes
+        axes.clear()
+        self.live_eff_line = self.city_canvas.plot_series(None, label='Old Eff', color='Green', linewidth=2)
+        self.live_effnew_line = self.city_canvas.plot_series(None, label='New Eff', color="Yellow", linewidth=2)
+        # Only the two lines are redrawn on most ticks
+        self.live_blit = BlitManager(self.city_canvas, [self.live_eff_line.line, self.live_effnew_line.line])
+        axes.set_title("Eff (live)", fontsize=10, pad=0, color="#EEE")
+        axes.set_xlim(0, LIVE_MIN_XLIM)
+        axes.set_ylim(.5, 1)
+        axes.set_xlabel('Increments', color="#CCC")
+        axes.set_ylabel('Eff Perent', color="#CCC")
+        axes.legend()
+        axes.grid(True)
+
+        self.update_live_efficiency()
+        self.live_timer.start(interval)
+        self.request_rolling_stats()
+        self.rolling_timer.start(ROLLING_INTERVAL_MS)
+        self.live_button.setText("Stop Live Efficiency")
+
+    def update_live_efficiency(self):
+        """Read only the rows appended since the last tick and extend the lines."""
+        new_rows = self.eff_tail.read_new()
+        eff_column, effnew_column = self.live_columns
+        if self.eff_tail.truncated:
+            # The backend restarted with a fresh file
+            self.live_eff_line.set_data([])
+            self.live_effnew_line.set_data([])
+        if len(new_rows[eff_column]) == 0 and not self.eff_tail.truncated:
+            return
+
+        # Only the new rows are decimated (see DecimatedLine.append)
+        self.live_eff_line.append(new_rows[eff_column])
+        self.live_effnew_line.append(new_rows[effnew_column])
+
+        size = len(self.live_eff_line.y)
+        if size > self.city_canvas.axes.get_xlim()[1] or self.eff_tail.truncated:
+            # Leave room to grow, so the axes (and the full redraw) change rarely
+            self.city_canvas.axes.set_xlim(0, max(2 * size, LIVE_MIN_XLIM))
+            self.city_canvas.draw_idle()
+        else:
+            self.live_blit.update()
+
+    def request_rolling_stats(self):
+        """Fetch the backend's rolling statistics in the background (skipped while a fetch is running)."""
+        if self.rolling_task is not None:
+            return
+        self.rolling_task = Task("Rolling", rolling_stats_task)
+        self.rolling_task.signals.result.connect(self.show_rolling_stats)
+        self.rolling_task.signals.finished.connect(self.on_rolling_finished)
+        start(self.rolling_task)
+
+    def on_rolling_finished(self, name):
+        # Errors (e.g. the backend is not running) just leave the title as it is
+        self.rolling_task = None
+
+    def show_rolling_stats(self, name, stats):
+        if not self.live_timer.isActive():
+            return
+        means = [f"{label} {window['mean']:.3f}" for label, window in stats.get('eff', {}).items()
+                 if window.get('count')]
+        title = "Eff (live)" + (f"  mean {' / '.join(means)}" if means else "")
+        self.city_canvas.axes.set_title(title, fontsize=10, pad=0, color="#EEE")
+        self.city_canvas.draw_idle()
+
     def process_and_plot(self, file_path, output_csv, plot_title):
+        import pandas as pd
+
         # Load the CSV file
         data = pd.read_csv(file_path)
 
@@ -224,74 +403,89 @@ class PredictionApp(QWidget):
             event.ignore()
 
     def process_csv(self):
-        if self.csv_file_path:
-            try:
-                # Process and plot the first graph
-                self.process_and_plot(
-                    file_path=self.csv_file_path,
-                    output_csv="predictions_output.csv",
-                    plot_title="Comparison of Actual vs Predicted Energy"
-                )
-
-                # Plot the efficiency comparison graph
-                self.plot_efficiency_comparison()
-
-                # Optional: Update the output box with Groq response
-                file_path = r'C:\Users\ZainP\Documents\Qhacks\ThermoLogic\predictions_output.csv'
-                self.output_box2.setText(f"Groq Response:\n{self.talkingWithGrq(file_path)}")
-            except Exception as e:
-                self.output_box.setText(f"Error processing file: {e}")
+        """Load, predict and ask Groq in the background; results are drawn as they arrive."""
+        if self.csv_file_path and not self.running_tasks:
+            # Optional: Update the output box with Groq response
+            file_path = r'C:\Users\ZainP\Documents\Qhacks\ThermoLogic\predictions_output.csv'
+
+            self.task_status = {}
+            self.output_box.clear()
+            self.run_task("Prediction", predict_task, self.csv_file_path)
+            self.run_task("Efficiency", efficiency_task)
+            self.run_task("Groq", lambda task, path: self.talkingWithGrq(path), file_path)
+            self.process_button.setEnabled(False)
+            self.cancel_button.setEnabled(True)
+
+    def run_task(self, name, fn, *args):
+        task = Task(name, fn, *args)
+        task.signals.progress.connect(self.on_task_progress)
+        task.signals.result.connect(self.on_task_result)
+        task.signals.error.connect(self.on_task_error)
+        task.signals.finished.connect(self.on_task_finished)
+        self.running_tasks[name] = task
+        self.task_status[name] = "queued"
+        start(task)
+
+    def cancel_processing(self):
+        for task in self.running_tasks.values():
+            task.cancel()
+        self.task_status = {name: "cancelled" for name in self.running_tasks}
+        self.show_task_status()
+
+    def show_task_status(self):
+        self.output_box.setText("\n".join(f"{name}: {status}" for name, status in self.task_status.items()))
+
+    def on_task_progress(self, name, percent, message):
+        self.task_status[name] = f"{percent}% {message}"
+        self.show_task_status()
+
+    def on_task_result(self, name, result):
+        if name == "Prediction":
+            predictions, actual_values = result
+            self.plot_predictions(predictions, actual_values, "Comparison of Actual vs Predicted Energy")
+        elif name == "Efficiency":
+            self.plot_efficiency_comparison(result)
+        elif name == "Groq":
+            self.output_box2.setText(f"Groq Response:\n{result}")
+        self.task_status[name] = "done"
+        self.show_task_status()
+
+    def on_task_error(self, name, message):
+        self.task_status[name] = f"Error processing file: {message}"
+        self.show_task_status()
+
+    def on_task_finished(self, name):
+        self.running_tasks.pop(name, None)
+        if not self.running_tasks:
+            self.process_button.setEnabled(True)
+            self.cancel_button.setEnabled(False)
 
 
     def talkingWithGrq(self, filepath):
-        # Read the contents of the file
-        try:
-            with open(filepath, "r") as f:
-                csv_contents = f.read()
-        except Exception as e:
-            return f"Error reading the file: {e}"
+        # Only a summary of the file is sent (accuracy stats and peak windows,
+        # computed here), and answers for the same summary come from the cache
+        from analysis import analyze
 
-        # Send the file contents to Groq
         try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You will receive a CSV file containing data. Analyze it and I want you to tell me 2 Main data points from me tell me how actuate the model is say stats, when in the day is our power plant most needed also give times frames, say this in 2 simple direct sentences different lines."},
-                    {"role": "user", "content": f"The CSV data is:\n{csv_contents}"}
-                ],
-                model="llama-3.3-70b-versatile",
-            )
-            # Access the content properly based on the object's structure
-            return chat_completion.choices[0].message.content
+            return analyze(filepath, get_groq_client, get_groq_cache(), client_kind=groq_client_kind())
+        except OSError as e:
+            return f"Error reading the file: {e}"
         except Exception as e:
             return f"Error fetching Groq response: {e}"
 
     def process_and_plot(self, file_path, output_csv, plot_title):
-        # Load the CSV file
-        data = pd.read_csv(file_path)
-
-        # Rename columns to match those used during model training
-        data = data.rename(columns={'Sunny Or Cloudy': 'Sunny_Or_Cloudy'})
-
-        # Ensure the data has the correct data types
-        data['Sunny_Or_Cloudy'] = data['Sunny_Or_Cloudy'].astype(float)
-        data['Windy'] = data['Windy'].astype(float)
-
-        # Select only the features used during model training
-        features = ['Value', 'Sunny_Or_Cloudy', 'Windy']
-        X = data[features]
-
-        # Predict the 'Required Energy' for the data
-        predictions = model.predict(X)
-
-        # Extract the actual 'Required Energy' values
-        actual_values = data['Required Energy']
+        predictions, actual_values = predict_file(file_path, output_csv=output_csv)
+        self.plot_predictions(predictions, actual_values, plot_title)
 
+    def plot_predictions(self, predictions, actual_values, plot_title):
+        """`predictions` is (index, value) of the min/max-decimated predictions (see predict_file)."""
         # Limit the actual values to the first 75
         limited_actual_values = actual_values[:75]
 
         # Plot the actual values (first 75) and predictions (all)
         self.canvas.axes.clear()
-        self.canvas.axes.plot(predictions, label='Predicted Energy (All)', color='Green', linewidth=2)
+        x, y = predictions
+        self.canvas.plot_series(y, x, label='Predicted Energy (All)', color='Green', linewidth=2)
         self.canvas.axes.plot(limited_actual_values, label='Actual Energy (First 75)', linestyle='dotted' , color="White", linewidth=2)
         self.canvas.axes.set_title(plot_title, fontsize=10, pad=0, color="#EEE")
         self.canvas.axes.set_xlabel('Time (Index)', color="#CCC")
@@ -301,8 +495,99 @@ class PredictionApp(QWidget):
         self.canvas.draw()
 
 
+def load_efficiency_data():
+    """
+    `eff` and `effnew` from the backend's store or the hardcoded CSV file; once
+    the CSV is larger than RAW_PLOT_MAX_BYTES, per-minute means from the rollups
+    instead (when the backend keeps them).
+    """
+    import pandas as pd
+    from telemetry_store import ColumnStore
+
+    # Per-minute means merged across sensors, about 150 KB per sensor and day (see models/retention.py)
+    too_large = os.path.exists(FACTORY_CSV) and os.path.getsize(FACTORY_CSV) > RAW_PLOT_MAX_BYTES
+    if too_large and os.path.exists(rollup_path(FACTORY_CSV, "1min")):
+        rollup = read_rollup(FACTORY_CSV, "1min", merge_sensors=True)
+        if len(rollup):
+            return {'eff': rollup['eff_mean'].to_numpy(), 'effnew': rollup['effnew_mean'].to_numpy()}
+    # Otherwise the backend's columnar copy (memory-mapped, nothing to parse)
+    store_path = os.path.join(os.path.dirname(FACTORY_CSV), "factory_store")
+    if os.path.isdir(store_path):
+        return ColumnStore(store_path).read(['eff', 'effnew'])
+    return pd.read_csv(FACTORY_CSV)
+
+
+def predict_file(file_path, task=None, output_csv=None, max_points=4096):
+    """Predicted and actual 'Required Energy' (first 75) for a demand CSV; safe to run off the GUI thread.
+
+    The file is read and predicted in chunks (see models/batch_predict.py);
+    with output_csv the predictions are written there as they are produced.
+    Only a min/max-decimated copy of at most max_points is kept for the plot,
+    returned as (index, value) arrays, so memory does not grow with the file.
+    """
+    import numpy as np
+    import pandas as pd
+    from batch_predict import MinMaxSeries, predict_chunks, stream_predict
+
+    def progress(fraction):
+        if task:
+            task.report(int(fraction * 100), "predicting")
+
+    predictions = MinMaxSeries(max_points)
+    actual_values = []
+
+    def keep(chunk, chunk_predictions):
+        predictions.append(chunk_predictions)
+        if sum(len(a) for a in actual_values) < 75:
+            actual_values.append(chunk['Required Energy'].to_numpy()[:75])
+
+    if task:
+        task.report(0, "loading CSV")
+    if output_csv:
+        stream_predict(file_path, output_csv, model_path=MODEL_PATH, progress=progress, on_chunk=keep)
+    else:
+        for chunk, chunk_predictions in predict_chunks(file_path, model_path=MODEL_PATH, progress=progress):
+            keep(chunk, chunk_predictions)
+
+    actual_values = pd.Series(np.concatenate(actual_values) if actual_values else np.empty(0))
+    return predictions.points(), actual_values
+
+
+def predict_task(task, file_path):
+    return predict_file(file_path, task)
+
+
+def rolling_stats_task(task):
+    """The backend's /rolling snapshot: {series: {window: stats}}."""
+    import json
+    from urllib.request import urlopen
+
+    with urlopen(f"{BACKEND_METRICS_URL}/rolling", timeout=1) as response:
+        return json.load(response)
+
+
+def efficiency_task(task):
+    import numpy as np
+
+    task.report(0, "loading factory data")
+    data = load_efficiency_data()
+    # Copy out of the memory map so drawing never touches a file that is being appended to
+    return {'eff': np.array(data['eff']), 'effnew': np.array(data['effnew'])}
+
+
+def report_startup():
+    """Print time-to-first-window, then warm the model cache in the background."""
+    print(f"Time to first window: {time.perf_counter() - STARTUP_BEGIN:.2f} s")
+    if os.path.exists(MODEL_PATH):
+        preload(MODEL_PATH)
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = PredictionApp()
     window.show()
+    # Runs once the event loop has painted the window
+    QTimer.singleShot(0, report_startup)
+    # ... then import Matplotlib and create the plots
+    QTimer.singleShot(0, window.ensure_canvases)
     sys.exit(app.exec_())
@@ -0,0 +1,67 @@
+"""
+Background tasks for the GUI.
+
+Loading CSVs, model.predict and the Groq request used to run on the Qt event
+thread and froze the window. A `Task` runs a plain function on the global
+QThreadPool and reports back through Qt signals, which are delivered on the
+GUI thread, so all drawing stays there.
+
+The function receives the task as its first argument and can call
+`task.report(percent, message)` for progress and `task.check()` between steps
+to stop early once `task.cancel()` has been called. A cancelled task emits no
+result; a blocking call already in progress (e.g. an HTTP request) finishes
+but its result is discarded.
+"""
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class Cancelled(Exception):
+    """Raised by Task.check() after the task was cancelled."""
+
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(str, int, str)   # task name, percent, message
+    result = pyqtSignal(str, object)       # task name, return value
+    error = pyqtSignal(str, str)           # task name, error message
+    finished = pyqtSignal(str)             # task name, always emitted last
+
+
+class Task(QRunnable):
+    def __init__(self, name, fn, *args, **kwargs):
+        super().__init__()
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.signals = TaskSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def report(self, percent, message=""):
+        self.check()
+        self.signals.progress.emit(self.name, percent, message)
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+            self.check()
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.signals.error.emit(self.name, str(e))
+        else:
+            self.signals.result.emit(self.name, result)
+        finally:
+            self.signals.finished.emit(self.name)
+
+
+def start(task):
+    """Queue a task on the application-wide thread pool."""
+    QThreadPool.globalInstance().start(task)
+    return task
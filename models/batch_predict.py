@@ -0,0 +1,247 @@
+"""
+Streaming batch prediction for demand CSVs of any size.
+
+The input is read `chunksize` rows at a time with explicit dtypes (no type
+inference pass over the whole file), each chunk is predicted, and its rows are
+appended to the output CSV before the next chunk is read, so peak memory
+depends on the chunk size rather than the file size. With workers > 1 chunks
+are predicted in a process pool; at most two chunks per worker are in flight
+and results are written in input order.
+
+The output has the same columns as prediction.py always wrote: the first 75
+actual values (empty afterwards) and the predicted energy.
+
+For plotting, `MinMaxSeries` keeps a fixed-size min/max summary of the
+predictions as the chunks go by (the same rule as gui/decimate.py, applied
+while streaming), so the plot does not need the predictions in memory either.
+
+    python batch_predict.py input.csv [predictions_output.csv] [--chunksize N] [--workers N]
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_cache import DEFAULT_MODEL_PATH
+from prediction_cache import cached_model, model_predictor
+from telemetry_store import ColumnStore
+
+FEATURES = ["Value", "Sunny_Or_Cloudy", "Windy"]
+TARGET = "Required Energy"
+
+# Column names as they appear in the demand CSVs, with the types to parse them as
+CSV_DTYPES = {"Value": "float64", "Sunny Or Cloudy": "float64", "Windy": "float64", TARGET: "float64"}
+
+OUTPUT_COLUMNS = ["Actual Energy (First 75)", "Predicted Energy"]
+ACTUAL_ROWS = 75
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class MinMaxSeries:
+    """
+    Min/max-decimated view of a series that arrives in chunks, in at most
+    `max_points` points whatever its length.
+
+    The series is cut into blocks of `size` samples and each block keeps the
+    index and value of its minimum and maximum. When there are more than
+    max_points / 2 blocks, neighbouring blocks are merged and `size` doubles,
+    so the memory stays bounded and every block still covers the same number
+    of samples.
+    """
+
+    def __init__(self, max_points=4096):
+        self.max_blocks = max(1, max_points // 2)
+        self.size = 1
+        self.count = 0
+        # Complete blocks: index and value of each block's minimum and maximum
+        self.lo_i = np.empty(0, dtype=np.int64)
+        self.lo_v = np.empty(0)
+        self.hi_i = np.empty(0, dtype=np.int64)
+        self.hi_v = np.empty(0)
+        # The block being filled: [samples, lo_i, lo_v, hi_i, hi_v], or None
+        self.partial = None
+
+    def _merge_into_partial(self, y, offset):
+        lo, hi = int(y.argmin()), int(y.argmax())
+        if self.partial is None:
+            self.partial = [len(y), offset + lo, y[lo], offset + hi, y[hi]]
+            return
+        partial = self.partial
+        partial[0] += len(y)
+        if y[lo] < partial[2]:
+            partial[1], partial[2] = offset + lo, y[lo]
+        if y[hi] > partial[4]:
+            partial[3], partial[4] = offset + hi, y[hi]
+
+    def _push(self, lo_i, lo_v, hi_i, hi_v):
+        self.lo_i = np.concatenate([self.lo_i, lo_i])
+        self.lo_v = np.concatenate([self.lo_v, lo_v])
+        self.hi_i = np.concatenate([self.hi_i, hi_i])
+        self.hi_v = np.concatenate([self.hi_v, hi_v])
+
+    def _halve(self):
+        """Merge neighbouring blocks; size doubles."""
+        if len(self.lo_i) % 2:
+            # The odd block out holds fewer samples than the new size: it leads the partial block
+            last = [self.size, self.lo_i[-1], self.lo_v[-1], self.hi_i[-1], self.hi_v[-1]]
+            if self.partial is not None:
+                last[0] += self.partial[0]
+                if self.partial[2] < last[2]:
+                    last[1], last[2] = self.partial[1], self.partial[2]
+                if self.partial[4] > last[4]:
+                    last[3], last[4] = self.partial[3], self.partial[4]
+            self.partial = last
+            self.lo_i, self.lo_v, self.hi_i, self.hi_v = (a[:-1] for a in (self.lo_i, self.lo_v, self.hi_i, self.hi_v))
+        lo_v, hi_v = self.lo_v.reshape(-1, 2), self.hi_v.reshape(-1, 2)
+        lo_pick, hi_pick = lo_v.argmin(axis=1), hi_v.argmax(axis=1)
+        rows = np.arange(len(lo_v))
+        self.lo_i = self.lo_i.reshape(-1, 2)[rows, lo_pick]
+        self.lo_v = lo_v[rows, lo_pick]
+        self.hi_i = self.hi_i.reshape(-1, 2)[rows, hi_pick]
+        self.hi_v = hi_v[rows, hi_pick]
+        self.size *= 2
+
+    def append(self, y):
+        y = np.asarray(y, dtype=float).ravel()
+        offset = self.count
+        self.count += len(y)
+        if self.partial is not None:
+            head = y[:self.size - self.partial[0]]
+            if len(head):
+                self._merge_into_partial(head, offset)
+            y, offset = y[len(head):], offset + len(head)
+            if self.partial[0] == self.size:
+                self._push(*([v] for v in self.partial[1:]))
+                self.partial = None
+        full = len(y) // self.size * self.size
+        if full:
+            blocks = y[:full].reshape(-1, self.size)
+            starts = offset + np.arange(0, full, self.size)
+            lo, hi = blocks.argmin(axis=1), blocks.argmax(axis=1)
+            rows = np.arange(len(blocks))
+            self._push(starts + lo, blocks[rows, lo], starts + hi, blocks[rows, hi])
+        if len(y) > full:
+            self._merge_into_partial(y[full:], offset + full)
+        while len(self.lo_i) > self.max_blocks:
+            self._halve()
+
+    def points(self):
+        """(x, y): indices and values of the decimated series, in order."""
+        lo_i, lo_v, hi_i, hi_v = self.lo_i, self.lo_v, self.hi_i, self.hi_v
+        if self.partial is not None:
+            _, pl_i, pl_v, ph_i, ph_v = self.partial
+            lo_i, lo_v = np.append(lo_i, pl_i), np.append(lo_v, pl_v)
+            hi_i, hi_v = np.append(hi_i, ph_i), np.append(hi_v, ph_v)
+        x = np.concatenate([lo_i, hi_i])
+        y = np.concatenate([lo_v, hi_v])
+        x, first = np.unique(x, return_index=True)
+        return x, y[first]
+
+
+def _predict_values(model_path, values, cache=False):
+    # Runs in pool workers too; model_cache loads the model once per process,
+    # and each process has its own prediction cache
+    if cache:
+        return cached_model(model_path).predict(values)
+    return model_predictor(model_path)(values)
+
+
+def read_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    """DataFrames of at most `chunksize` rows with FEATURES and TARGET columns.
+
+    `file_path` is a demand CSV or a column store directory (see
+    telemetry_store.py). progress(fraction) is called after every chunk.
+    """
+    if os.path.isdir(file_path):
+        store = ColumnStore(file_path)
+        columns = FEATURES + ["Required_Energy"]
+        total = len(store)
+        for start in range(0, total, chunksize):
+            chunk = store.to_frame(columns, start, start + chunksize)
+            yield chunk.rename(columns={"Required_Energy": TARGET})
+            if progress:
+                progress(min(start + chunksize, total) / max(total, 1))
+        return
+
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        reader = pd.read_csv(f, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES, chunksize=chunksize)
+        for chunk in reader:
+            yield chunk.rename(columns={"Sunny Or Cloudy": "Sunny_Or_Cloudy"})
+            if progress:
+                # The parser reads ahead in blocks, so this is approximate
+                progress(min(f.tell() / max(size, 1), 1.0))
+
+
+def predict_chunks(file_path, chunksize=DEFAULT_CHUNKSIZE, workers=1, model_path=DEFAULT_MODEL_PATH,
+                   progress=None, cache=False):
+    """
+    (chunk, predictions) pairs in input order. `cache` puts prediction_cache.py
+    in front of the model; it only pays off when rows repeat.
+    """
+    chunks = read_chunks(file_path, chunksize, progress)
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, _predict_values(model_path, chunk[FEATURES].to_numpy(), cache)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(_predict_values, model_path, chunk[FEATURES].to_numpy(), cache)))
+            if len(in_flight) >= 2 * workers:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+
+
+def stream_predict(file_path, output_csv, chunksize=DEFAULT_CHUNKSIZE, workers=1, model_path=DEFAULT_MODEL_PATH,
+                   progress=None, on_chunk=None, cache=False):
+    """
+    Predict every row of `file_path`, appending the results to `output_csv`.
+
+    on_chunk(chunk, predictions) is called for each chunk after it has been
+    written. Returns the number of rows predicted.
+    """
+    rows = 0
+    with open(output_csv, "w", newline="") as out:
+        out.write(",".join(OUTPUT_COLUMNS) + "\n")
+        for chunk, predictions in predict_chunks(file_path, chunksize, workers, model_path, progress, cache):
+            actual = np.full(len(chunk), np.nan)
+            head = max(0, min(ACTUAL_ROWS - rows, len(chunk)))
+            actual[:head] = chunk[TARGET].to_numpy()[:head]
+            pd.DataFrame({OUTPUT_COLUMNS[0]: actual, OUTPUT_COLUMNS[1]: predictions}).to_csv(
+                out, header=False, index=False)
+            rows += len(chunk)
+            if on_chunk:
+                on_chunk(chunk, predictions)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict 'Required Energy' for a demand CSV, chunk by chunk.")
+    parser.add_argument("input", help="demand CSV or column store directory")
+    parser.add_argument("output", nargs="?", default="predictions_output.csv")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=1, help="processes predicting chunks")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--cache", action="store_true",
+                        help="answer repeated rows from a prediction cache (see prediction_cache.py); "
+                             "slower when rows rarely repeat")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = stream_predict(args.input, args.output, args.chunksize, args.workers, args.model,
+                          cache=args.cache)
+    print(f"Predicted {rows} rows in {time.perf_counter() - start:.2f} s; saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Flattened inference for the GradientBoostingRegressor demand model.
+
+export() copies every tree of the trained ensemble into a handful of contiguous
+NumPy arrays (split feature, threshold, children, leaf value pre-multiplied by
+the learning rate) so prediction needs neither scikit-learn nor its per-call
+validation. All trees are walked together, one level per step: with
+max_depth=3 a batch takes three gather/compare rounds over (rows x trees).
+
+Leaves point to themselves, so every tree can be stepped `depth` times without
+checking for leaves. Inputs are rounded to float32 before comparing, exactly
+like scikit-learn's tree code, which keeps the results identical to
+model.predict up to float summation order.
+
+The demand model only splits on a few hundred distinct thresholds, so the
+ensemble is also compiled into a grid: the output is constant between
+consecutive thresholds of each feature, so it is evaluated once per grid cell,
+and prediction becomes one searchsorted per feature plus a single gather. The
+tree walk is used when the grid would exceed MAX_GRID_CELLS.
+
+    python flat_gbm.py            # export OntarioModel.pkl, check it and benchmark
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_FLAT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "OntarioModel.flat.npz")
+
+# Rows per chunk in the tree walk; bounds the (rows x trees) index arrays
+CHUNK_ROWS = 16384
+
+# Largest compiled grid (cells) before falling back to walking the trees
+MAX_GRID_CELLS = 4_000_000
+
+
+def _initial_value(model):
+    """Constant the boosting starts from: the fitted init_ DummyRegressor's (the training mean for squared error)."""
+    from sklearn.dummy import DummyRegressor
+
+    if isinstance(model.init_, str) and model.init_ == "zero":
+        return 0.0
+    if not isinstance(model.init_, DummyRegressor):
+        # Any other init estimator depends on the input, which the flat arrays cannot represent
+        raise TypeError(f"Only a constant init can be flattened, got {type(model.init_).__name__}")
+    # All GradientBoostingRegressor losses use the identity link, so the raw start is the prediction
+    return float(np.ravel(model.init_.constant_)[0])
+
+
+class FlatGBM:
+    def __init__(self, feature, threshold, left, right, value, roots, depth, init, feature_names=None,
+                 n_features=None, grid_edges=None, grid_values=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.init = float(init)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.n_features = int(n_features) if n_features is not None else int(feature.max()) + 1
+        self.grid_edges = grid_edges
+        self.grid_values = grid_values
+        if grid_edges is None:
+            self.compile_grid()
+        self._prepare_grid()
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted single-output GradientBoostingRegressor."""
+        if not hasattr(model, "estimators_"):
+            raise TypeError(f"Only GradientBoostingRegressor can be flattened, got {type(model).__name__}")
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_[:, 0]:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            node_ids = np.arange(n)
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            lefts.append(np.where(leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(leaf, node_ids, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0] * model.learning_rate)
+            depth = max(depth, tree.max_depth)
+            offset += n
+
+        init = _initial_value(model)
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            depth=depth,
+            init=init,
+            feature_names=getattr(model, "feature_names_in_", None),
+            n_features=model.n_features_in_,
+        )
+
+    def compile_grid(self):
+        """Evaluate the ensemble once per cell between consecutive split thresholds."""
+        split = self.left != np.arange(len(self.left))
+        edges = [np.unique(self.threshold[split & (self.feature == k)]) for k in range(self.n_features)]
+        shape = tuple(len(e) + 1 for e in edges)
+        if np.prod(shape, dtype=float) > MAX_GRID_CELLS:
+            self.grid_edges = self.grid_values = None
+            return
+
+        # One representative per cell: the cell's upper threshold (x <= thr holds
+        # for every x in the cell), and +inf for the cell above the last one
+        reps = [np.append(e, np.inf) for e in edges]
+        mesh = np.meshgrid(*reps, indexing="ij")
+        points = np.column_stack([m.ravel() for m in mesh])
+        values = np.empty(len(points))
+        for start in range(0, len(points), CHUNK_ROWS):
+            values[start:start + CHUNK_ROWS] = self._predict_block(points[start:start + CHUNK_ROWS])
+        self.grid_edges = edges
+        self.grid_values = values
+
+    def _prepare_grid(self):
+        if self.grid_edges is None:
+            return
+        shape = [len(e) + 1 for e in self.grid_edges]
+        self._strides = np.array([int(np.prod(shape[k + 1:])) for k in range(len(shape))], dtype=np.intp)
+        # Plain lists for the single-row path
+        self._edge_lists = [e.tolist() for e in self.grid_edges]
+        self._value_list = self.grid_values.tolist()
+        self._stride_list = self._strides.tolist()
+
+    def save(self, path=DEFAULT_FLAT_PATH):
+        grid = {}
+        if self.grid_edges is not None:
+            grid = {f"grid_edges_{k}": e for k, e in enumerate(self.grid_edges)}
+            grid["grid_values"] = self.grid_values
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                 right=self.right, value=self.value, roots=self.roots, depth=self.depth,
+                 init=self.init, feature_names=np.array(self.feature_names or [], dtype=str),
+                 n_features=self.n_features, **grid)
+
+    @classmethod
+    def load(cls, path=DEFAULT_FLAT_PATH):
+        with np.load(path) as data:
+            names = [str(name) for name in data["feature_names"]] or None
+            n_features = int(data["n_features"])
+            edges = values = None
+            if "grid_values" in data:
+                edges = [data[f"grid_edges_{k}"] for k in range(n_features)]
+                values = data["grid_values"]
+            return cls(data["feature"].astype(np.intp), data["threshold"], data["left"].astype(np.intp),
+                       data["right"].astype(np.intp), data["value"], data["roots"].astype(np.intp),
+                       data["depth"], data["init"], names, n_features, edges, values)
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns") and self.feature_names is not None:
+            X = X[self.feature_names]
+        # Same float32 rounding as scikit-learn before comparing with thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        return X.astype(np.float64)
+
+    def _predict_block(self, X):
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.init + self.value[node].sum(axis=1)
+
+    def predict(self, X):
+        """Predictions for a 2-D array or DataFrame of rows."""
+        X = self._as_matrix(X)
+        if self.grid_edges is not None:
+            cell = np.zeros(len(X), dtype=np.intp)
+            for k, edges in enumerate(self.grid_edges):
+                # Cell k holds edges[k-1] < x <= edges[k]
+                cell += np.searchsorted(edges, X[:, k], side="left") * self._strides[k]
+            return self.grid_values[cell]
+
+        out = np.empty(len(X))
+        for start in range(0, len(X), CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._predict_block(X[start:start + CHUNK_ROWS])
+        return out
+
+    def predict_one(self, *features):
+        """Prediction for a single row, e.g. predict_one(value, sunny_or_cloudy, windy)."""
+        x = np.array(features, dtype=np.float32).tolist()
+        if self.grid_edges is not None:
+            cell = 0
+            for edges, stride, value in zip(self._edge_lists, self._stride_list, x):
+                cell += bisect.bisect_left(edges, value) * stride
+            return self._value_list[cell]
+
+        x = np.array(x)
+        node = self.roots
+        for _ in range(self.depth):
+            node = np.where(x[self.feature[node]] <= self.threshold[node], self.left[node], self.right[node])
+        return self.init + float(self.value[node].sum())
+
+
+def flat_path_for(model_path):
+    """Where the export of the model at model_path goes: <model>.flat.npz next to it."""
+    return os.path.splitext(model_path)[0] + ".flat.npz"
+
+
+def export(model_path, flat_path=DEFAULT_FLAT_PATH):
+    """Flatten the pickled model at model_path and save the arrays to flat_path."""
+    from model_cache import load_model
+
+    flat = FlatGBM.from_sklearn(load_model(model_path))
+    flat.save(flat_path)
+    return flat
+
+
+def load_or_export(model_path, flat_path=None):
+    """
+    The flattened model at model_path: loaded from flat_path, or exported
+    there first when it is missing or older than the .pkl (a fresh clone, or
+    the model was retrained).
+    """
+    if flat_path is None:
+        flat_path = flat_path_for(model_path)
+    if os.path.exists(flat_path) and os.stat(flat_path).st_mtime_ns > os.stat(model_path).st_mtime_ns:
+        return FlatGBM.load(flat_path)
+    return export(model_path, flat_path)
+
+
+class FlatPredictor:
+    """The flattened model of the .pkl at model_path, re-exported after a retrain."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.version = None
+        self.flat = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        """(model version, predict function) of the same export."""
+        from model_cache import model_version
+
+        with self.lock:
+            version = model_version(self.model_path)
+            while version != self.version:
+                self.flat = load_or_export(self.model_path)
+                # Retrained again while exporting: export once more
+                self.version, version = version, model_version(self.model_path)
+            return self.version, self.flat.predict
+
+    def __call__(self, X):
+        return self.current()[1](X)
+
+
+def _best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(model, flat, sizes=(1, 1000, 1_000_000), seed=0):
+    """Seconds per call of model.predict and the flat predictor, with the max difference."""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        X = pd.DataFrame({
+            "Value": rng.uniform(12000.0, 22000.0, n),
+            "Sunny_Or_Cloudy": rng.integers(0, 2, n).astype(float),
+            "Windy": rng.uniform(0.0, 1.0, n),
+        })
+        repeat = 20 if n <= 1000 else 1
+        sk_time = _best_time(lambda: model.predict(X), repeat)
+        flat_time = _best_time(lambda: flat.predict(X), repeat)
+        row = {"rows": n, "sklearn_s": sk_time, "flat_s": flat_time,
+               "max_abs_diff": float(np.abs(model.predict(X) - flat.predict(X)).max())}
+        if n == 1:
+            x = X.iloc[0].to_numpy()
+            row["flat_one_s"] = _best_time(lambda: flat.predict_one(*x), repeat)
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    from model_cache import DEFAULT_MODEL_PATH, load_model
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MODEL_PATH
+    flat = export(model_path, flat_path_for(model_path))
+    print(f"Exported {len(flat.roots)} trees ({len(flat.value)} nodes) to {flat_path_for(model_path)}")
+
+    for row in benchmark(load_model(model_path), flat):
+        line = (f"{row['rows']:>9} rows: sklearn {row['sklearn_s'] * 1e3:9.3f} ms  "
+                f"flat {row['flat_s'] * 1e3:9.3f} ms  max diff {row['max_abs_diff']:.2e}")
+        if "flat_one_s" in row:
+            line += f"  predict_one {row['flat_one_s'] * 1e6:.1f} us"
+        print(line)
@@ -0,0 +1,283 @@
+"""
+Shared-memory ring buffer of live readings, from the backend to the GUI.
+
+The backend (RingWriter) appends one fixed-size record per processed reading:
+
+    timestamp, p1, p2, t1, t2, eff, effd        (float64 each)
+
+to a multiprocessing.shared_memory segment. The GUI (RingReader) maps the
+same segment and copies out whatever was added since its last call. No file
+is written or read and no lock is taken. A new sample is visible to the
+reader as soon as write() returns.
+
+Layout: a header of eight uint64 (magic, layout version, capacity, fields,
+head, epoch, closed, reserved), then one uint64 sequence stamp per slot, then
+capacity x fields float64 records. `head` counts records ever written; record
+n lives in slot n % capacity. The writer zeroes the slot's stamp, writes the
+record, stamps it n + 1, then advances head. A reader copies a range of
+slots, reads the stamps before and after the copy, and keeps only the records
+whose stamps equal n + 1 on both reads. A record the writer overwrote in the
+meantime is dropped and counted in `lost`, never returned half-written.
+Readers that fall more than `capacity` records behind skip ahead and count
+the gap in `lost` too.
+
+Every writer start sets a new `epoch`, reusing the segment if it still
+exists. Readers then set `truncated`, like live_tail.CsvTail does when
+factorydata.csv starts over. A reader whose writer closed keeps trying to
+attach to the next one.
+
+    python live_ring.py watch              # print records as the backend writes them
+    python live_ring.py latency            # writer -> reader latency between two processes
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+RECORD_FIELDS = ("timestamp", "p1", "p2", "t1", "t2", "eff", "effd")
+
+LIVE_RING_NAME = "thermologic_live"
+DEFAULT_CAPACITY = 65536  # records; 3.5 MiB, about 18 hours at one reading per second
+
+MAGIC = 0x474E49524F4D5254  # "TRMORING"
+LAYOUT_VERSION = 1
+HEADER_WORDS = 8
+_MAGIC, _VERSION, _CAPACITY, _FIELDS, _HEAD, _EPOCH, _CLOSED = range(7)
+
+
+def _segment_size(capacity, fields):
+    return 8 * (HEADER_WORDS + capacity + capacity * fields)
+
+
+def _views(shm, capacity, fields):
+    header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+    stamps = np.ndarray((capacity,), dtype=np.uint64, buffer=shm.buf, offset=8 * HEADER_WORDS)
+    data = np.ndarray((capacity, fields), dtype=np.float64, buffer=shm.buf, offset=8 * (HEADER_WORDS + capacity))
+    return header, stamps, data
+
+
+def _attach(name):
+    """Open an existing segment without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    if sys.platform != "win32":
+        # Before 3.13 attaching registers the segment, and the tracker would
+        # unlink it when this (reading) process exits
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class RingWriter:
+    """Append records to the shared ring; one writer per ring."""
+
+    def __init__(self, name=LIVE_RING_NAME, capacity=DEFAULT_CAPACITY, fields=RECORD_FIELDS):
+        self.name = name
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        size = _segment_size(capacity, len(self.fields))
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run (or kept open by a reader): reuse it if the layout fits
+            shm = _attach(name)
+            header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+            if (shm.size < size or header[_MAGIC] != MAGIC or header[_VERSION] != LAYOUT_VERSION
+                    or header[_CAPACITY] != capacity or header[_FIELDS] != len(self.fields)):
+                del header
+                shm.close()
+                raise ValueError(f"shared memory {name!r} exists with a different layout; "
+                                 f"close its users or pick another name")
+            del header
+            self._shm = shm
+        self._header, self._stamps, self._data = _views(self._shm, capacity, len(self.fields))
+        self._header[_CLOSED] = 1  # Readers wait while the ring is reset
+        self._stamps[:] = 0
+        self._header[_HEAD] = 0
+        self._header[_MAGIC] = MAGIC
+        self._header[_VERSION] = LAYOUT_VERSION
+        self._header[_CAPACITY] = capacity
+        self._header[_FIELDS] = len(self.fields)
+        # Unique per writer start, whether or not the segment was reused
+        self._header[_EPOCH] = time.time_ns()
+        self._header[_CLOSED] = 0
+        self.head = 0
+
+    def write(self, *record):
+        """Append one record (one value per field)."""
+        n = self.head
+        slot = n % self.capacity
+        self._stamps[slot] = 0
+        self._data[slot] = record
+        self._stamps[slot] = n + 1
+        self.head = n + 1
+        self._header[_HEAD] = n + 1
+
+    def close(self, unlink=True):
+        """Tell readers the writer is gone, then release (and by default remove) the segment."""
+        if self._shm is None:
+            return
+        self._header[_CLOSED] = 1
+        del self._header, self._stamps, self._data
+        self._shm.close()
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RingReader:
+    """Copy out records added to the shared ring since the previous call; never blocks the writer."""
+
+    def __init__(self, name=LIVE_RING_NAME, columns=RECORD_FIELDS):
+        self.name = name
+        self.columns = list(columns)
+        self.next = 0
+        self.epoch = None
+        self.lost = 0
+        self.truncated = False
+        self._shm = None
+        if not self._open():
+            raise FileNotFoundError(f"no live ring named {name!r}; is the backend running?")
+
+    def _open(self):
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        header = np.ndarray((HEADER_WORDS,), dtype=np.uint64, buffer=shm.buf)
+        if header[_MAGIC] != MAGIC or header[_VERSION] != LAYOUT_VERSION:
+            del header
+            shm.close()
+            return False
+        capacity, fields = int(header[_CAPACITY]), int(header[_FIELDS])
+        del header
+        self._close_segment()
+        self._shm = shm
+        self.capacity = capacity
+        self._header, self._stamps, self._data = _views(shm, capacity, fields)
+        self._indices = [RECORD_FIELDS.index(column) for column in self.columns]
+        return True
+
+    def _close_segment(self):
+        if self._shm is not None:
+            del self._header, self._stamps, self._data
+            self._shm.close()
+            self._shm = None
+
+    def _empty(self):
+        return {column: np.empty(0) for column in self.columns}
+
+    def read_new(self):
+        """Dict of column -> float array with the records added since the last call."""
+        self.truncated = False
+        if self._shm is None or self._header[_CLOSED]:
+            # The writer is gone (or resetting): pick up a restarted one if there is one
+            if not self._open() or self._header[_CLOSED]:
+                return self._empty()
+
+        epoch = int(self._header[_EPOCH])
+        head = int(self._header[_HEAD])
+        if epoch != self.epoch or head < self.next:
+            self.truncated = self.epoch is not None
+            self.epoch = epoch
+            # Start with whatever history the ring still holds
+            self.next = max(0, head - self.capacity)
+        start = max(self.next, head - self.capacity)
+        self.lost += start - self.next
+        if head == start:
+            return self._empty()
+
+        n = np.arange(start, head, dtype=np.uint64)
+        slots = (n % np.uint64(self.capacity)).astype(np.intp)
+        before = self._stamps[slots]  # Fancy indexing copies
+        records = self._data[slots]
+        after = self._stamps[slots]
+        valid = (before == n + 1) & (after == n + 1)
+        if not valid.all():
+            self.lost += int((~valid).sum())
+            records = records[valid]
+        self.next = head
+        return {column: records[:, k] for column, k in zip(self.columns, self._indices)}
+
+    def close(self):
+        self._close_segment()
+
+
+def _latency_writer(name, count, interval):
+    with RingWriter(name, capacity=4096) as ring:
+        time.sleep(0.5)  # Let the reader attach
+        for k in range(count):
+            ring.write(time.perf_counter(), k, 0, 0, 0, 0, 0)
+            time.sleep(interval)
+        time.sleep(0.2)
+
+
+def measure_latency(count=2000, interval=0.001, name="thermologic_latency"):
+    """Writer -> reader latencies (seconds) between two processes, reader polling in a busy loop."""
+    writer = multiprocessing.Process(target=_latency_writer, args=(name, count, interval))
+    writer.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            reader = RingReader(name, ["timestamp", "p1"])
+            break
+        except FileNotFoundError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+    latencies = []
+    seen = 0
+    while seen < count and writer.is_alive():
+        new = reader.read_new()
+        now = time.perf_counter()  # perf_counter is system-wide on Linux and Windows
+        latencies.extend(now - new["timestamp"])
+        seen += len(new["timestamp"])
+    reader.close()
+    writer.join()
+    return np.array(latencies), reader.lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the live shared-memory ring.")
+    parser.add_argument("command", choices=["watch", "latency"])
+    parser.add_argument("--name", default=LIVE_RING_NAME)
+    parser.add_argument("--count", type=int, default=2000, help="records for latency")
+    args = parser.parse_args()
+
+    if args.command == "latency":
+        latencies, lost = measure_latency(args.count)
+        print(f"{len(latencies)} records, {lost} lost; latency p50 {np.median(latencies) * 1e6:.1f} us, "
+              f"p99 {np.quantile(latencies, 0.99) * 1e6:.1f} us, max {latencies.max() * 1e6:.1f} us")
+        return
+
+    reader = RingReader(args.name)
+    try:
+        while True:
+            new = reader.read_new()
+            if reader.truncated:
+                print("-- writer restarted --")
+            for row in zip(*new.values()):
+                print(" ".join(f"{name}={value:.6g}" for name, value in zip(reader.columns, row)))
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
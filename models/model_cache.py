@@ -0,0 +1,60 @@
+"""
+Process-wide cache for the trained demand model.
+
+load_model() unpickles OntarioModel.pkl the first time it is asked for and
+returns the same object afterwards, until the file's modification time or
+size changes (i.e. the model was retrained), when it is loaded again.
+joblib and scikit-learn are only imported on the first load, so importing
+this module is cheap. preload() does the first load in a background thread.
+"""
+import os
+import threading
+
+# Default model location, next to this file
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "OntarioModel.pkl")
+
+_cache = {}  # absolute path -> ((mtime_ns, size), model)
+_lock = threading.Lock()
+
+
+def _file_key(path):
+    info = os.stat(path)
+    return info.st_mtime_ns, info.st_size
+
+
+def model_version(path=DEFAULT_MODEL_PATH):
+    """Identifies the current contents of the model file: (mtime_ns, size)."""
+    return _file_key(os.path.abspath(path))
+
+
+def load_model_version(path=DEFAULT_MODEL_PATH):
+    """(model_version, model) for the model stored at `path`, both from the same load."""
+    path = os.path.abspath(path)
+    with _lock:
+        key = _file_key(path)
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached
+
+        import joblib  # To load the trained model
+
+        model = joblib.load(path)
+        _cache[path] = (key, model)
+        return key, model
+
+
+def load_model(path=DEFAULT_MODEL_PATH):
+    """The model stored at `path`, loaded at most once per version of the file."""
+    return load_model_version(path)[1]
+
+
+def preload(path=DEFAULT_MODEL_PATH):
+    """Start loading the model in a daemon thread; later load_model() calls reuse it."""
+    thread = threading.Thread(target=load_model, args=(path,), daemon=True)
+    thread.start()
+    return thread
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -1,34 +1,26 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import joblib  # To load the trained model
+from batch_predict import DEFAULT_CHUNKSIZE, MinMaxSeries, stream_predict
 
-# Load the pre-trained Gradient Boosting model
-model = joblib.load('OntarioModel.pkl')  # Update with the correct file path to the model
+# Pre-trained Gradient Boosting model, loaded on first use
+MODEL_PATH = 'OntarioModel.pkl'  # Update with the correct file path to the model
 
 # Function to process and plot predictions for a dataset
-def process_and_plot(file_path, output_csv, plot_title):
-    # Load the CSV file
-    data = pd.read_csv(file_path)
+def process_and_plot(file_path, output_csv, plot_title, chunksize=DEFAULT_CHUNKSIZE, workers=1):
+    # Predict chunk by chunk (a CSV file or a column store directory, see
+    # telemetry_store.py); rows are written to output_csv as they are predicted
+    # and only a min/max-decimated copy of the predictions is kept for the plot
+    predictions = MinMaxSeries()
+    actual_values = []
 
-    # Rename columns to match those used during model training
-    data = data.rename(columns={
-        'Sunny Or Cloudy': 'Sunny_Or_Cloudy'
-    })
+    def keep(chunk, chunk_predictions):
+        predictions.append(chunk_predictions)
+        if sum(len(a) for a in actual_values) < 75:
+            actual_values.append(chunk['Required Energy'].to_numpy()[:75])
 
-    # Ensure the data has the correct data types
-    data['Sunny_Or_Cloudy'] = data['Sunny_Or_Cloudy'].astype(float)
-    data['Windy'] = data['Windy'].astype(float)
-
-    # Select only the features used during model training
-    features = ['Value', 'Sunny_Or_Cloudy', 'Windy']
-    X = data[features]
-
-    # Predict the 'Required Energy' for the data
-    predictions = model.predict(X)
-
-    # Extract the actual 'Required Energy' values
-    actual_values = data['Required Energy']
+    stream_predict(file_path, output_csv, chunksize, workers, MODEL_PATH, on_chunk=keep)
+    actual_values = pd.Series(np.concatenate(actual_values) if actual_values else np.empty(0))
 
     # Limit the actual values to the first 75
     limited_actual_values = actual_values[:75]
@@ -36,7 +28,7 @@ def process_and_plot(file_path, output_csv, plot_title):
     # Plot the actual values (first 75) and predictions (all)
     plt.figure(figsize=(12, 6))
     plt.plot(limited_actual_values, label='Actual Energy (First 75)', color='blue', linewidth=2)
-    plt.plot(predictions, label='Predicted Energy (All)', linestyle='dotted', color='orange', linewidth=2)
+    plt.plot(*predictions.points(), label='Predicted Energy (All)', linestyle='dotted', color='orange', linewidth=2)
     plt.title(plot_title)
     plt.xlabel('Time (Index)')
     plt.ylabel('Required Energy')
@@ -44,17 +36,6 @@ def process_and_plot(file_path, output_csv, plot_title):
     plt.grid(True)
     plt.show()
 
-    # Save the predictions to a CSV file
-    padded_actual_values = pd.concat(
-        [limited_actual_values, pd.Series([None] * (len(predictions) - len(limited_actual_values)))],
-        ignore_index=True
-    )
-    predicted_df = pd.DataFrame({
-        'Actual Energy (First 75)': padded_actual_values,
-        'Predicted Energy': pd.Series(predictions)
-    })
-    predicted_df.to_csv(output_csv, index=False)
-
     print(f"Processed and plotted for: {file_path}")
     print(f"Predictions saved to: {output_csv}")
 
@@ -0,0 +1,228 @@
+"""
+Memoized demand predictions.
+
+`PredictionCache` wraps any function mapping an (n, 3) feature array to n
+predictions (model.predict, FlatGBM.predict, ...). Each call:
+
+  1. optionally rounds the features (`decimals`, one entry per feature or one
+     for all; None keeps a feature exact), so near-identical inputs share an
+     entry. The rounded values are what gets predicted, so a cached answer
+     never depends on which of the rows happened to come first.
+  2. deduplicates the rows of the batch (keyed by their raw bytes), so each
+     distinct row is looked up once and the answers are scattered back with
+     the inverse index.
+  3. looks the distinct rows up in a bounded LRU shared across calls and
+     predicts only the misses, in one call.
+
+Entries belong to one model version. `version` is a value or a callable,
+and the LRU is emptied when it changes. A predictor with a current() method
+(ModelPredictor) instead hands over the version together with the predict
+function of the same load, so a retrained model is never answered from the
+old one's entries, and old entries are never filled from the new model.
+
+stats() reports calls, rows, distinct rows, LRU hits/misses and the share
+of rows that did not reach the model. The lookups cost about 1 µs per
+distinct row. In front of scikit-learn's predict (about 3 µs per row) a
+first pass over all-distinct rows is roughly a third slower, a repeated
+pass is 2-3x faster, and inputs that repeat within a batch are several
+times faster. In front of the flat predictor the cache does not pay off.
+
+    python prediction_cache.py Ontario1DayCSV.csv --decimals 0 2 2
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from model_cache import DEFAULT_MODEL_PATH, load_model_version
+
+FEATURES = ["Value", "Sunny_Or_Cloudy", "Windy"]
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def quantize(X, decimals=None):
+    """X rounded per column: `decimals` is None, an int, or one int/None per column."""
+    X = np.asarray(X, dtype=np.float64)
+    if decimals is None:
+        return X
+    if np.isscalar(decimals):
+        return np.round(X, decimals)
+    X = X.copy()
+    for k, d in enumerate(decimals):
+        if d is not None:
+            X[:, k] = np.round(X[:, k], d)
+    return X
+
+
+class PredictionCache:
+    def __init__(self, predict, version=None, max_entries=DEFAULT_MAX_ENTRIES, decimals=None):
+        self._predict = predict
+        self._version = version
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self.entries = OrderedDict()  # feature tuple -> prediction, least recently used first
+        self.current_version = None
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.rows = 0
+        self.unique_rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _resolve(self):
+        """(version, predict function) to answer the next call with."""
+        if hasattr(self._predict, "current"):
+            return self._predict.current()
+        return (self._version() if callable(self._version) else self._version), self._predict
+
+    def _check_version(self, version):
+        if version != self.current_version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.current_version = version
+
+    def predict(self, X):
+        """Predictions for the rows of X, computing only rows not seen before."""
+        # + 0.0 turns -0.0 into 0.0, so both share a key
+        X = np.ascontiguousarray(quantize(X, self.decimals), dtype=np.float64) + 0.0
+        if X.ndim != 2:
+            raise ValueError("expected a 2-D feature array")
+        if not len(X):
+            return np.empty(0)
+        # The raw bytes of each row are its key; deduplicating with a dict is
+        # several times faster than np.unique(axis=0), which sorts
+        keys = X.view(np.dtype((np.void, X.itemsize * X.shape[1]))).ravel().tolist()
+        first = dict.fromkeys(keys)
+        unique_keys = list(first)
+        for k, key in enumerate(unique_keys):
+            first[key] = k
+        inverse = np.fromiter(map(first.__getitem__, keys), dtype=np.intp, count=len(keys))
+
+        with self.lock:
+            version, predict = self._resolve()
+            self._check_version(version)
+            entries = self.entries
+            values = np.fromiter((entries.get(key, np.nan) for key in unique_keys), dtype=np.float64,
+                                 count=len(unique_keys))
+            missing = np.flatnonzero(np.isnan(values))
+            for k in np.flatnonzero(~np.isnan(values)).tolist():
+                entries.move_to_end(unique_keys[k])
+            if len(missing):
+                rows = np.frombuffer(b"".join([unique_keys[k] for k in missing.tolist()]),
+                                     dtype=np.float64).reshape(-1, X.shape[1])
+                predicted = np.asarray(predict(rows), dtype=np.float64).reshape(-1)
+                values[missing] = predicted
+                for k, value in zip(missing.tolist(), predicted.tolist()):
+                    entries[unique_keys[k]] = value
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+            self.calls += 1
+            self.rows += len(X)
+            self.unique_rows += len(unique_keys)
+            self.hits += len(unique_keys) - len(missing)
+            self.misses += len(missing)
+        return values[inverse]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "unique_rows": self.unique_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            # Rows answered without the model: duplicates within a batch plus LRU hits
+            "rows_saved_rate": 1.0 - self.misses / self.rows if self.rows else 0.0,
+            "entries": len(self.entries),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class ModelPredictor:
+    """model.predict for the current version of the .pkl, taking an (n, 3) array; reloads after a retrain."""
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH):
+        self.model_path = model_path
+
+    def current(self):
+        """(model version, predict function) from one load of the .pkl."""
+        import pandas as pd
+
+        version, model = load_model_version(self.model_path)
+
+        def predict(X):
+            return model.predict(pd.DataFrame(X, columns=FEATURES))
+        return version, predict
+
+    def __call__(self, X):
+        return self.current()[1](X)
+
+
+def model_predictor(model_path=DEFAULT_MODEL_PATH):
+    return ModelPredictor(model_path)
+
+
+_caches = {}  # (model path, max_entries, decimals) -> PredictionCache
+_caches_lock = threading.Lock()
+
+
+def cached_model(model_path=DEFAULT_MODEL_PATH, max_entries=DEFAULT_MAX_ENTRIES, decimals=None):
+    """The process-wide PredictionCache in front of the model at `model_path`."""
+    if decimals is not None and not np.isscalar(decimals):
+        decimals = tuple(decimals)
+    key = (model_path, max_entries, decimals)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = PredictionCache(model_predictor(model_path), max_entries=max_entries,
+                                                   decimals=decimals)
+        return cache
+
+
+def main():
+    import pandas as pd
+
+    from batch_predict import CSV_DTYPES
+
+    parser = argparse.ArgumentParser(description="Hit rates and timings of the prediction cache on a demand CSV.")
+    parser.add_argument("file_path")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--decimals", type=lambda s: None if s == "none" else int(s), nargs="+",
+                        help="rounding per feature (Value, Sunny_Or_Cloudy, Windy); 'none' keeps one exact")
+    parser.add_argument("--batch", type=int, default=1000, help="rows per predict call")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.file_path, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES)
+    X = data[["Value", "Sunny Or Cloudy", "Windy"]].to_numpy()
+    decimals = args.decimals[0] if args.decimals and len(args.decimals) == 1 else args.decimals
+    cache = PredictionCache(model_predictor(args.model), decimals=decimals)
+    predict = model_predictor(args.model)
+    predict(X[:1])  # load the model outside the timings
+
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        cached = np.concatenate([cache.predict(X[k:k + args.batch]) for k in range(0, len(X), args.batch)])
+        print(f"cached ({label}): {time.perf_counter() - start:.4f} s")
+    start = time.perf_counter()
+    direct = np.concatenate([predict(X[k:k + args.batch]) for k in range(0, len(X), args.batch)])
+    print(f"direct:        {time.perf_counter() - start:.4f} s")
+    print(f"max difference: {np.max(np.abs(cached - direct)):.6g}")
+    for name, value in cache.stats().items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,349 @@
+"""
+Train the Ontario demand model and save it as OntarioModel.pkl.
+
+    python rConversion.py [data.csv]
+        trains the original GradientBoostingRegressor (200 trees, depth 3)
+    python rConversion.py [data.csv] --search grid|random [--folds 5] [--jobs -1] [--n-iter 20]
+        k-fold cross-validated search over GradientBoostingRegressor (with early
+        stopping) and HistGradientBoostingRegressor, run on all cores. Every
+        configuration's MAE, R² and fit/score wall-clock time is written to
+        training_results.csv. The winner is the cheapest-to-score configuration
+        whose MAE is within --mae-tolerance of the best one. Only
+        GradientBoostingRegressor configurations are eligible unless
+        --any-engine is given (see below).
+    python rConversion.py [data.csv] --incremental new_rows.csv [--extra-trees 20]
+        adds trees to the current OntarioModel.pkl with warm_start, fitted on
+        the new rows only. The updated model replaces OntarioModel.pkl
+        (atomically) only if it is no worse on a holdout of old and new rows;
+        only then are the new rows (minus any already in data.csv) appended to
+        data.csv. The time saved versus a full refit is reported.
+
+Every training run records which rows of data.csv it held out in
+OntarioModel.holdout.json (row indices plus a hash of their values), and
+--incremental evaluates on exactly those rows, extended with the held-out
+part of each accepted update, so the holdout never contains training rows.
+
+Engines: a GradientBoostingRegressor works with every consumer of the .pkl
+(prediction.py, batch_predict.py, serve.py with --engine sklearn or flat). A
+HistGradientBoostingRegressor only works with the sklearn engine;
+flat_gbm.py cannot flatten it, so serve.py --engine flat, FlatPredictor and
+the flat benchmark fail on it. save_model warns when it writes one.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import time
+
 import pandas as pd
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.model_selection import GridSearchCV, KFold, RandomizedSearchCV, train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 
-# Load the dataset
-data = pd.read_csv("C:\\Users\\ZainP\\Downloads\\cleaned_sunny_windy_data.csv")
+DATA_PATH = "C:\\Users\\ZainP\\Downloads\\cleaned_sunny_windy_data.csv"
+MODEL_PATH = "OntarioModel.pkl"
+HOLDOUT_PATH = "OntarioModel.holdout.json"
+RESULTS_PATH = "training_results.csv"
+
+FEATURES = ["Value", "Sunny_Or_Cloudy", "Windy"]
+
+# Models flat_gbm.FlatGBM.from_sklearn can flatten for serve.py --engine flat
+FLAT_MODELS = ["GradientBoostingRegressor"]
+
+# Search spaces; early stopping holds out 10% of each training fold and stops
+# adding trees once 10 rounds bring no improvement
+SEARCH_SPACES = [
+    (GradientBoostingRegressor(random_state=42, validation_fraction=0.1), {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 4],
+        "n_iter_no_change": [None, 10],
+    }),
+    (HistGradientBoostingRegressor(random_state=42, validation_fraction=0.1), {
+        "max_iter": [100, 200, 400],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_depth": [3, 4, None],
+        "max_leaf_nodes": [8, 31],
+        "early_stopping": [False, True],
+        "n_iter_no_change": [10],
+    }),
+]
+
+
+def load_data(path):
+    """Features and target from the cleaned demand CSV."""
+    # Load the dataset
+    return prepare(pd.read_csv(path))
+
+
+def prepare(data):
+    """Features and target from the rows of a cleaned demand CSV."""
+    # Clean the dataset: Ensure proper data types
+    # Rename columns to avoid spaces
+    data.rename(columns={
+        "Sunny Or Cloudy": "Sunny_Or_Cloudy",
+        "Required Energy": "Required_Energy"
+    }, inplace=True)
+
+    # Ensure 'Sunny_Or_Cloudy' and 'Windy' are normalized between 0 and 1
+    if data["Sunny_Or_Cloudy"].max() > 1 or data["Windy"].max() > 1:
+        print("Ensure 'Sunny_Or_Cloudy' and 'Windy' are normalized between 0 and 1")
+    data["Sunny_Or_Cloudy"] = pd.to_numeric(data["Sunny_Or_Cloudy"])
+    data["Windy"] = pd.to_numeric(data["Windy"])
+    data["Required_Energy"] = pd.to_numeric(data["Required_Energy"])
+
+    X = data[FEATURES]
+    y = data["Required_Energy"]
+    return X, y
+
+
+def evaluate(model, X_test, y_test):
+    # Predict on the test set
+    y_pred = model.predict(X_test)
+
+    # Evaluate the model
+    mae = mean_absolute_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
+    return mae, r2
+
+
+def train_baseline(X_train, y_train):
+    # Train a Gradient Boosting Model
+    gbm = GradientBoostingRegressor(
+        n_estimators=200,    # Number of trees
+        learning_rate=0.1,   # Shrinkage parameter
+        max_depth=3,         # Depth of each tree
+        random_state=42
+    )
+
+    gbm.fit(X_train, y_train)
+    return gbm
+
+
+def search(X_train, y_train, mode="grid", folds=5, jobs=-1, n_iter=20, seed=42):
+    """
+    Cross-validated search over SEARCH_SPACES, parallel across processes.
+
+    Returns a DataFrame with one row per configuration: model, params, MAE, R²
+    and the mean fit and scoring wall-clock seconds per fold.
+    """
+    cv = KFold(n_splits=folds, shuffle=True, random_state=seed)
+    scoring = {"mae": "neg_mean_absolute_error", "r2": "r2"}
+    results = []
+    for estimator, space in SEARCH_SPACES:
+        if mode == "random":
+            searcher = RandomizedSearchCV(estimator, space, n_iter=n_iter, scoring=scoring, refit=False,
+                                          cv=cv, n_jobs=jobs, random_state=seed)
+        else:
+            searcher = GridSearchCV(estimator, space, scoring=scoring, refit=False, cv=cv, n_jobs=jobs)
+
+        start = time.perf_counter()
+        searcher.fit(X_train, y_train)
+        print(f"{type(estimator).__name__}: {len(searcher.cv_results_['params'])} configurations "
+              f"x {folds} folds in {time.perf_counter() - start:.1f} s")
+
+        cv_results = searcher.cv_results_
+        for k, params in enumerate(cv_results["params"]):
+            results.append({
+                "model": type(estimator).__name__,
+                "params": params,
+                "mae": -cv_results["mean_test_mae"][k],
+                "r2": cv_results["mean_test_r2"][k],
+                "fit_s": cv_results["mean_fit_time"][k],
+                "score_s": cv_results["mean_score_time"][k],
+            })
+    return pd.DataFrame(results).sort_values("mae").reset_index(drop=True)
+
+
+def pick_model(results, mae_tolerance=0.01, flat_only=True):
+    """
+    Cheapest-to-score configuration whose MAE is within mae_tolerance of the
+    best; with flat_only, among the FLAT_MODELS configurations only.
+    """
+    if flat_only:
+        results = results[results["model"].isin(FLAT_MODELS)]
+    best_mae = results["mae"].min()
+    candidates = results[results["mae"] <= best_mae * (1 + mae_tolerance)]
+    return candidates.sort_values("score_s").iloc[0]
+
+
+def build_model(choice):
+    for estimator, _ in SEARCH_SPACES:
+        if type(estimator).__name__ == choice["model"]:
+            return clone(estimator).set_params(**choice["params"])
+    raise ValueError(f"Unknown model {choice['model']}")
+
+
+def save_model(model, path=MODEL_PATH):
+    """Write the model next to `path` first, then rename, so readers never see a partial file."""
+    if type(model).__name__ not in FLAT_MODELS:
+        print(f"Warning: {type(model).__name__} cannot be flattened; {path} will only work with "
+              f"the sklearn engine (not serve.py --engine flat or FlatPredictor)")
+    tmp_path = path + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def holdout_hash(X, y, indices):
+    rows = pd.concat([X, y], axis=1).iloc[indices].to_numpy(dtype=float)
+    return hashlib.sha256(rows.tobytes()).hexdigest()
+
+
+def save_holdout(X, y, indices, path=HOLDOUT_PATH):
+    """Record the held-out row indices of the data the saved model was trained with."""
+    indices = sorted(int(k) for k in indices)
+    record = {"rows": len(X), "indices": indices, "sha256": holdout_hash(X, y, indices)}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+
+
+def load_holdout(X, y, path=HOLDOUT_PATH):
+    """Held-out row indices of X/y recorded by the last training run; checks they still hold the same values."""
+    if not os.path.exists(path):
+        # Trained before holdouts were recorded: the original split is only
+        # right if the data has not grown since
+        print(f"No {path}; re-splitting {len(X)} rows as a full training run would")
+        _, X_test = train_test_split(X, test_size=0.3, random_state=42)
+        return list(X_test.index)
+    with open(path) as f:
+        record = json.load(f)
+    if record["rows"] != len(X) or holdout_hash(X, y, record["indices"]) != record["sha256"]:
+        raise ValueError(f"{path} does not match the training data ({record['rows']} rows recorded, "
+                         f"{len(X)} found); retrain from scratch")
+    return record["indices"]
+
+
+def new_training_rows(data_path, new_rows_path):
+    """Rows of new_rows_path not already in data_path, in data_path's column order."""
+    old_raw = pd.read_csv(data_path)
+    new_raw = pd.read_csv(new_rows_path)
+    if set(new_raw.columns) != set(old_raw.columns):
+        raise ValueError(f"{new_rows_path} has columns {list(new_raw.columns)}, "
+                         f"{data_path} has {list(old_raw.columns)}")
+    new_raw = new_raw[list(old_raw.columns)].drop_duplicates()
+    seen = new_raw.merge(old_raw.drop_duplicates(), how="left", indicator=True)["_merge"] == "both"
+    if seen.any():
+        print(f"Skipping {int(seen.sum())} rows already in {data_path}")
+    return new_raw[~seen.to_numpy()].reset_index(drop=True)
+
+
+def warm_start_update(model, X_new, y_new, extra_trees=20):
+    """Copy of `model` with extra_trees more boosting rounds fitted on the new rows only."""
+    model = copy.deepcopy(model)
+    if hasattr(model, "n_estimators_"):
+        model.set_params(warm_start=True, n_estimators=model.n_estimators_ + extra_trees, n_iter_no_change=None)
+    else:
+        model.set_params(warm_start=True, max_iter=model.n_iter_ + extra_trees, early_stopping=False)
+    model.fit(X_new, y_new)
+    return model
+
+
+def incremental(data_path, new_rows_path, extra_trees=20, tolerance=0.0, compare_full=True):
+    """Warm-start the saved model on new rows; if it validates, swap it in and append the rows to the data."""
+    X_old, y_old = load_data(data_path)
+    old_holdout = load_holdout(X_old, y_old)
+    new_raw = new_training_rows(data_path, new_rows_path)
+    if len(new_raw) < 2:
+        print("Not enough new rows to train on")
+        return False
+    X_new, y_new = prepare(new_raw.copy())
+
+    # Holdout: the rows the saved model was not trained on plus 30% of the new rows
+    X_new_train, X_new_test, y_new_train, y_new_test = train_test_split(
+        X_new, y_new, test_size=0.3, random_state=42)
+    X_holdout = pd.concat([X_old.iloc[old_holdout], X_new_test])
+    y_holdout = pd.concat([y_old.iloc[old_holdout], y_new_test])
+
+    current = joblib.load(MODEL_PATH)
+    start = time.perf_counter()
+    updated = warm_start_update(current, X_new_train, y_new_train, extra_trees)
+    incremental_s = time.perf_counter() - start
+
+    current_mae, _ = evaluate(current, X_holdout, y_holdout)
+    updated_mae, updated_r2 = evaluate(updated, X_holdout, y_holdout)
+    print(f"Holdout MAE: current {current_mae:.2f}, updated {updated_mae:.2f} (R-squared {updated_r2:.2f})")
+    print(f"Incremental fit: {incremental_s:.3f} s for {extra_trees} trees on {len(X_new_train)} rows")
+
+    if compare_full:
+        X_train = pd.concat([X_old.drop(index=old_holdout), X_new_train])
+        y_train = pd.concat([y_old.drop(index=old_holdout), y_new_train])
+        start = time.perf_counter()
+        train_baseline(X_train, y_train)
+        full_s = time.perf_counter() - start
+        print(f"Full refit: {full_s:.3f} s on {len(X_train)} rows; "
+              f"saved {full_s - incremental_s:.3f} s ({full_s / max(incremental_s, 1e-9):.1f}x faster)")
+
+    if updated_mae <= current_mae * (1 + tolerance):
+        save_model(updated)
+        print(f"Updated model saved to {MODEL_PATH}")
+        # The new rows become part of the training data from now on; the
+        # held-out ones stay in the holdout
+        new_raw.to_csv(data_path, mode="a", header=False, index=False)
+        print(f"Appended {len(new_raw)} rows to {data_path}")
+        X_all, y_all = load_data(data_path)
+        save_holdout(X_all, y_all, old_holdout + [len(X_old) + k for k in X_new_test.index])
+        return True
+    print("Updated model is worse on the holdout; keeping the current model")
+    return False
+
 
-# Clean the dataset: Ensure proper data types
-# Rename columns to avoid spaces
-data.rename(columns={
-    "Sunny Or Cloudy": "Sunny_Or_Cloudy",
-    "Required Energy": "Required_Energy"
-}, inplace=True)
+def main():
+    parser = argparse.ArgumentParser(description="Train the Ontario demand model.")
+    parser.add_argument("data", nargs="?", default=DATA_PATH)
+    parser.add_argument("--search", choices=["grid", "random"],
+                        help="cross-validated search instead of the fixed 200-tree model")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="worker processes (-1: all cores)")
+    parser.add_argument("--n-iter", type=int, default=20, help="configurations per model for --search random")
+    parser.add_argument("--mae-tolerance", type=float, default=0.01,
+                        help="relative MAE slack when preferring cheaper models")
+    parser.add_argument("--any-engine", action="store_true",
+                        help="let --search pick models that only the sklearn engine can serve")
+    parser.add_argument("--incremental", metavar="NEW_ROWS_CSV",
+                        help="warm-start the saved model on these new rows instead of training from scratch")
+    parser.add_argument("--extra-trees", type=int, default=20, help="trees added by --incremental")
+    parser.add_argument("--no-compare", action="store_true",
+                        help="skip timing a full refit in --incremental mode")
+    args = parser.parse_args()
 
-# Ensure 'Sunny_Or_Cloudy' and 'Windy' are normalized between 0 and 1
-if data["Sunny_Or_Cloudy"].max() > 1 or data["Windy"].max() > 1:
-    print("Ensure 'Sunny_Or_Cloudy' and 'Windy' are normalized between 0 and 1")
-data["Sunny_Or_Cloudy"] = pd.to_numeric(data["Sunny_Or_Cloudy"])
-data["Windy"] = pd.to_numeric(data["Windy"])
-data["Required_Energy"] = pd.to_numeric(data["Required_Energy"])
+    if args.incremental:
+        incremental(args.data, args.incremental, args.extra_trees, compare_full=not args.no_compare)
+        return
 
-# Split the dataset into training and testing sets
-X = data[["Value", "Sunny_Or_Cloudy", "Windy"]]
-y = data["Required_Energy"]
+    X, y = load_data(args.data)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+    # Split the dataset into training and testing sets
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
 
-# Train a Gradient Boosting Model
-gbm = GradientBoostingRegressor(
-    n_estimators=200,    # Number of trees
-    learning_rate=0.1,   # Shrinkage parameter
-    max_depth=3,         # Depth of each tree
-    random_state=42
-)
+    if args.search:
+        results = search(X_train, y_train, args.search, args.folds, args.jobs, args.n_iter)
+        results.to_csv(RESULTS_PATH, index=False)
+        print(results.head(10).to_string())
+        print(f"All {len(results)} configurations saved to {RESULTS_PATH}")
 
-gbm.fit(X_train, y_train)
+        choice = pick_model(results, args.mae_tolerance, flat_only=not args.any_engine)
+        print(f"Selected {choice['model']} {choice['params']} "
+              f"(CV MAE {choice['mae']:.2f}, scoring {choice['score_s'] * 1e3:.2f} ms per fold)")
+        model = build_model(choice)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        print(f"Refit in {time.perf_counter() - start:.2f} s")
+    else:
+        model = train_baseline(X_train, y_train)
 
-# Predict on the test set
-y_pred = gbm.predict(X_test)
+    mae, r2 = evaluate(model, X_test, y_test)
+    print(f"GBM MAE: {mae:.2f}")
+    print(f"GBM R-squared: {r2:.2f}")
 
-# Evaluate the model
-mae = mean_absolute_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
+    save_model(model)
+    save_holdout(X, y, X_test.index)
+    print("Model saved successfully!")
 
-print(f"GBM MAE: {mae:.2f}")
-print(f"GBM R-squared: {r2:.2f}")
 
-joblib.dump(gbm, "OntarioModel.pkl")
-print("Model saved successfully!")
+if __name__ == "__main__":
+    main()
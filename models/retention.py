@@ -0,0 +1,310 @@
+"""
+Retention for the factory telemetry log: rotated raw segments and rollups.
+
+factorydata.csv used to be truncated on every backend start and otherwise
+grew without bound. With a `Retention` passed to TelemetryWriter:
+
+  - the live file is rotated (renamed to factorydata-YYYYmmdd-HHMMSS.csv)
+    when it passes `max_bytes` or `max_age` seconds, and on start instead of
+    being truncated, so no history is lost;
+  - rotated segments are gzip-compressed on a background thread (CSV
+    telemetry compresses about 3-4x), and leftovers from a crash are
+    compressed on the next start;
+  - only the newest `keep` segments are kept.
+
+`Rollups` keeps per-minute and per-hour aggregates per sensor (count, mean,
+min, max of eff and effnew) in small CSVs next to the log,
+factorydata_1min.csv and factorydata_1h.csv. Each sample updates one open
+period per resolution and sensor, and a period's row is written once the
+samples move past it. Long-range plots and queries read these (about 150 KB
+per sensor per day at one-minute resolution) instead of the raw samples.
+A period can appear twice, e.g. when the backend restarted within it, or
+for samples arriving out of order; read_rollup() merges such rows, weighting
+by count.
+
+    python retention.py rebuild factorydata.csv     # rollups from the live file and all segments
+    python retention.py query factorydata.csv --resolution 1h --since 86400
+"""
+import argparse
+import csv
+import glob
+import gzip
+import math
+import os
+import re
+import shutil
+import threading
+import time
+
+ROLLUP_RESOLUTIONS = {"1min": 60, "1h": 3600}
+ROLLUP_COLUMNS = ["period_start", "sensor_id", "count",
+                  "eff_mean", "eff_min", "eff_max", "effnew_mean", "effnew_min", "effnew_max"]
+
+
+# Segment names: <stem>-YYYYmmdd-HHMMSS.csv[.gz], with -1, -2, ... for later ones within the same second
+SEGMENT_NAME = re.compile(r"-(\d{8}-\d{6})(?:-(\d+))?\.csv(?:\.gz)?$")
+
+
+def _stem(path):
+    return os.path.splitext(path)[0]
+
+
+def _segment_order(path):
+    match = SEGMENT_NAME.search(os.path.basename(path))
+    if match is None:
+        return os.path.basename(path), 0
+    # The timestamp sorts chronologically; the collision suffix numbers segments within its second
+    return match.group(1), int(match.group(2) or 0)
+
+
+def segment_paths(path):
+    """Rotated segments of the log at `path`, oldest first (.csv and .csv.gz)."""
+    stem = _stem(path)
+    paths = glob.glob(f"{glob.escape(stem)}-*.csv") + glob.glob(f"{glob.escape(stem)}-*.csv.gz")
+    return sorted(paths, key=_segment_order)
+
+
+def rollup_path(path, resolution):
+    return f"{_stem(path)}_{resolution}.csv"
+
+
+class Retention:
+    """When to rotate the live log, and what happens to the rotated segments."""
+
+    def __init__(self, path, max_bytes=64 * 2**20, max_age=24 * 3600.0, keep=90, compress=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.compress = compress
+        self.rotations = 0
+        self._threads = []
+        if compress:
+            # Segments a previous run rotated but did not get to compress
+            for segment in segment_paths(path):
+                if segment.endswith(".csv"):
+                    self._compress_later(segment)
+
+    def due(self, size, opened_at):
+        """Whether a live file of `size` bytes opened at `opened_at` (time.time()) should be rotated."""
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - opened_at >= self.max_age
+
+    def rotate(self):
+        """Move the live file aside as a new segment; returns its path (None if there was nothing to move)."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        base = f"{_stem(self.path)}-{time.strftime('%Y%m%d-%H%M%S')}"
+        segment = f"{base}.csv"
+        k = 1
+        while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+            segment = f"{base}-{k}.csv"
+            k += 1
+        os.replace(self.path, segment)
+        self.rotations += 1
+        if self.compress:
+            self._compress_later(segment)
+        else:
+            self.prune()
+        return segment
+
+    def _compress_later(self, segment):
+        thread = threading.Thread(target=self._compress, args=(segment,), daemon=True)
+        thread.start()
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+
+    def _compress(self, segment):
+        tmp = f"{segment}.gz.tmp"
+        try:
+            with open(segment, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            # The .gz only appears once complete; a crash before this leaves the .csv
+            os.replace(tmp, segment + ".gz")
+            os.remove(segment)
+        except FileNotFoundError:
+            # Pruned while waiting (more than `keep` segments were pending)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.prune()
+
+    def prune(self):
+        """Delete all but the newest `keep` segments."""
+        if not self.keep:
+            return
+        for segment in segment_paths(self.path)[:-self.keep]:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass  # Being compressed, or already removed by another thread
+
+    def close(self, timeout=None):
+        """Wait for pending compressions."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+class Rollups:
+    """Per-minute and per-hour aggregates of (timestamp, sensor_id, eff, effnew) rows."""
+
+    def __init__(self, path, resolutions=ROLLUP_RESOLUTIONS):
+        self.resolutions = dict(resolutions)
+        self.periods = {}  # (resolution, sensor_id) -> [start, count, eff sum/min/max, effnew sum/min/max]
+        self.rows_written = 0
+        self._files = {}
+        self._writers = {}
+        for resolution in self.resolutions:
+            out = rollup_path(path, resolution)
+            new_file = not os.path.exists(out) or os.path.getsize(out) == 0
+            f = open(out, "a", newline="")
+            self._files[resolution] = f
+            self._writers[resolution] = csv.writer(f)
+            if new_file:
+                self._writers[resolution].writerow(ROLLUP_COLUMNS)
+
+    def add(self, timestamp, sensor_id, eff, effnew):
+        if not (math.isfinite(eff) and math.isfinite(effnew)):
+            return
+        for resolution, seconds in self.resolutions.items():
+            start = timestamp - timestamp % seconds
+            key = (resolution, sensor_id)
+            period = self.periods.get(key)
+            if period is None or period[0] != start:
+                if period is not None:
+                    self._emit(resolution, sensor_id, period)
+                self.periods[key] = [start, 1, eff, eff, eff, effnew, effnew, effnew]
+                continue
+            period[1] += 1
+            period[2] += eff
+            if eff < period[3]:
+                period[3] = eff
+            if eff > period[4]:
+                period[4] = eff
+            period[5] += effnew
+            if effnew < period[6]:
+                period[6] = effnew
+            if effnew > period[7]:
+                period[7] = effnew
+
+    def add_rows(self, rows):
+        for timestamp, sensor_id, eff, effnew in rows:
+            self.add(timestamp, sensor_id, eff, effnew)
+
+    def _emit(self, resolution, sensor_id, period):
+        start, count, eff_sum, eff_min, eff_max, effnew_sum, effnew_min, effnew_max = period
+        self._writers[resolution].writerow([f"{start:.0f}", sensor_id, count,
+                                            eff_sum / count, eff_min, eff_max,
+                                            effnew_sum / count, effnew_min, effnew_max])
+        self.rows_written += 1
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        """Write the periods still open (they may get a second row after a restart) and close the files."""
+        for (resolution, sensor_id), period in self.periods.items():
+            self._emit(resolution, sensor_id, period)
+        self.periods.clear()
+        for f in self._files.values():
+            f.close()
+
+
+def read_rollup(path, resolution="1min", since=None, until=None, merge_sensors=False):
+    """
+    Rollup rows for the log at `path` as a DataFrame, one row per period and
+    sensor (or per period with merge_sensors), repeated periods merged.
+    """
+    import numpy as np
+    import pandas as pd
+
+    data = pd.read_csv(rollup_path(path, resolution), dtype={"sensor_id": str})
+    data["sensor_id"] = data["sensor_id"].fillna("")
+    if since is not None:
+        data = data[data["period_start"] >= since]
+    if until is not None:
+        data = data[data["period_start"] < until]
+    keys = ["period_start"] if merge_sensors else ["period_start", "sensor_id"]
+    # Means are merged as count-weighted sums
+    data = data.assign(eff_sum=data["eff_mean"] * data["count"], effnew_sum=data["effnew_mean"] * data["count"])
+    merged = data.groupby(keys, sort=True).agg(
+        count=("count", "sum"), eff_sum=("eff_sum", "sum"), eff_min=("eff_min", "min"), eff_max=("eff_max", "max"),
+        effnew_sum=("effnew_sum", "sum"), effnew_min=("effnew_min", "min"), effnew_max=("effnew_max", "max"),
+    ).reset_index()
+    merged["eff_mean"] = merged["eff_sum"] / np.maximum(merged["count"], 1)
+    merged["effnew_mean"] = merged["effnew_sum"] / np.maximum(merged["count"], 1)
+    columns = [c for c in ROLLUP_COLUMNS if c in merged.columns]
+    return merged[columns]
+
+
+ROLLUP_SOURCE_COLUMNS = ["timestamp", "sensor_id", "eff", "effnew"]
+
+
+def rebuild(path, chunksize=100_000):
+    """
+    Recompute the rollups of `path` from all segments and the live file.
+
+    Files without timestamp and sensor_id columns, like the old two-column
+    eff,effnew factorydata.csv rotated on the first start, cannot be placed in
+    a period and are skipped. Returns (rows read, skipped paths).
+    """
+    import pandas as pd
+
+    for resolution in ROLLUP_RESOLUTIONS:
+        out = rollup_path(path, resolution)
+        if os.path.exists(out):
+            os.remove(out)
+    rollups = Rollups(path)
+    rows = 0
+    skipped = []
+    sources = segment_paths(path) + ([path] if os.path.exists(path) else [])
+    try:
+        for source in sources:
+            # pandas reads .csv.gz directly
+            try:
+                columns = pd.read_csv(source, nrows=0).columns
+            except pd.errors.EmptyDataError:
+                continue
+            if not set(ROLLUP_SOURCE_COLUMNS) <= set(columns):
+                skipped.append(source)
+                continue
+            for chunk in pd.read_csv(source, dtype={"sensor_id": str}, chunksize=chunksize):
+                chunk["sensor_id"] = chunk["sensor_id"].fillna("")
+                rollups.add_rows(chunk[ROLLUP_SOURCE_COLUMNS].itertuples(index=False))
+                rows += len(chunk)
+    finally:
+        rollups.close()
+    return rows, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollups and segments of the factory telemetry log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("rebuild", help="recompute the rollups from the live file and all segments")
+    p.add_argument("path")
+    p = sub.add_parser("query", help="print rollup rows")
+    p.add_argument("path")
+    p.add_argument("--resolution", choices=list(ROLLUP_RESOLUTIONS), default="1h")
+    p.add_argument("--since", type=float, help="only the last N seconds")
+    p.add_argument("--merge-sensors", action="store_true")
+    p = sub.add_parser("segments", help="list rotated segments")
+    p.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        rows, skipped = rebuild(args.path)
+        print(f"Rolled up {rows} rows in {time.perf_counter() - start:.2f} s")
+        for source in skipped:
+            print(f"Skipped {source}: no timestamp/sensor_id columns")
+    elif args.command == "query":
+        since = time.time() - args.since if args.since else None
+        print(read_rollup(args.path, args.resolution, since, merge_sensors=args.merge_sensors).to_string(index=False))
+    else:
+        for segment in segment_paths(args.path):
+            print(f"{os.path.getsize(segment):>12}  {segment}")
+
+
+if __name__ == "__main__":
+    main()
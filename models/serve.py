@@ -0,0 +1,330 @@
+"""
+Local HTTP/JSON service for demand forecasts from OntarioModel.pkl.
+
+    POST /predict   {"rows": [{"Value": 17041.4, "Sunny_Or_Cloudy": 0, "Windy": 0.19}, ...]}
+                    or {"rows": [[17041.4, 0, 0.19], ...]}  ->  {"predictions": [...]}
+    GET  /metrics   Prometheus text format: requests, rows, batches, latency quantiles
+    GET  /health
+
+Requests are handled on threads, but predictions are not made per request: a
+single batcher thread collects the rows of concurrent requests for up to
+`max_wait_ms` (or until `max_batch_rows` rows are waiting) and scores them
+with one predict call, then hands each request its slice of the result.
+
+With --cache-size N, rows are answered from a PredictionCache
+(prediction_cache.py) of up to N distinct inputs, optionally rounded with
+--cache-decimals; its hit rate is on /metrics.
+
+With --workers N the service runs N processes. Where the OS supports
+SO_REUSEPORT they share one port and the kernel spreads connections; otherwise
+worker k listens on port + k. Metrics are per process. --backlog sets the
+listen queue (the socketserver default of 5 resets connections from more than
+a handful of concurrent clients).
+
+    python serve.py --port 8050 --workers 4 --engine flat
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from model_cache import DEFAULT_MODEL_PATH
+from prediction_cache import ModelPredictor, PredictionCache
+
+FEATURES = ["Value", "Sunny_Or_Cloudy", "Windy"]
+
+# Latencies kept for the quantiles reported on /metrics
+LATENCY_WINDOW = 10000
+
+# Connections the listening socket queues before the OS resets new ones
+DEFAULT_BACKLOG = 256
+
+
+def make_predictor(engine="sklearn", model_path=DEFAULT_MODEL_PATH):
+    """
+    A callable mapping an (n, 3) float array to n predictions. It follows
+    retrains of the .pkl, and its current() gives the model version together
+    with the predict function of the same load (see PredictionCache).
+    """
+    if engine == "flat":
+        from flat_gbm import FlatPredictor
+
+        predictor = FlatPredictor(model_path)
+    else:
+        predictor = ModelPredictor(model_path)
+    predictor.current()  # Load now rather than on the first request
+    return predictor
+
+
+def parse_rows(payload):
+    """(n, 3) float array from the "rows" of a request body."""
+    if not isinstance(payload, dict):
+        raise ValueError('the body must be a JSON object with "rows"')
+    rows = payload.get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise ValueError('"rows" must be a non-empty list')
+    if isinstance(rows[0], dict):
+        rows = [[row[name] for name in FEATURES] for row in rows]
+    X = np.asarray(rows, dtype=float)
+    if X.ndim != 2 or X.shape[1] != len(FEATURES):
+        raise ValueError(f"each row needs {len(FEATURES)} values: {', '.join(FEATURES)}")
+    if not np.isfinite(X).all():
+        raise ValueError("rows must not contain NaN or Infinity")
+    return X
+
+
+class PendingRequest:
+    def __init__(self, X):
+        self.X = X
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent requests into one predict call. If that call fails,
+    the requests of the batch are retried one at a time.
+    """
+
+    def __init__(self, predict, max_batch_rows=4096, max_wait_ms=2.0):
+        self.predict = predict
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.batched_rows = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """Predictions for X; blocks until the batch containing it has been scored."""
+        request = PendingRequest(X)
+        self.pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            rows = len(batch[0].X)
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                rows += len(request.X)
+
+            try:
+                predictions = self.predict(np.concatenate([request.X for request in batch]))
+                start = 0
+                for request in batch:
+                    request.result = predictions[start:start + len(request.X)]
+                    start += len(request.X)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].error = e
+                else:
+                    # Score the requests one by one so only the bad one fails
+                    for request in batch:
+                        try:
+                            request.result = self.predict(request.X)
+                        except Exception as e:
+                            request.error = e
+            self.batches += 1
+            self.batched_rows += rows
+            for request in batch:
+                request.done.set()
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.lock = threading.Lock()
+
+    def record(self, rows, latency, ok=True):
+        with self.lock:
+            self.requests += 1
+            self.rows += rows
+            if not ok:
+                self.errors += 1
+            self.latencies.append(latency)
+
+    def render(self, batcher, cache=None):
+        with self.lock:
+            uptime = time.time() - self.started
+            latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+            lines = [
+                f"thermologic_predict_requests_total {self.requests}",
+                f"thermologic_predict_errors_total {self.errors}",
+                f"thermologic_predict_rows_total {self.rows}",
+                f"thermologic_predict_batches_total {batcher.batches}",
+                f"thermologic_predict_mean_batch_rows {batcher.batched_rows / max(batcher.batches, 1):.3f}",
+                f"thermologic_predict_rows_per_second {self.rows / max(uptime, 1e-9):.3f}",
+                f"thermologic_uptime_seconds {uptime:.3f}",
+            ]
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'thermologic_predict_latency_seconds{{quantile="{q}"}} '
+                             f"{np.quantile(latencies, q):.6f}")
+        if cache is not None:
+            stats = cache.stats()
+            lines += [
+                f"thermologic_predict_cache_hits_total {stats['hits']}",
+                f"thermologic_predict_cache_misses_total {stats['misses']}",
+                f"thermologic_predict_cache_hit_rate {stats['hit_rate']:.6f}",
+                f"thermologic_predict_cache_rows_saved_rate {stats['rows_saved_rate']:.6f}",
+                f"thermologic_predict_cache_entries {stats['entries']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # Set on the server class by make_server
+    batcher = None
+    metrics = None
+    cache = None
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.metrics.render(self.batcher, self.cache), "text/plain; version=0.0.4")
+        elif self.path == "/health":
+            self._send(200, json.dumps({"status": "ok"}))
+        else:
+            self._send(404, json.dumps({"error": "not found"}))
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, json.dumps({"error": "not found"}))
+            return
+        start = time.perf_counter()
+        rows = 0
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            X = parse_rows(json.loads(self.rfile.read(length)))
+            rows = len(X)
+            predictions = self.batcher.submit(X)
+        except (ValueError, KeyError, TypeError) as e:
+            self.metrics.record(rows, time.perf_counter() - start, ok=False)
+            self._send(400, json.dumps({"error": str(e)}))
+            return
+        except Exception as e:
+            self.metrics.record(rows, time.perf_counter() - start, ok=False)
+            self._send(500, json.dumps({"error": str(e)}))
+            return
+        self.metrics.record(rows, time.perf_counter() - start)
+        self._send(200, json.dumps({"predictions": predictions.tolist()}))
+
+    def log_message(self, format, *args):
+        pass  # One line per request would dominate at high request rates
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, reuse_port=False, backlog=DEFAULT_BACKLOG):
+        self.reuse_port = reuse_port
+        # Read by server_activate() when it calls listen()
+        self.request_queue_size = backlog
+        super().__init__(address, handler)
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def make_server(host="127.0.0.1", port=8050, engine="sklearn", model_path=DEFAULT_MODEL_PATH,
+                max_batch_rows=4096, max_wait_ms=2.0, reuse_port=False, cache_size=0, cache_decimals=None,
+                backlog=DEFAULT_BACKLOG):
+    predict = make_predictor(engine, model_path)
+    cache = None
+    if cache_size:
+        cache = PredictionCache(predict, max_entries=cache_size, decimals=cache_decimals)
+        predict = cache.predict
+    handler = type("Handler", (PredictionHandler,), {
+        "batcher": MicroBatcher(predict, max_batch_rows, max_wait_ms),
+        "metrics": Metrics(),
+        "cache": cache,
+    })
+    return PredictionServer((host, port), handler, reuse_port=reuse_port, backlog=backlog)
+
+
+def _serve(host, port, engine, model_path, max_batch_rows, max_wait_ms, reuse_port, cache_size, cache_decimals,
+           backlog):
+    server = make_server(host, port, engine, model_path, max_batch_rows, max_wait_ms, reuse_port, cache_size,
+                         cache_decimals, backlog)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve OntarioModel.pkl predictions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--workers", type=int, default=1, help="number of server processes")
+    parser.add_argument("--engine", choices=["sklearn", "flat"], default="sklearn",
+                        help="model.predict, or the flattened predictor from flat_gbm.py")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--max-batch-rows", type=int, default=4096)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG,
+                        help="pending connections to queue per process (capped by net.core.somaxconn)")
+    parser.add_argument("--cache-size", type=int, default=0, help="distinct inputs to memoize (0: no cache)")
+    parser.add_argument("--cache-decimals", type=int, nargs="+",
+                        help="round Value, Sunny_Or_Cloudy, Windy to these decimals for the cache key")
+    args = parser.parse_args()
+    cache_decimals = args.cache_decimals
+    if cache_decimals and len(cache_decimals) == 1:
+        cache_decimals = cache_decimals[0]
+
+    reuse_port = args.workers > 1 and hasattr(socket, "SO_REUSEPORT")
+    processes = []
+    for k in range(args.workers):
+        port = args.port if reuse_port else args.port + k
+        print(f"Worker {k} serving on http://{args.host}:{port}")
+        process = multiprocessing.Process(
+            target=_serve,
+            args=(args.host, port, args.engine, args.model, args.max_batch_rows, args.max_wait_ms, reuse_port,
+                  args.cache_size, cache_decimals, args.backlog))
+        process.start()
+        processes.append(process)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Append-friendly columnar store with memory-mapped reads.
+
+A store is a directory holding one raw little-endian binary file per column
+plus a small schema.json. Appending writes each column's new values to the end
+of its file; reading maps the files with np.memmap, so slicing a row or time
+range only touches the pages involved instead of parsing a whole CSV.
+
+Columns are numeric, except "category" columns (e.g. sensor_id), which are
+stored as int32 codes with the labels kept in the schema.
+
+    python telemetry_store.py import factorydata.csv factory_store
+    python telemetry_store.py import Ontario1DayCSV.csv ontario_store
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+CATEGORY = "category"
+
+# Layout of the factory efficiency stream written by the backend
+FACTORY_COLUMNS = {"timestamp": "f8", "sensor_id": CATEGORY, "eff": "f8", "effnew": "f8"}
+
+
+class ColumnStore:
+    """One directory, one memory-mapped file per column."""
+
+    def __init__(self, path, columns=None):
+        """
+        Open the store at `path`. To create a new store pass `columns`, a dict
+        of column name -> NumPy dtype string, or "category" for label columns.
+        """
+        self.path = path
+        schema_path = os.path.join(path, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path, "r") as f:
+                self.schema = json.load(f)
+        elif columns is not None:
+            os.makedirs(path, exist_ok=True)
+            self.schema = {
+                "columns": {name: (CATEGORY if dtype == CATEGORY else np.dtype(dtype).newbyteorder("<").str)
+                            for name, dtype in columns.items()},
+                "categories": {name: [] for name, dtype in columns.items() if dtype == CATEGORY},
+            }
+            self._save_schema()
+        else:
+            raise FileNotFoundError(f"No column store at {path}")
+
+    @property
+    def columns(self):
+        return list(self.schema["columns"])
+
+    def _dtype(self, name):
+        dtype = self.schema["columns"][name]
+        return np.dtype("<i4") if dtype == CATEGORY else np.dtype(dtype)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _save_schema(self):
+        tmp_path = os.path.join(self.path, SCHEMA_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.schema, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, SCHEMA_FILE))
+
+    def __len__(self):
+        # A crash mid-append can leave columns of different lengths; only
+        # rows present in every column count
+        counts = []
+        for name in self.columns:
+            path = self._file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // self._dtype(name).itemsize)
+        return min(counts) if counts else 0
+
+    def encode(self, name, labels):
+        """Integer codes for category labels, adding new labels to the schema."""
+        known = self.schema["categories"][name]
+        index = {label: code for code, label in enumerate(known)}
+        codes = np.empty(len(labels), dtype="<i4")
+        added = False
+        for k, label in enumerate(labels):
+            label = str(label)
+            if label not in index:
+                index[label] = len(known)
+                known.append(label)
+                added = True
+            codes[k] = index[label]
+        if added:
+            self._save_schema()
+        return codes
+
+    def labels(self, name):
+        """Labels of a category column, indexed by code."""
+        return list(self.schema["categories"][name])
+
+    def append(self, data):
+        """Append rows given as a dict (or DataFrame) of equal-length columns."""
+        lengths = {len(data[name]) for name in self.columns}
+        if len(lengths) != 1:
+            raise ValueError(f"Columns have different lengths: {lengths}")
+        for name in self.columns:
+            if self.schema["columns"][name] == CATEGORY:
+                values = self.encode(name, list(data[name]))
+            else:
+                values = np.ascontiguousarray(data[name], dtype=self._dtype(name))
+            with open(self._file(name), "ab") as f:
+                f.write(values.tobytes())
+
+    def column(self, name, start=None, stop=None):
+        """Memory-mapped view of rows [start, stop) of one column (no copy)."""
+        n = len(self)
+        start, stop, _ = slice(start, stop).indices(n)
+        dtype = self._dtype(name)
+        if stop <= start:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r",
+                         offset=start * dtype.itemsize, shape=(stop - start,))
+
+    def read(self, columns=None, start=None, stop=None):
+        """Dict of memory-mapped column views for rows [start, stop)."""
+        return {name: self.column(name, start, stop) for name in (columns or self.columns)}
+
+    def time_range(self, t0, t1, time_column="timestamp"):
+        """Row range [start, stop) with t0 <= time <= t1; the time column must be sorted."""
+        times = self.column(time_column)
+        return int(np.searchsorted(times, t0, side="left")), int(np.searchsorted(times, t1, side="right"))
+
+    def read_time_range(self, t0, t1, columns=None, time_column="timestamp"):
+        start, stop = self.time_range(t0, t1, time_column)
+        return self.read(columns, start, stop)
+
+    def tail(self, n, columns=None):
+        """The last n rows."""
+        return self.read(columns, start=max(len(self) - n, 0))
+
+    def to_frame(self, columns=None, start=None, stop=None):
+        """pandas DataFrame of a row range, with category columns decoded."""
+        import pandas as pd
+
+        data = {}
+        for name, values in self.read(columns, start, stop).items():
+            if self.schema["columns"][name] == CATEGORY:
+                data[name] = pd.Categorical.from_codes(np.asarray(values), self.labels(name))
+            else:
+                data[name] = np.asarray(values)
+        return pd.DataFrame(data)
+
+
+def import_csv(csv_path, store_path, chunksize=100_000):
+    """Convert a CSV into a new column store, reading it in chunks."""
+    import pandas as pd
+
+    store = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, encoding="utf-8-sig"):
+        # Same column names the model was trained with
+        chunk = chunk.rename(columns=lambda name: name.strip().replace(" ", "_"))
+        if store is None:
+            columns = {name: (CATEGORY if chunk[name].dtype == object else "f8") for name in chunk.columns}
+            store = ColumnStore(store_path, columns)
+        store.append(chunk)
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "import":
+        print("Usage: python telemetry_store.py import <file.csv> <store directory>")
+        sys.exit(1)
+
+    store = import_csv(sys.argv[2], sys.argv[3])
+    print(f"Imported {len(store)} rows into {sys.argv[3]} (columns: {', '.join(store.columns)})")
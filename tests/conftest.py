@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# backend, models and gui are flat script directories, not packages
+for directory in ("backend", "models", "gui"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,38 @@
+import numpy as np
+
+from batch_predict import MinMaxSeries
+from decimate import minmax_decimate
+
+
+def test_streamed_envelope_matches_brute_force():
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.normal(size=100_003))
+    series = MinMaxSeries(max_points=512)
+    start = 0
+    while start < len(y):
+        stop = start + int(rng.integers(1, 5000))
+        series.append(y[start:stop])
+        start = stop
+    x, values = series.points()
+
+    assert len(x) <= 512
+    np.testing.assert_array_equal(values, y[x])
+    # Every complete block keeps the same points as decimating the full series at that block size
+    size = series.size
+    full = len(y) // size * size
+    brute = minmax_decimate(y[:full], 0, full, full // size)
+    streamed = x[x < full]
+    np.testing.assert_array_equal(np.union1d(streamed, [0, full - 1]), brute)
+    # and the incomplete block at the end its own minimum and maximum
+    tail = y[full:]
+    assert set(x[x >= full]) == {full + tail.argmin(), full + tail.argmax()}
+    assert values.min() == y.min() and values.max() == y.max()
+
+
+def test_short_series_is_kept_whole():
+    series = MinMaxSeries(max_points=64)
+    series.append([3.0, 1.0])
+    series.append([2.0])
+    x, values = series.points()
+    np.testing.assert_array_equal(x, [0, 1, 2])
+    np.testing.assert_array_equal(values, [3.0, 1.0, 2.0])
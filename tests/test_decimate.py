@@ -0,0 +1,25 @@
+import numpy as np
+from matplotlib.figure import Figure
+
+from decimate import DecimatedLine
+
+
+def test_appended_line_matches_decimating_at_once():
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.normal(size=50_000))
+
+    def line_for(chunks):
+        axes = Figure(figsize=(4, 3), dpi=100).add_subplot()
+        series = DecimatedLine(axes.plot([], [])[0])
+        axes.set_xlim(0, 60_000)
+        for chunk in chunks:
+            series.append(chunk)
+        return series
+
+    streamed = line_for(np.array_split(y, 97))
+    at_once = line_for([y])
+    np.testing.assert_array_equal(streamed.line.get_xdata(), at_once.line.get_xdata())
+    np.testing.assert_array_equal(streamed.y, y)
+    x, values = streamed.line.get_xdata(), streamed.line.get_ydata()
+    assert len(x) <= 2 * int(streamed.line.axes.bbox.width) + 2
+    assert values.min() == y.min() and values.max() == y.max()
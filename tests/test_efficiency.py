@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+pytest.importorskip("cantera")
+
+from efficiency import DesignPoint, DesignSolver, sample_efficiency  # noqa: E402
+from loopback import synthetic_readings  # noqa: E402
+from properties import load_properties  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def props():
+    return load_properties()
+
+
+@pytest.fixture(scope="module")
+def reading():
+    return tuple(float(v) for v in synthetic_readings(1)[0])
+
+
+def test_solution_reaches_the_target(props, reading):
+    solver = DesignSolver(0.93)
+    solution = solver.solve(props, *reading)
+    assert solution.converged
+    assert solution.effd == pytest.approx(0.93, abs=1e-6)
+    assert solution.scale > 1.0
+
+
+def test_nearby_reading_is_a_cache_hit(props, reading):
+    solver = DesignSolver(0.93)
+    # Centres of the reading's pressure and temperature bins
+    p1, p2 = (solver._pressure(solver._pressure_bin(p)) for p in reading[:2])
+    t1, t2 = (round(t / 0.25) * 0.25 for t in reading[2:])
+    first = solver.solve(props, p1, p2, t1, t2)
+    # Within the relative pressure tolerance and the temperature step
+    second = solver.solve(props, p1 * (1 + 2e-5), p2 * (1 - 2e-5), t1 + 0.1, t2 - 0.1)
+    assert second is first
+    assert solver.stats()["hits"] == 1 and solver.stats()["misses"] == 1
+
+
+def test_pressures_far_apart_are_solved_separately(props, reading):
+    solver = DesignSolver(0.93)
+    p1, p2, t1, t2 = reading
+    solver.solve(props, *reading)
+    solver.solve(props, p1 * 1.01, p2, t1, t2)
+    assert solver.stats()["misses"] == 2
+
+
+@pytest.mark.parametrize("params", [{"max_scale": 1.001}, {"max_iterations": 4}])
+def test_non_convergence_is_reported(props, reading, params):
+    solution = DesignSolver(0.93, **params).solve(props, *reading)
+    assert not solution.converged
+    assert math.isfinite(solution.effd)
+
+
+def test_solve_mode_keeps_a_reading_that_meets_the_target(props, reading):
+    design = DesignPoint("solve")
+    effd, _ = design.update(props, *reading, 0.95)
+    assert effd == 0.95
+    assert design.last_solution.scale == 1.0
+
+
+def test_nudge_waits_for_a_usable_reading(props, reading):
+    design = DesignPoint("nudge")
+    effd, uniterg = design.update(props, *reading, math.nan)
+    assert math.isnan(effd) and math.isnan(uniterg)
+    assert not design.initialized
+
+    eff, _ = sample_efficiency(props, *reading)
+    first, _ = design.update(props, *reading, eff)
+    assert math.isfinite(first)
+    assert design.t1d > reading[2]  # Nudged towards the target
+
+
+def test_non_finite_reading_is_skipped(props, reading):
+    for mode in DesignPoint.MODES:
+        design = DesignPoint(mode)
+        effd, _ = design.update(props, math.nan, *reading[1:], 0.5)
+        assert math.isnan(effd)
+        assert not design.initialized
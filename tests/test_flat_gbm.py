@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import LinearRegression
+
+from flat_gbm import FlatGBM
+
+
+def fitted(**params):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(12000, 22000, 2000), rng.integers(0, 2, 2000), rng.uniform(0, 1, 2000)])
+    y = X[:, 0] * (1.1 - 0.1 * X[:, 1]) + 500 * X[:, 2] + rng.normal(0, 50, 2000)
+    return GradientBoostingRegressor(n_estimators=50, max_depth=3, random_state=0, **params).fit(X, y), X
+
+
+def check_matches(model, flat, X):
+    rng = np.random.default_rng(1)
+    split = flat.left != np.arange(len(flat.left))
+    # Random rows, and rows sitting exactly on the split thresholds of each feature
+    rows = [rng.uniform(X.min(axis=0) - 1, X.max(axis=0) + 1, size=(500, X.shape[1]))]
+    for k in range(X.shape[1]):
+        thresholds = flat.threshold[split & (flat.feature == k)]
+        on_split = X[rng.integers(0, len(X), len(thresholds))].copy()
+        on_split[:, k] = thresholds
+        rows.append(on_split)
+    rows = np.concatenate(rows)
+    np.testing.assert_allclose(flat.predict(rows), model.predict(rows), rtol=1e-10)
+    np.testing.assert_allclose([flat.predict_one(*row) for row in rows[:50]], model.predict(rows[:50]), rtol=1e-10)
+
+
+@pytest.mark.parametrize("loss", ["squared_error", "absolute_error", "huber"])
+def test_grid_matches_sklearn(loss):
+    model, X = fitted(loss=loss)
+    flat = FlatGBM.from_sklearn(model)
+    assert flat.grid_edges is not None
+    check_matches(model, flat, X)
+
+
+def test_tree_walk_matches_sklearn(monkeypatch):
+    monkeypatch.setattr("flat_gbm.MAX_GRID_CELLS", 0)
+    model, X = fitted()
+    flat = FlatGBM.from_sklearn(model)
+    assert flat.grid_edges is None
+    check_matches(model, flat, X)
+
+
+def test_zero_init_matches_sklearn():
+    model, X = fitted(init="zero")
+    check_matches(model, FlatGBM.from_sklearn(model), X)
+
+
+def test_input_dependent_init_is_refused():
+    model, _ = fitted(init=LinearRegression())
+    with pytest.raises(TypeError):
+        FlatGBM.from_sklearn(model)
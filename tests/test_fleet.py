@@ -0,0 +1,48 @@
+import os
+import signal
+import time
+
+import pytest
+
+from fleet import FleetError, FleetProcessor, synthetic_fleet, worker_for
+
+
+def _drain(fleet, limit=30.0):
+    deadline = time.monotonic() + limit
+    while fleet.in_flight:
+        assert time.monotonic() < deadline, "the fleet neither drained nor raised"
+        if not fleet.get_results(timeout=0.2):
+            fleet.check()
+
+
+def test_dead_worker_is_reported():
+    fleet = FleetProcessor(2, design_mode="solve", batch_size=4).start()
+    try:
+        readings = list(synthetic_fleet(8, 3))
+        lost = sum(1 for reading in readings if worker_for(reading.port, 2) == 0)
+        assert 0 < lost < len(readings)
+        fleet.processes[0].kill()
+        fleet.processes[0].join()
+        for reading in readings:
+            fleet.submit(reading)
+        fleet.flush()
+
+        with pytest.raises(FleetError, match=f"{lost} of"):
+            _drain(fleet)
+        assert fleet.outstanding[0] == lost
+    finally:
+        fleet.close()
+
+
+def test_stalled_worker_times_out():
+    fleet = FleetProcessor(1, batch_size=1, timeout=1.0).start()
+    try:
+        os.kill(fleet.processes[0].pid, signal.SIGSTOP)
+        for reading in synthetic_fleet(1, 2):
+            fleet.submit(reading)
+
+        with pytest.raises(FleetError, match="2 readings in flight are lost"):
+            _drain(fleet)
+    finally:
+        os.kill(fleet.processes[0].pid, signal.SIGCONT)
+        fleet.close()
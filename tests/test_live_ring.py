@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from live_ring import RECORD_FIELDS, RingReader, RingWriter
+
+
+def ring_name(tag):
+    return f"thermologic_test_{tag}_{os.getpid()}"
+
+
+def _write_counting(name, count, capacity, attached, done):
+    # Every field of record k is k, so a record mixing two writes shows up as unequal fields
+    with RingWriter(name, capacity=capacity) as ring:
+        attached.wait(10)
+        for k in range(count):
+            ring.write(*([float(k)] * len(RECORD_FIELDS)))
+        done.wait(60)  # Closing marks the ring closed, and the reader would stop there
+
+
+def test_concurrent_reads_are_never_torn():
+    name = ring_name("torn")
+    count = 200_000
+    attached, done = multiprocessing.Event(), multiprocessing.Event()
+    writer = multiprocessing.Process(target=_write_counting, args=(name, count, 64, attached, done))
+    writer.start()
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                reader = RingReader(name)
+                break
+            except FileNotFoundError:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        attached.set()
+
+        seen = []
+        while len(seen) + reader.lost < count:
+            new = reader.read_new()
+            records = np.column_stack([new[field] for field in RECORD_FIELDS])
+            assert (records == records[:, :1]).all(), "torn record"
+            seen.extend(records[:, 0])
+            assert time.monotonic() < deadline + 30
+        reader.close()
+    finally:
+        done.set()
+        writer.join()
+
+    seen = np.array(seen)
+    assert not reader.truncated
+    assert (np.diff(seen) > 0).all()
+    assert len(seen) + reader.lost == count
+    assert seen[-1] == count - 1
+
+
+def test_reader_skips_ahead_when_lapped():
+    name = ring_name("lapped")
+    with RingWriter(name, capacity=8) as writer:
+        reader = RingReader(name, ["timestamp"])
+        assert len(reader.read_new()["timestamp"]) == 0
+        for k in range(13):
+            writer.write(k, 0, 0, 0, 0, 0, 0)
+        np.testing.assert_array_equal(reader.read_new()["timestamp"], np.arange(5, 13))
+        assert reader.lost == 5
+        reader.close()
+
+
+def test_writer_restart_after_close():
+    name = ring_name("restart")
+    writer = RingWriter(name, capacity=16)
+    reader = RingReader(name, ["timestamp", "eff"])
+    for k in range(5):
+        writer.write(k, 0, 0, 0, 0, 0.5, 0)
+    assert len(reader.read_new()["timestamp"]) == 5
+
+    writer.close()
+    assert len(reader.read_new()["timestamp"]) == 0
+    assert len(reader.read_new()["timestamp"]) == 0
+
+    with RingWriter(name, capacity=16) as writer:
+        for k in range(3):
+            writer.write(100 + k, 0, 0, 0, 0, 0.7, 0)
+        new = reader.read_new()
+        assert reader.truncated
+        np.testing.assert_array_equal(new["timestamp"], [100, 101, 102])
+        writer.write(103, 0, 0, 0, 0, 0.7, 0)
+        np.testing.assert_array_equal(reader.read_new()["timestamp"], [103])
+        assert not reader.truncated
+        assert reader.lost == 0
+    reader.close()
+
+
+def test_writer_restart_reusing_the_segment():
+    # A writer that died without closing leaves the segment behind; the next one reuses it
+    name = ring_name("reuse")
+    crashed = RingWriter(name, capacity=16)
+    reader = RingReader(name, ["timestamp"])
+    for k in range(10):
+        crashed.write(k, 0, 0, 0, 0, 0, 0)
+    assert len(reader.read_new()["timestamp"]) == 10
+
+    with RingWriter(name, capacity=16) as writer:
+        writer.write(50, 0, 0, 0, 0, 0, 0)
+        new = reader.read_new()
+        assert reader.truncated
+        np.testing.assert_array_equal(new["timestamp"], [50])
+    crashed.close(unlink=False)
+    reader.close()
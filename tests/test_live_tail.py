@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from live_tail import CsvTail
+
+
+def append(path, text):
+    with open(path, "a", newline="") as f:
+        f.write(text)
+
+
+def test_partial_lines_wait_for_their_newline(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    append(path, "timestamp,sensor_id,eff,effnew\n1.0,a,0.9,0.93\n2.0,a,0.8")
+    tail = CsvTail(path, ["eff", "effnew"])
+
+    rows = tail.read_new()
+    np.testing.assert_array_equal(rows["eff"], [0.9])
+    append(path, "5,0.93\n3.0,a,")
+    rows = tail.read_new()
+    np.testing.assert_array_equal(rows["eff"], [0.85])
+    assert len(tail.read_new()["eff"]) == 0
+    append(path, "0.7,0.93\n")
+    np.testing.assert_array_equal(tail.read_new()["effnew"], [0.93])
+    assert not tail.truncated
+
+
+def test_header_split_across_reads(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    append(path, "timestamp,sensor_")
+    tail = CsvTail(path, ["eff", "effnew"])
+    assert len(tail.read_new()["eff"]) == 0
+    append(path, "id,eff,effnew\n1.0,a,0.9,0.93\n")
+    np.testing.assert_array_equal(tail.read_new()["eff"], [0.9])
+
+
+def test_truncation_starts_over(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    append(path, "timestamp,sensor_id,eff,effnew\n1.0,a,0.9,0.93\n2.0,a,0.8,0.93\n")
+    tail = CsvTail(path, ["eff", "effnew"])
+    tail.read_new()
+    with open(path, "w", newline="") as f:
+        f.write("timestamp,sensor_id,eff,effnew\n3.0,a,0.7,0.93\n")
+
+    np.testing.assert_array_equal(tail.read_new()["eff"], [0.7])
+    assert tail.truncated
+
+
+def test_rotation_to_a_larger_file_starts_over(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    append(path, "timestamp,sensor_id,eff,effnew\n1.0,a,0.9,0.93\n")
+    tail = CsvTail(path, ["eff", "effnew"])
+    tail.read_new()
+    os.replace(path, str(tmp_path / "factorydata-20240301-120000.csv"))
+    # The new file is already longer than what was read from the old one
+    append(path, "timestamp,sensor_id,eff,effnew\n" + "".join(f"{k}.0,a,0.{k},0.93\n" for k in range(2, 8)))
+
+    rows = tail.read_new()
+    assert tail.truncated
+    np.testing.assert_array_equal(rows["eff"], [0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+
@@ -0,0 +1,81 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+
+class CountingModel:
+    """Sum of the features; records how many rows reached it."""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.rows = []
+
+    def __call__(self, X):
+        self.rows.append(len(X))
+        return X.sum(axis=1) + self.offset
+
+
+def test_duplicates_within_a_batch_are_predicted_once():
+    model = CountingModel()
+    cache = PredictionCache(model)
+    X = np.array([[1.0, 0.0, 0.5], [2.0, 1.0, 0.5], [1.0, 0.0, 0.5], [1.0, -0.0, 0.5]])
+
+    np.testing.assert_array_equal(cache.predict(X), X.sum(axis=1))
+    assert model.rows == [2]
+    assert cache.stats()["unique_rows"] == 2
+
+
+def test_lru_evicts_the_least_recently_used():
+    model = CountingModel()
+    cache = PredictionCache(model, max_entries=2)
+    a, b, c = np.array([[1.0, 0, 0]]), np.array([[2.0, 0, 0]]), np.array([[3.0, 0, 0]])
+    cache.predict(a)
+    cache.predict(b)
+    cache.predict(a)  # a is now the most recently used
+    cache.predict(c)  # evicts b
+
+    assert cache.stats()["evictions"] == 1
+    model.rows.clear()
+    cache.predict(a)
+    assert model.rows == []
+    cache.predict(b)
+    assert model.rows == [1]
+
+
+def test_version_change_invalidates():
+    version = [1]
+    model = CountingModel()
+    cache = PredictionCache(model, version=lambda: version[0])
+    X = np.array([[1.0, 0, 0]])
+    cache.predict(X)
+    cache.predict(X)
+    assert model.rows == [1]
+
+    version[0] = 2
+    model.offset = 10.0  # the retrained model
+    np.testing.assert_array_equal(cache.predict(X), [11.0])
+    assert model.rows == [1, 1]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_current_hands_over_version_and_predict_together():
+    class Retrained:
+        def __init__(self):
+            self.version, self.model = 1, CountingModel()
+
+        def current(self):
+            return self.version, self.model
+
+    predictor = Retrained()
+    cache = PredictionCache(predictor)
+    X = np.array([[1.0, 0, 0]])
+    np.testing.assert_array_equal(cache.predict(X), [1.0])
+    predictor.version, predictor.model = 2, CountingModel(offset=5.0)
+    np.testing.assert_array_equal(cache.predict(X), [6.0])
+
+
+def test_decimals_share_entries():
+    model = CountingModel()
+    cache = PredictionCache(model, decimals=[0, None, 2])
+    cache.predict(np.array([[100.2, 1.0, 0.501], [99.8, 1.0, 0.499]]))
+    assert model.rows == [1]
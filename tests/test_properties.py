@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("cantera")
+
+from properties import WaterTables, accuracy_report, load_properties, CanteraProperties  # noqa: E402
+
+
+def test_tables_are_opt_in():
+    assert isinstance(load_properties(), CanteraProperties)
+
+
+def test_off_grid_error_within_tolerance(tmp_path):
+    # A coarse grid has large interpolation errors, so every cell the tables
+    # keep must have been checked well enough to hold the bound off-grid
+    tables = WaterTables.load_or_build(cache_dir=str(tmp_path), verbose=False,
+                                       t_min=300.0, t_max=900.0, n_t=40,
+                                       p_min=1.0e3, p_max=3.0e7, n_p=30, n_sat=100)
+    report = accuracy_report(tables, n_samples=1000)
+    assert report["near_saturation_samples"] > 0
+    assert report["h_tp_max_abs_error"] <= report["tolerance"]
+    assert report["near_saturation_max_abs_error"] <= report["tolerance"]
+    assert report["within_tolerance"]
@@ -0,0 +1,72 @@
+import pytest
+
+from loopback import format_reading
+from protocol import StreamDecoder, encode_frame
+
+ROWS = [(1.0e6, 2.0e4, 530.0, 400.0), (1.5e6, 2.5e4, 531.0, 401.0), (2.0e6, 3.0e4, 532.0, 402.0)]
+
+
+def frames(rows, first=0):
+    return [encode_frame(first + k, *row) for k, row in enumerate(rows)]
+
+
+def assert_readings(readings, rows):
+    assert len(readings) == len(rows)
+    for reading, row in zip(readings, rows):
+        assert reading == pytest.approx(row, rel=1e-6)
+
+
+def test_frames_round_trip():
+    decoder = StreamDecoder()
+    assert_readings(decoder.feed(b"".join(frames(ROWS))), ROWS)
+    assert decoder.stats["frames"] == 3
+    assert decoder.stats["crc_errors"] == decoder.stats["dropped_frames"] == 0
+
+
+def test_frame_split_across_reads():
+    data = b"".join(frames(ROWS))
+    decoder = StreamDecoder()
+    readings = []
+    for k in range(0, len(data), 5):
+        readings += decoder.feed(data[k:k + 5])
+    assert_readings(readings, ROWS)
+    assert decoder.stats["dropped_bytes"] == 0
+
+
+def test_corrupted_crc_is_skipped():
+    first, second, third = frames(ROWS)
+    corrupt = bytearray(second)
+    corrupt[10] ^= 0x01
+    decoder = StreamDecoder()
+    assert_readings(decoder.feed(first + bytes(corrupt) + third), [ROWS[0], ROWS[2]])
+    assert decoder.stats["crc_errors"] >= 1
+    assert decoder.stats["dropped_frames"] == 1  # sequence 1 never arrived
+
+
+def test_garbage_between_frames_and_lines():
+    first, second, third = frames(ROWS)
+    data = (b"Starting...\r\n" + first + b"\x00\xff\xa5noise" + second +
+            format_reading(*ROWS[2]) + b"\xa5\x5a\x01" + third)
+    decoder = StreamDecoder()
+    readings = []
+    for k in range(0, len(data), 7):
+        readings += decoder.feed(data[k:k + 7])
+    assert_readings(readings, [ROWS[0], ROWS[1], ROWS[2], ROWS[2]])
+    assert list(decoder.messages) == ["Starting..."]
+    assert decoder.stats["frames"] == 3
+    assert decoder.stats["lines"] >= 2
+
+
+def test_sequence_restart_is_not_counted_as_drops():
+    decoder = StreamDecoder()
+    decoder.feed(b"".join(frames(ROWS, first=500)))
+    decoder.feed(b"".join(frames(ROWS)))  # the sketch restarted at 0
+    assert decoder.stats["sequence_resets"] == 1
+    assert decoder.stats["dropped_frames"] == 0
+
+
+def test_sequence_wraps_around():
+    decoder = StreamDecoder()
+    decoder.feed(encode_frame(0xFFFE, *ROWS[0]) + encode_frame(0xFFFF, *ROWS[1]) + encode_frame(1, *ROWS[2]))
+    assert decoder.stats["dropped_frames"] == 1  # sequence 0
+    assert decoder.stats["sequence_resets"] == 0
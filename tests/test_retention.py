@@ -0,0 +1,62 @@
+import gzip
+import os
+
+import pandas as pd
+
+from retention import Retention, read_rollup, rebuild, segment_paths
+from writer import TelemetryWriter
+
+
+def test_rebuild_skips_legacy_segment(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    with open(path, "w", newline="") as f:
+        f.write("eff,effnew\n0.64,0.65\n0.65,0.67\n")
+
+    # The first start rotates the legacy file into a compressed segment
+    retention = Retention(path)
+    with TelemetryWriter(path, truncate=True, retention=retention) as writer:
+        for k in range(120):
+            writer.write(0.9, 0.93, sensor_id="a", timestamp=600.0 + k)
+    (legacy,) = segment_paths(path)
+    assert legacy.endswith(".csv.gz")
+    with gzip.open(legacy, "rt") as f:
+        assert f.readline().strip() == "eff,effnew"
+
+    rows, skipped = rebuild(path)
+
+    assert rows == 120
+    assert skipped == [legacy]
+    rollup = read_rollup(path, "1min")
+    assert rollup["period_start"].tolist() == [600, 660]
+    assert rollup["count"].tolist() == [60, 60]
+
+
+def test_rebuild_matches_live_rollups(tmp_path):
+    from retention import Rollups
+
+    path = str(tmp_path / "factorydata.csv")
+    retention = Retention(path, max_bytes=2000, compress=True)
+    with TelemetryWriter(path, flush_rows=10, retention=retention, rollups=Rollups(path)) as writer:
+        for k in range(500):
+            writer.write(0.9 + k * 1e-4, 0.93, sensor_id=f"s{k % 2}", timestamp=1000.0 + k)
+    assert len(segment_paths(path)) > 1
+    live = read_rollup(path, "1min")
+
+    rows, skipped = rebuild(path)
+
+    assert (rows, skipped) == (500, [])
+    pd.testing.assert_frame_equal(read_rollup(path, "1min"), live)
+
+
+def test_segments_sort_by_time_then_collision_suffix(tmp_path):
+    names = ["factorydata-20240301-120000-1.csv.gz", "factorydata-20240301-115959.csv.gz",
+             "factorydata-20240301-120000-10.csv", "factorydata-20240301-120000.csv.gz",
+             "factorydata-20240301-120000-2.csv.gz"]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+
+    ordered = [os.path.basename(p) for p in segment_paths(str(tmp_path / "factorydata.csv"))]
+
+    assert ordered == ["factorydata-20240301-115959.csv.gz", "factorydata-20240301-120000.csv.gz",
+                       "factorydata-20240301-120000-1.csv.gz", "factorydata-20240301-120000-2.csv.gz",
+                       "factorydata-20240301-120000-10.csv"]
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+from rolling import LogHistogram, RollingStats, RollingWindow
+
+
+def window_samples(times, values, window, now):
+    """The samples a RollingWindow should hold at `now`: those of its last len(buckets) buckets."""
+    ids = np.floor(times / window.width).astype(int)
+    newest = int(now // window.width)
+    keep = (times <= now) & (ids > newest - len(window.buckets))
+    return values[keep]
+
+
+def check_against_numpy(window, stats, expected, accuracy):
+    assert stats["count"] == len(expected)
+    if not len(expected):
+        assert math.isnan(stats["mean"])
+        return
+    assert stats["mean"] == pytest.approx(expected.mean(), rel=1e-9, abs=1e-12)
+    assert stats["std"] == pytest.approx(expected.std(), rel=1e-6, abs=1e-9)
+    assert stats["min"] == expected.min()
+    assert stats["max"] == expected.max()
+    ordered = np.sort(expected)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert abs(stats[f"p{round(q * 100)}"] - exact) <= accuracy * abs(exact) * (1 + 1e-9)
+
+
+@pytest.mark.parametrize("offset", [-1.04, 0.0, 250.0])
+def test_sliding_window_matches_numpy(offset):
+    rng = np.random.default_rng(3)
+    times = np.cumsum(rng.exponential(0.3, 4000))
+    # A gap longer than the window, so every bucket expires at once
+    times[2500:] += 90.0
+    values = offset + rng.normal(0, 0.5, len(times))
+    accuracy = 0.001
+    window = RollingWindow(60.0, buckets=10, histogram=LogHistogram(accuracy))
+
+    checks = 0
+    for k, (t, x) in enumerate(zip(times, values)):
+        window.add(x, t)
+        if k % 37 == 0:
+            expected = window_samples(times[:k + 1], values[:k + 1], window, t)
+            check_against_numpy(window, window.stats(), expected, accuracy)
+            checks += 1
+    assert checks > 100
+
+    # With no new samples, asking later expires the old buckets
+    for later in (times[-1] + 20.0, times[-1] + 45.0, times[-1] + 61.0):
+        expected = window_samples(times, values, window, later)
+        check_against_numpy(window, window.stats(later), expected, accuracy)
+    assert window.stats(times[-1] + 61.0)["count"] == 0
+
+
+def test_histogram_error_bound_over_magnitudes():
+    histogram = LogHistogram(0.01)
+    for x in np.geomspace(1e-6, 1e9, 2000):
+        for value in (x, -x):
+            estimate = histogram.value(histogram.key(value))
+            assert abs(estimate - value) <= 0.01 * abs(value) * (1 + 1e-9)
+    assert histogram.value(histogram.key(0.0)) == 0.0
+
+
+def test_stats_skip_missing_values():
+    stats = RollingStats(series=("eff",), windows={"1m": 60.0})
+    stats.add(0.0, eff=0.5)
+    stats.add(1.0, eff=float("nan"))
+    stats.add(2.0, eff=None)
+    snapshot = stats.snapshot(now=2.0)["eff"]["1m"]
+    assert snapshot["count"] == 1
+    assert snapshot["mean"] == 0.5
+    assert stats.samples == 3
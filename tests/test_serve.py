@@ -0,0 +1,48 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from serve import MicroBatcher, parse_rows
+
+
+def test_parse_rows_rejects_non_finite():
+    with pytest.raises(ValueError):
+        parse_rows(json.loads('{"rows": [[NaN, 0.2, 0.3]]}'))
+    with pytest.raises(ValueError):
+        parse_rows(json.loads('{"rows": [[1.0, Infinity, 0.3]]}'))
+    assert parse_rows({"rows": [[1.0, 0, 0.3]]}).shape == (1, 3)
+
+
+def test_bad_request_does_not_fail_its_batch():
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        if (X < 0).any():
+            raise ValueError("bad row")
+        return X.sum(axis=1)
+
+    # A long wait so both requests land in the same batch
+    batcher = MicroBatcher(predict, max_wait_ms=200.0)
+    good = np.array([[1.0, 2.0, 3.0]])
+    bad = np.array([[-1.0, 0.0, 0.0]])
+    results = {}
+
+    def submit(name, X):
+        try:
+            results[name] = batcher.submit(X)
+        except ValueError as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=submit, args=args) for args in (("good", good), ("bad", bad))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls[0] == 2  # Coalesced, then retried one by one
+    assert batcher.batches == 1
+    np.testing.assert_array_equal(results["good"], [6.0])
+    assert isinstance(results["bad"], ValueError)
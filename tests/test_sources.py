@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from loopback import format_reading
+from protocol import encode_frame
+from sources import Reading, ReadingRecorder, open_replay, parse_time
+
+ROWS = [(1.0e6, 2.0e4, 530.0, 400.0), (1.1e6, 2.1e4, 531.0, 401.0), (1.2e6, 2.2e4, 532.0, 402.0)]
+
+
+def test_recording_keeps_its_timestamps(tmp_path):
+    path = str(tmp_path / "readings.csv")
+    recorder = ReadingRecorder(path)
+    for k, row in enumerate(ROWS):
+        recorder.write(Reading("COM3", 1_700_000_000.0 + k, *row))
+    recorder.close()
+
+    readings = list(open_replay(path))
+
+    assert readings == [Reading("COM3", 1_700_000_000.0 + k, *row) for k, row in enumerate(ROWS)]
+
+
+def test_raw_capture_ends_at_its_modification_time(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    with open(path, "wb") as f:
+        f.write(b"Starting...\r\n")
+        f.write(format_reading(*ROWS[0]))
+        f.write(encode_frame(0, *ROWS[1]))
+        f.write(format_reading(*ROWS[2]))
+    os.utime(path, (1_700_000_100.0, 1_700_000_100.0))
+
+    readings = list(open_replay(path, port="rig", interval=0.5))
+
+    assert [r.timestamp for r in readings] == [1_700_000_099.0, 1_700_000_099.5, 1_700_000_100.0]
+    assert [r.port for r in readings] == ["rig"] * 3
+    for reading, row in zip(readings, ROWS):
+        assert reading[2:] == pytest.approx(row, rel=1e-6)
+
+
+def test_raw_capture_from_start_time(tmp_path):
+    path = str(tmp_path / "capture.txt")
+    with open(path, "wb") as f:
+        for row in ROWS:
+            f.write(format_reading(*row))
+
+    start = parse_time("2024-03-01T12:00:00+00:00")
+    readings = list(open_replay(path, interval=1.0, start_time=start))
+
+    assert start == 1_709_294_400.0
+    assert [r.timestamp for r in readings] == [start, start + 1.0, start + 2.0]
@@ -0,0 +1,89 @@
+import csv
+import glob
+import os
+
+from writer import HEADER, TelemetryWriter
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_appends_to_file_with_same_header(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    with TelemetryWriter(path) as writer:
+        writer.write(0.9, 0.93, sensor_id="a", timestamp=1.0)
+    with TelemetryWriter(path) as writer:
+        writer.write(0.8, 0.93, sensor_id="a", timestamp=2.0)
+
+    rows = read_rows(path)
+    assert rows[0] == HEADER
+    assert [row[0] for row in rows[1:]] == ["1.000", "2.000"]
+
+
+def test_legacy_header_is_moved_aside(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    with open(path, "w", newline="") as f:
+        f.write("eff,effnew\n0.64,0.65\n0.65,0.67\n")
+
+    with TelemetryWriter(path) as writer:
+        writer.write(0.9, 0.93, sensor_id="a", timestamp=1.0)
+
+    rows = read_rows(path)
+    assert rows == [HEADER, ["1.000", "a", "0.9", "0.93"]]
+    (moved,) = glob.glob(str(tmp_path / "factorydata-*.csv"))
+    assert read_rows(moved) == [["eff", "effnew"], ["0.64", "0.65"], ["0.65", "0.67"]]
+
+
+def test_legacy_header_with_retention_becomes_a_segment(tmp_path):
+    from retention import Retention, segment_paths
+
+    path = str(tmp_path / "factorydata.csv")
+    with open(path, "w", newline="") as f:
+        f.write("eff,effnew\n0.64,0.65\n")
+
+    retention = Retention(path, compress=False)
+    with TelemetryWriter(path, retention=retention) as writer:
+        writer.write(0.9, 0.93, sensor_id="a", timestamp=1.0)
+
+    assert read_rows(path)[0] == HEADER
+    (segment,) = segment_paths(path)
+    assert read_rows(segment)[0] == ["eff", "effnew"]
+    assert os.path.exists(path)
+
+
+class FlakyStore:
+    def __init__(self, failures):
+        self.failures = failures
+        self.rows = []
+
+    def append(self, columns):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.rows += list(zip(*(columns[name] for name in HEADER)))
+
+
+def test_store_failure_does_not_duplicate_csv_rows(tmp_path):
+    path = str(tmp_path / "factorydata.csv")
+    store = FlakyStore(failures=1)
+    with TelemetryWriter(path, flush_rows=2, store=store) as writer:
+        writer.write(0.9, 0.93, sensor_id="a", timestamp=1.0)
+        writer.write(0.8, 0.93, sensor_id="a", timestamp=2.0)  # CSV written, store fails
+        assert writer.store_backlog and not writer.rows
+        writer.write(0.7, 0.93, sensor_id="a", timestamp=3.0)
+        writer.write(0.6, 0.93, sensor_id="a", timestamp=4.0)  # Retries the backlog too
+
+    assert [row[0] for row in read_rows(path)[1:]] == ["1.000", "2.000", "3.000", "4.000"]
+    assert [row[0] for row in store.rows] == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_store_backlog_is_bounded(tmp_path):
+    store = FlakyStore(failures=10)
+    with TelemetryWriter(str(tmp_path / "factorydata.csv"), flush_rows=2, store=store,
+                         max_store_backlog=3) as writer:
+        for k in range(6):
+            writer.write(0.9, 0.93, sensor_id="a", timestamp=float(k))
+        assert len(writer.store_backlog) == 3
+        assert writer.store_dropped == 3